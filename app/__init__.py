@@ -8,7 +8,20 @@ from flask_login import LoginManager
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Sessions: cookie carries only an opaque id (see SESSION_BACKEND)
+from app.sessions import configure_sessions
+configure_sessions(app)
+
+# SQLite: WAL + busy_timeout PRAGMAs and a pool sized for threaded servers
+from app.sqlite_tuning import configure_sqlite_engine, install_sqlite_pragmas
+configure_sqlite_engine(app)
+
+# gzip for HTML, JSON and CSV responses (see COMPRESS_*)
+from app.compression import configure_compression
+gzip_middleware = configure_compression(app)
+
 db = SQLAlchemy(app)
+install_sqlite_pragmas(app, db)
 migrate = Migrate(app, db)
 
 # Auth
@@ -19,4 +32,5 @@ login.login_view = 'login'
 admin = Admin(app, name='Exam Admin')
 
 from app import routes
+from app import api
 from app import cli
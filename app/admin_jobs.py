@@ -0,0 +1,194 @@
+"""
+The heavy admin operations, run by the job runner (app/jobs.py).
+
+Each task mirrors the route it replaced, but deletes and updates go in
+batches of JOB_BATCH_SIZE rows, each its own short transaction followed by
+``job.pause()``, so answer inserts are never blocked for long. Imports and
+exports leave a CSV (per-row report or the export itself) for download.
+"""
+from app import app, db
+from app.jobs import jobs
+from app.models import User, Questions, QuizScore, QuestionSet, StudentResponse
+from app.cache import question_cache, section_cache
+from app.writebuffer import response_buffer
+from app.ranking import rank_index, leaderboard_cache
+from app.principal import user_principals
+from app.dashboard_stats import dashboard_stats
+from app.image_store import image_store
+from app.analytics import remove_set_tallies, remove_question_tallies
+from app.exports import csv_chunks, export_rows, LONG_EXPORTS
+from app.student_import import import_students, read_csv_rows
+from app.question_import import import_questions
+
+
+def _write_csv(job, filename, header, rows):
+    with open(job.result_path(filename), 'wb') as f:
+        for chunk in csv_chunks(header, rows):
+            f.write(chunk)
+
+
+def _read_upload(job):
+    try:
+        with open(jobs.path(job.params['upload']), 'rb') as f:
+            return read_csv_rows(f)
+    except UnicodeDecodeError:
+        raise ValueError('Invalid file format. Please upload a valid CSV file (UTF-8 encoded).')
+
+
+def _delete_in_batches(job, model, key, criteria, message, before_delete=None):
+    """
+    DELETE the matching rows JOB_BATCH_SIZE at a time; returns the number
+    deleted. `before_delete(ids)` runs in each batch's transaction first.
+    """
+    batch_size = app.config['JOB_BATCH_SIZE']
+    total = db.session.query(db.func.count(key)).filter(*criteria).scalar()
+    job.progress(0, total, message, force=True)
+    deleted = 0
+    while True:
+        ids = [i for (i,) in db.session.query(key).filter(*criteria).order_by(key).limit(batch_size)]
+        if not ids:
+            return deleted
+        if before_delete is not None:
+            before_delete(ids)
+        model.query.filter(key.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        job.progress(deleted, max(total, deleted), message)
+        job.pause()
+
+
+def _clear_legacy_marks(job):
+    """Set User.marks to NULL for every student, in batches; returns the number reset."""
+    batch_size = app.config['JOB_BATCH_SIZE']
+    criteria = (User.is_admin == False, User.marks != None)
+    total = db.session.query(db.func.count(User.id)).filter(*criteria).scalar()
+    job.progress(0, total, 'Resetting legacy scores', force=True)
+    reset = 0
+    while True:
+        ids = [i for (i,) in db.session.query(User.id).filter(*criteria).order_by(User.id).limit(batch_size)]
+        if not ids:
+            return reset
+        User.query.filter(User.id.in_(ids)).update({'marks': None}, synchronize_session=False)
+        db.session.commit()
+        reset += len(ids)
+        job.progress(reset, max(total, reset), 'Resetting legacy scores')
+        job.pause()
+
+
+@jobs.task('reset_legacy_scores', 'Reset legacy scores')
+def reset_legacy_scores(job):
+    reset_count = _clear_legacy_marks(job)
+    user_principals.invalidate()
+    dashboard_stats.invalidate()
+    if reset_count > 0:
+        return f'All student legacy scores have been reset. {reset_count} students can retake the quiz. (Quiz history preserved)'
+    return 'No legacy scores to reset - all students already have no scores.'
+
+
+@jobs.task('clear_all_scores', 'Clear all scores')
+def clear_all_scores(job):
+    deleted_count = _delete_in_batches(job, QuizScore, QuizScore.id, (), 'Deleting quiz scores')
+    reset_legacy_count = _clear_legacy_marks(job)
+    rank_index.invalidate()
+    leaderboard_cache.invalidate()
+    user_principals.invalidate()
+    dashboard_stats.invalidate()
+    return f'COMPLETE RESET: Deleted {deleted_count} quiz score records and reset {reset_legacy_count} legacy scores. All students can now retake the quiz.'
+
+
+@jobs.task('analytics_reset', 'Reset analytics data')
+def analytics_reset(job):
+    selected_set = QuestionSet.query.get(job.params['set_id'])
+    if selected_set is None:
+        raise ValueError('Question set not found.')
+    # Queued answers would otherwise reappear after the reset
+    response_buffer.flush()
+    criteria = (StudentResponse.question_set_id == selected_set.id,)
+    deleted_count = _delete_in_batches(job, StudentResponse, StudentResponse.id, criteria, 'Deleting responses')
+    # Counters go with whatever was answered meanwhile, in one transaction
+    remove_set_tallies(selected_set.id)
+    deleted_count += StudentResponse.query.filter(*criteria).delete(synchronize_session=False)
+    db.session.commit()
+    return f'Analytics data for "{selected_set.name}" has been reset. ({deleted_count} records deleted)'
+
+
+def _delete_question_responses(question_ids):
+    # As the single and selected question deletes do: the counters, then the answers
+    remove_question_tallies(question_ids)
+    StudentResponse.query.filter(StudentResponse.question_id.in_(question_ids)).delete(synchronize_session=False)
+
+
+@jobs.task('delete_questions', 'Delete questions')
+def delete_questions(job):
+    category = job.params.get('category')
+    criteria = (Questions.quiz_category == category,) if category else ()
+    image_files = [name for (name,) in db.session.query(Questions.image_file).filter(
+        Questions.image_file != None, *criteria).distinct()]
+    response_buffer.flush()
+    deleted_count = _delete_in_batches(job, Questions, Questions.q_id, criteria, 'Deleting questions',
+                                       before_delete=_delete_question_responses)
+    question_cache.invalidate()
+    dashboard_stats.invalidate()
+    image_store.release(image_files)
+    if category:
+        return f'Deleted {deleted_count} questions from {category} category.'
+    return f'All questions deleted. {deleted_count} questions removed.'
+
+
+@jobs.task('import_questions', 'Import questions')
+def import_questions_job(job):
+    rows = list(_read_upload(job))
+    job.progress(0, len(rows), 'Importing questions', force=True)
+
+    def on_chunk(done, total):
+        job.progress(done, total, 'Importing questions')
+        job.pause()
+
+    report = import_questions(rows, on_chunk=on_chunk)
+    question_cache.invalidate()
+    dashboard_stats.invalidate()
+    _write_csv(job, 'question_import_report.csv',
+               ['Line', 'Question', 'Type', 'Status', 'Question ID', 'Problem'],
+               ([r.line, r.question, r.question_type, r.status, r.q_id or '', r.message or ''] for r in report.rows))
+    skipped = len(report.rows) - report.accepted
+    return f'Successfully added {report.accepted} questions! Skipped {skipped} rows (see the report).'
+
+
+@jobs.task('import_students', 'Import students', one_time=True)
+def import_students_job(job):
+    reader = _read_upload(job)
+    if not reader.fieldnames or 'username' not in reader.fieldnames or 'email' not in reader.fieldnames:
+        raise ValueError('CSV file must contain "username" and "email" columns. "section" is optional.')
+    rows = list(reader)
+    job.progress(0, len(rows), 'Creating accounts', force=True)
+    report = import_students(rows, default_section=job.params.get('default_section'))
+    db.session.commit()
+    dashboard_stats.invalidate()
+    section_cache.invalidate()
+    job.progress(len(rows), len(rows), force=True)
+    # The report is the only place the generated passwords are shown; it is
+    # deleted by its first download
+    _write_csv(job, 'student_import_report.csv',
+               ['Line', 'Username', 'Email', 'Section', 'Status', 'Password', 'Problem'],
+               ([r.line, r.username, r.email, r.section, r.status, r.password or '', r.message or '']
+                for r in report.rows))
+    return (f"Successfully created {len(report.created)} students. Skipped {report.count('duplicate')} duplicate "
+            f"and {report.count('invalid')} invalid rows. Download the report for the passwords: "
+            f"it can be downloaded only once.")
+
+
+@jobs.task('export', 'CSV export')
+def export_job(job):
+    export = LONG_EXPORTS[job.params['export']](job.params.get('set_id'))
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    total = export.query.count()
+    job.progress(0, total, 'Writing {}'.format(export.filename), force=True)
+
+    def rows():
+        for done, row in enumerate(export_rows(export, batch_size), start=1):
+            if done % batch_size == 0:
+                job.progress(done, total)
+            yield row
+
+    _write_csv(job, export.filename, export.header, rows())
+    return f'Exported {total} rows to {export.filename}.'
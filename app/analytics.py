@@ -0,0 +1,189 @@
+"""
+Distractor analysis for a question set.
+
+Reads come from two counter tables that are kept in step with StudentResponse:
+ResponseTally per (set, question, chosen answer) and StudentResponseTally per
+(set, student). Every response insert adds to them in the same transaction
+(``record_tallies``), the delete paths subtract or drop them, and
+``rebuild_tallies`` recomputes both from the raw responses with GROUP BY.
+An analytics view therefore reads O(#questions + #students) counter rows no
+matter how many answers were recorded.
+
+Responses without a question set (legacy rows) are not counted.
+"""
+from collections import namedtuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Questions, StudentResponse, ResponseTally, StudentResponseTally
+
+
+CHOICES = ('A', 'B', 'C', 'D')
+
+StudentSetScore = namedtuple('StudentSetScore', ['user_id', 'correct', 'answered'])
+
+
+def _correct_sum():
+    return db.func.sum(db.cast(StudentResponse.is_correct, db.Integer))
+
+
+def _add(executor, table, keys, responses, correct):
+    """
+    Add to one counter row, inserting it if it is not there yet. On SQLite
+    writers are serialised; on other backends two transactions can both miss
+    the row, and the one whose insert then hits the primary key updates the
+    row the other created instead (the insert runs in a savepoint, so the
+    rest of the transaction survives).
+    """
+    match = [table.c[name] == value for name, value in keys.items()]
+    update = table.update().where(db.and_(*match)).values(
+        responses=table.c.responses + responses,
+        correct=table.c.correct + correct,
+    )
+    if executor.execute(update).rowcount or responses <= 0:
+        return
+    try:
+        with executor.begin_nested():
+            executor.execute(table.insert().values(responses=responses, correct=correct, **keys))
+    except IntegrityError:
+        executor.execute(update)
+
+
+def record_tallies(executor, rows):
+    """
+    Count newly inserted responses. `rows` are the StudentResponse column dicts;
+    `executor` is the session or connection of the inserting transaction.
+    """
+    by_choice = {}
+    by_student = {}
+    for row in rows:
+        set_id = row.get('question_set_id')
+        if set_id is None:
+            continue
+        correct = 1 if row['is_correct'] else 0
+        for store, key in ((by_choice, (set_id, row['question_id'], row['selected_answer'])),
+                           (by_student, (set_id, row['user_id']))):
+            counts = store.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += correct
+    for (set_id, question_id, choice), (responses, correct) in by_choice.items():
+        _add(executor, ResponseTally.__table__,
+             {'question_set_id': set_id, 'question_id': question_id, 'choice': choice}, responses, correct)
+    for (set_id, user_id), (responses, correct) in by_student.items():
+        _add(executor, StudentResponseTally.__table__,
+             {'question_set_id': set_id, 'user_id': user_id}, responses, correct)
+
+
+def remove_set_tallies(set_id):
+    """Drop the counters of a set (its responses are being deleted). Call before commit."""
+    ResponseTally.query.filter_by(question_set_id=set_id).delete(synchronize_session=False)
+    StudentResponseTally.query.filter_by(question_set_id=set_id).delete(synchronize_session=False)
+
+
+def remove_question_tallies(question_ids):
+    """
+    Take the responses of these questions out of the counters. Call before
+    the responses themselves are deleted, in the same transaction.
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return
+    per_student = db.session.query(
+        StudentResponse.question_set_id,
+        StudentResponse.user_id,
+        db.func.count(StudentResponse.id),
+        _correct_sum()
+    ).filter(
+        StudentResponse.question_id.in_(question_ids),
+        StudentResponse.question_set_id != None
+    ).group_by(StudentResponse.question_set_id, StudentResponse.user_id).all()
+    table = StudentResponseTally.__table__
+    for set_id, user_id, responses, correct in per_student:
+        _add(db.session, table, {'question_set_id': set_id, 'user_id': user_id}, -responses, -int(correct or 0))
+    db.session.execute(table.delete().where(table.c.responses <= 0))
+    ResponseTally.query.filter(ResponseTally.question_id.in_(question_ids)).delete(synchronize_session=False)
+
+
+def rebuild_tallies(set_id=None):
+    """Recompute the counters from StudentResponse (one set, or all). Commits."""
+    source = StudentResponse.__table__
+    for tally, group_by in ((ResponseTally.__table__, ['question_set_id', 'question_id', 'selected_answer']),
+                            (StudentResponseTally.__table__, ['question_set_id', 'user_id'])):
+        delete = tally.delete()
+        where = source.c.question_set_id != None
+        if set_id is not None:
+            delete = delete.where(tally.c.question_set_id == set_id)
+            where = source.c.question_set_id == set_id
+        db.session.execute(delete)
+        columns = [source.c[name] for name in group_by]
+        query = db.session.query(
+            *(columns + [db.func.count(source.c.id), db.func.sum(db.cast(source.c.is_correct, db.Integer))])
+        ).filter(where).group_by(*columns)
+        target = [name if name != 'selected_answer' else 'choice' for name in group_by] + ['responses', 'correct']
+        db.session.execute(tally.insert().from_select(target, query.statement))
+    db.session.commit()
+
+
+def student_scores(set_id):
+    """Correct and answered counts per student for one set."""
+    rows = db.session.query(
+        StudentResponseTally.user_id, StudentResponseTally.correct, StudentResponseTally.responses
+    ).filter(StudentResponseTally.question_set_id == set_id).all()
+    return [StudentSetScore(user_id, correct, answered) for user_id, correct, answered in rows]
+
+
+def summary_stats(scores):
+    """The overview numbers shown at the top of the analytics page."""
+    correct = [s.correct for s in scores]
+    return {
+        'total_students': len(scores),
+        'highest_score': max(correct) if correct else 0,
+        'lowest_score': min(correct) if correct else 0,
+        'average_score': sum(correct) / len(correct) if correct else 0,
+        'total_responses': sum(s.answered for s in scores),
+        'correct_responses': sum(correct),
+    }
+
+
+def choice_counts(set_id):
+    """{question_id: {'total', 'correct', 'A', 'B', 'C', 'D'}} for one set."""
+    rows = db.session.query(
+        ResponseTally.question_id, ResponseTally.choice, ResponseTally.responses, ResponseTally.correct
+    ).filter(ResponseTally.question_set_id == set_id).all()
+
+    counts = {}
+    for question_id, letter, total, correct in rows:
+        entry = counts.setdefault(question_id, dict({'total': 0, 'correct': 0}, **{c: 0 for c in CHOICES}))
+        entry['total'] += total
+        entry['correct'] += correct
+        if letter in CHOICES:
+            entry[letter] += total
+    return counts
+
+
+def question_breakdown(set_id, questions=None):
+    """
+    Per-question rows for the analytics page and export, in q_id order:
+    dicts with question, total_responses, correct_count, success_rate and
+    choice_a .. choice_d.
+    """
+    if questions is None:
+        questions = Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id).all()
+    counts = choice_counts(set_id)
+    empty = dict({'total': 0, 'correct': 0}, **{c: 0 for c in CHOICES})
+    breakdown = []
+    for question in questions:
+        entry = counts.get(question.q_id, empty)
+        total = entry['total']
+        breakdown.append({
+            'question': question,
+            'total_responses': total,
+            'correct_count': entry['correct'],
+            'success_rate': (entry['correct'] / total) * 100 if total else 0,
+            'choice_a': entry['A'],
+            'choice_b': entry['B'],
+            'choice_c': entry['C'],
+            'choice_d': entry['D'],
+        })
+    return breakdown
@@ -0,0 +1,218 @@
+"""
+JSON quiz API.
+
+Runs the same quiz as the ready -> start_timer -> question pages, with the
+same server-side timing and anti-cheat rules, but each question costs two
+small requests instead of four (two of them redirects):
+
+    GET  /api/quiz/current       current question (content only once its timer runs)
+    POST /api/quiz/start_timer   start the timer of the current question
+    POST /api/quiz/answer        submit an answer; the response carries the next question
+
+The correct answer is never sent to the client.
+"""
+from flask import render_template, request, session, url_for, redirect, flash
+from flask_login import current_user, login_required
+from datetime import datetime
+
+from app import app
+from app.routes import (
+    _get_quiz_question, get_question_elapsed, set_question_start_time, pop_question_start_time,
+    question_choices, record_answer, question_image_url
+)
+
+
+def _current_question_id():
+    """First question of the queue that is neither answered nor skipped (timed out)."""
+    queue = session.get('question_queue', [])
+    answered = set(session.get('answered_questions', []))
+    position = session.get('quiz_position', 0)
+    while position < len(queue) and queue[position] in answered:
+        position += 1
+    return queue[position] if position < len(queue) else None
+
+
+def _advance_past(q_id):
+    queue = session.get('question_queue', [])
+    try:
+        session['quiz_position'] = queue.index(q_id) + 1
+    except ValueError:
+        pass
+
+
+def _question_payload(q):
+    """
+    Describe a question for the client. Stem, choices and image are only
+    included once its timer has started, exactly like the ready screen.
+    """
+    queue = session.get('question_queue', [])
+    elapsed = get_question_elapsed(q.q_id)
+    payload = {
+        'q_id': q.q_id,
+        'number': len(session.get('answered_questions', [])) + 1,
+        'total': len(queue),
+        'time_limit': q.time_limit,
+        'timer_started': elapsed is not None,
+    }
+    if elapsed is not None:
+        payload.update({
+            'question': q.ques,
+            'question_type': q.question_type,
+            'choices': [value for value, label in question_choices(q)],
+            'image_url': question_image_url(q.image_file),
+            'remaining_time': int(max(0, q.time_limit - elapsed)),
+        })
+    return payload
+
+
+def _next_payload(status, **extra):
+    """Response body pointing at the next question, or at the score page when done."""
+    body = {'status': status}
+    body.update(extra)
+    next_id = _current_question_id()
+    next_q = _get_quiz_question(next_id) if next_id is not None else None
+    if next_q:
+        body['next'] = _question_payload(next_q)
+        body['finished'] = False
+    else:
+        body['next'] = None
+        body['finished'] = True
+        body['score_url'] = url_for('score')
+    return body
+
+
+def _check_quiz_session():
+    """Return an error response tuple if the caller cannot take a quiz right now."""
+    if current_user.is_admin:
+        return {'status': 'error', 'message': 'Admins cannot take the quiz.'}, 403
+    if not session.get('quiz_started'):
+        return {'status': 'no_quiz', 'message': 'No active quiz session.',
+                'start_url': url_for('start_quiz', mode='api')}, 409
+    return None
+
+
+def _requested_question(current_id):
+    """The q_id the client acts on must be the current question."""
+    data = request.get_json(silent=True) or request.form
+    q_id = data.get('q_id')
+    try:
+        q_id = int(q_id) if q_id is not None else current_id
+    except (TypeError, ValueError):
+        return None, ({'status': 'error', 'message': 'Invalid q_id.'}, 400)
+    if q_id != current_id:
+        return None, ({'status': 'out_of_order', 'message': 'That is not the current question.',
+                       'current_q_id': current_id}, 409)
+    return q_id, None
+
+
+@app.route('/api/quiz/current')
+@login_required
+def api_quiz_current():
+    """Current question of the running quiz (without its answer)"""
+    error = _check_quiz_session()
+    if error:
+        return error
+
+    current_id = _current_question_id()
+    q = _get_quiz_question(current_id) if current_id is not None else None
+    if not q:
+        return {'status': 'finished', 'finished': True, 'score_url': url_for('score')}
+
+    elapsed = get_question_elapsed(q.q_id)
+    if elapsed is not None and elapsed > q.time_limit:
+        # Timer ran out while the client was away: same as the question page
+        pop_question_start_time(q.q_id)
+        _advance_past(q.q_id)
+        return _next_payload('expired', expired_q_id=q.q_id)
+
+    return {'status': 'in_progress' if elapsed is not None else 'ready',
+            'question': _question_payload(q), 'finished': False}
+
+
+@app.route('/api/quiz/start_timer', methods=['POST'])
+@login_required
+def api_quiz_start_timer():
+    """Start the server-side timer of the current question and return its content"""
+    error = _check_quiz_session()
+    if error:
+        return error
+
+    current_id = _current_question_id()
+    if current_id is None:
+        return {'status': 'finished', 'finished': True, 'score_url': url_for('score')}
+    q_id, error = _requested_question(current_id)
+    if error:
+        return error
+    q = _get_quiz_question(q_id)
+    if not q:
+        _advance_past(q_id)
+        return _next_payload('skipped', skipped_q_id=q_id)
+
+    # SECURITY: a running timer is never restarted
+    elapsed = get_question_elapsed(q_id)
+    if elapsed is None:
+        set_question_start_time(q_id, datetime.utcnow().timestamp())
+        status = 'started'
+    elif elapsed > q.time_limit:
+        pop_question_start_time(q_id)
+        _advance_past(q_id)
+        return _next_payload('expired', expired_q_id=q_id)
+    else:
+        status = 'already_started'
+
+    return {'status': status, 'question': _question_payload(q), 'finished': False}
+
+
+@app.route('/api/quiz/answer', methods=['POST'])
+@login_required
+def api_quiz_answer():
+    """Submit the answer for the current question; returns the next question"""
+    error = _check_quiz_session()
+    if error:
+        return error
+
+    current_id = _current_question_id()
+    if current_id is None:
+        return {'status': 'finished', 'finished': True, 'score_url': url_for('score')}
+    q_id, error = _requested_question(current_id)
+    if error:
+        return error
+    q = _get_quiz_question(q_id)
+    if not q:
+        _advance_past(q_id)
+        return _next_payload('skipped', skipped_q_id=q_id)
+
+    # SECURITY CHECK: the timer must have been started through start_timer
+    time_taken = get_question_elapsed(q_id)
+    if time_taken is None:
+        return {'status': 'timer_not_started', 'message': 'Start the question timer first.',
+                'question': _question_payload(q)}, 409
+
+    # Server-side timer enforcement, identical to the question page
+    if time_taken > q.time_limit:
+        pop_question_start_time(q_id)
+        _advance_past(q_id)
+        return _next_payload('expired', expired_q_id=q_id)
+
+    data = request.get_json(silent=True) or request.form
+    option = data.get('option')
+    if not option:
+        return {'status': 'error', 'message': 'Please select an answer.'}, 400
+    if option not in [value for value, label in question_choices(q)]:
+        return {'status': 'error', 'message': 'Invalid answer choice.'}, 400
+
+    record_answer(q, option, time_taken)
+    _advance_past(q_id)
+    return _next_payload('recorded')
+
+
+@app.route('/quiz')
+@login_required
+def quiz_app():
+    """Single-page quiz that talks to the JSON API"""
+    if current_user.is_admin:
+        flash('Admins cannot take the quiz. Please use a student account.', 'warning')
+        return redirect(url_for('admin_dashboard'))
+    if not session.get('quiz_started'):
+        return redirect(url_for('start_quiz', mode='api'))
+    return render_template('quiz_app.html', title='Quiz')
@@ -0,0 +1,200 @@
+"""
+In-process caches for the student quiz flow and the admin pages.
+
+Every page of an exam reads the same active QuestionSet and the same few
+dozen Questions rows. They are loaded once into immutable records and served
+from memory until an admin write path calls ``question_cache.invalidate()``.
+
+Every admin page shows the section switcher, and the student list offers a
+section filter; both come from ``section_cache``, which the section editor,
+the student imports and ``switch_section`` invalidate.
+"""
+import threading
+from collections import namedtuple
+
+from app import db
+from app.models import Questions, QuestionSet, Section, User
+
+
+QuestionRecord = namedtuple('QuestionRecord', [c.name for c in Questions.__table__.columns])
+QuestionSetRecord = namedtuple('QuestionSetRecord', ['id', 'name', 'quiz_category', 'is_active', 'description'])
+SectionRecord = namedtuple('SectionRecord', ['id', 'name', 'is_active'])
+
+
+def _question_record(q):
+    return QuestionRecord(**{field: getattr(q, field) for field in QuestionRecord._fields})
+
+
+def _set_record(s):
+    return QuestionSetRecord(**{field: getattr(s, field) for field in QuestionSetRecord._fields})
+
+
+class QuestionCache(object):
+    """
+    Versioned cache of QuestionSet -> ordered question records.
+
+    Each fill remembers the version it started under; if an invalidation
+    happens while the database is being read, the stale result is dropped
+    instead of being stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._active_sets = {}  # category -> QuestionSetRecord (or None when no set is active)
+        self._set_questions = {}  # set_id -> (records ordered by q_id, {q_id: record})
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        """Drop every cached entry. Call after any commit that touches questions or sets."""
+        with self._lock:
+            self._version += 1
+            self._active_sets.clear()
+            self._set_questions.clear()
+            self.invalidations += 1
+
+    def _lookup(self, store, key):
+        with self._lock:
+            if key in store:
+                self.hits += 1
+                return True, store[key], self._version
+            self.misses += 1
+            return False, None, self._version
+
+    def _store(self, store, key, value, version):
+        with self._lock:
+            if version == self._version:
+                store[key] = value
+
+    def active_set(self, category):
+        """Return the active QuestionSetRecord for a category, or None."""
+        found, record, version = self._lookup(self._active_sets, category)
+        if found:
+            return record
+        row = QuestionSet.query.filter_by(quiz_category=category, is_active=True).first()
+        record = _set_record(row) if row else None
+        self._store(self._active_sets, category, record, version)
+        return record
+
+    def _set_entry(self, set_id):
+        found, entry, version = self._lookup(self._set_questions, set_id)
+        if found:
+            return entry
+        rows = Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id.asc()).all()
+        records = tuple(_question_record(q) for q in rows)
+        entry = (records, {r.q_id: r for r in records})
+        self._store(self._set_questions, set_id, entry, version)
+        return entry
+
+    def set_questions(self, set_id):
+        """Return the questions of a set as a tuple of records ordered by q_id."""
+        return self._set_entry(set_id)[0]
+
+    def get_question(self, set_id, q_id):
+        """Return one question of a set, or None if it is not part of the set."""
+        return self._set_entry(set_id)[1].get(q_id)
+
+    def next_question(self, set_id, q_id):
+        """Return the first question of the set with an id greater than q_id, or None."""
+        for record in self.set_questions(set_id):
+            if record.q_id > q_id:
+                return record
+        return None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'cached_categories': len(self._active_sets),
+                'cached_sets': len(self._set_questions),
+            }
+
+
+question_cache = QuestionCache()
+
+
+class SectionCache(object):
+    """
+    The Section rows ordered by name, plus the names the student filter
+    offers (sections and the free-text User.section values). Versioned like
+    QuestionCache: a fill that overlaps an invalidation is not stored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._sections = None  # (records ordered by name, {id: record}, {name: record})
+        self._filter_names = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self):
+        """Call after any commit that adds, renames or removes sections or changes User.section."""
+        with self._lock:
+            self._version += 1
+            self._sections = None
+            self._filter_names = None
+            self.invalidations += 1
+
+    def _get(self, name, load):
+        with self._lock:
+            value = getattr(self, name)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            version = self._version
+        value = load()
+        with self._lock:
+            if version == self._version:
+                setattr(self, name, value)
+        return value
+
+    def _load_sections(self):
+        records = tuple(SectionRecord(s.id, s.name, s.is_active) for s in Section.query.order_by(Section.name))
+        return records, {r.id: r for r in records}, {r.name: r for r in records}
+
+    def _load_filter_names(self):
+        names = {name for (name,) in db.session.query(Section.name)}
+        names.update(name for (name,) in db.session.query(User.section).filter(User.is_admin == False).distinct()
+                     if name)
+        return sorted(names)
+
+    def sections(self):
+        """All sections as SectionRecords, ordered by name."""
+        return self._get('_sections', self._load_sections)[0]
+
+    def get(self, section_id):
+        return self._get('_sections', self._load_sections)[1].get(section_id)
+
+    def by_name(self, name):
+        return self._get('_sections', self._load_sections)[2].get(name)
+
+    def filter_names(self):
+        """Sorted section names for the student filter, including legacy free-text sections."""
+        return self._get('_filter_names', self._load_filter_names)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'cached_sections': len(self._sections[0]) if self._sections is not None else None,
+            }
+
+
+section_cache = SectionCache()
@@ -1,5 +1,8 @@
 from app import app, db
 from app.models import Questions, User
+from app.analytics import rebuild_tallies
+from app.image_store import image_store
+from app.static_assets import static_assets
 import click
 
 @app.cli.command("initdb")
@@ -67,3 +70,35 @@ def create_admin(username, email, password):
     db.session.add(u)
     db.session.commit()
     click.echo(f"Admin created: {username} <{email}>")
+
+
+@app.cli.command("rebuild-analytics")
+@click.option("--set-id", type=int, default=None, help="Only rebuild this question set")
+def rebuild_analytics(set_id):
+    """Recompute the analytics counter tables from the raw StudentResponse rows."""
+    rebuild_tallies(set_id)
+    scope = f"question set {set_id}" if set_id else "all question sets"
+    click.echo(f"Analytics counters rebuilt for {scope}.")
+
+
+@app.cli.command("dedupe-images")
+def dedupe_images():
+    """Move timestamped question images into the content-addressed store."""
+    names = [name for (name,) in db.session.query(Questions.image_file)
+             .filter(Questions.image_file != None).distinct()]
+    moved = 0
+    for name in names:
+        new_name = image_store.adopt(name)
+        if new_name:
+            moved += 1
+            click.echo(f"{name} -> {new_name}")
+    removed = image_store.collect_garbage()
+    click.echo(f"{moved} images moved into the store, {len(removed)} unreferenced files removed.")
+
+
+@app.cli.command("build-assets")
+def build_assets():
+    """Fingerprint and gzip the files under app/static (also done at startup)."""
+    hashed = static_assets.build()
+    stats = static_assets.stats()
+    click.echo(f"{stats['files']} static files, {hashed} hashed, {stats['precompressed']} precompressed.")
@@ -0,0 +1,204 @@
+"""
+gzip Content-Encoding for the app's text responses.
+
+The admin question and student tables run to hundreds of rows, and quiz
+pages and JSON answers go to sixty clients over the same Wi-Fi; all of it
+used to be sent uncompressed. ``GzipMiddleware`` wraps the WSGI app and
+compresses a response when:
+
+* the client accepts gzip (``Accept-Encoding``, honouring ``q=0``),
+* its Content-Type is text (HTML, CSS, JS, JSON, CSV, XML, SVG),
+* it is at least COMPRESS_MIN_SIZE bytes, or streamed without a
+  Content-Length,
+* it has no Content-Encoding yet, so the CSV exports and precompressed
+  assets that gzip themselves pass through untouched, as do responses
+  marked ``Cache-Control: no-transform``.
+
+A strong ETag of a compressed response gets a ``-gzip`` suffix, since the
+body is a different representation. The app only knows the plain tag, so
+``If-None-Match`` is handed to it with the suffix removed as well, and a
+304 for a suffixed tag goes back out with the suffix.
+
+Bodies are compressed chunk by chunk as the app produces them, so streamed
+responses stay streamed. Raw and sent bytes are counted per Flask endpoint.
+
+Select the level with COMPRESS_LEVEL and turn it off with COMPRESS=0.
+"""
+import threading
+import zlib
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+
+ENDPOINT_KEY = 'evaluation_app.endpoint'
+GZIP_SUFFIX = '-gzip'
+COMPRESSIBLE_TYPES = frozenset([
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+])
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers, *names):
+    names = {name.lower() for name in names}
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _gzip_etag(etag):
+    """"abc" -> "abc-gzip" (weak tags are left alone)"""
+    if etag and not etag.startswith('W/') and not etag.endswith(GZIP_SUFFIX + '"'):
+        return etag[:-1] + GZIP_SUFFIX + '"'
+    return etag
+
+
+def _accepts_gzip(environ):
+    return bool(parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))['gzip'])
+
+
+def _endpoint(environ):
+    return environ.get(ENDPOINT_KEY) or '(unmatched)'
+
+
+def _remember_endpoint():
+    """before_request: note the endpoint in the environ, which outlives the request context."""
+    request.environ[ENDPOINT_KEY] = request.endpoint
+
+
+class GzipMiddleware(object):
+
+    def __init__(self, wsgi_app, min_size=1024, level=6):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.level = level
+        self._lock = threading.Lock()
+        self._endpoints = {}  # endpoint -> [responses, compressed, raw bytes, sent bytes]
+
+    def _compressible(self, environ, status, headers):
+        if environ.get('REQUEST_METHOD') == 'HEAD' or status[:3] in ('204', '206', '304'):
+            return False
+        content_type = (_header(headers, 'Content-Type') or '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return False
+        if _header(headers, 'Content-Encoding') or 'no-transform' in (_header(headers, 'Cache-Control') or ''):
+            return False
+        length = _header(headers, 'Content-Length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        if not _accepts_gzip(environ):
+            return self.wsgi_app(environ, start_response)
+
+        state = {}
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        suffixed = GZIP_SUFFIX + '"'
+        if if_none_match and suffixed in if_none_match:
+            # Tags we suffixed earlier: let the app see the plain tags too
+            # (the originals stay, for responses that gzip themselves)
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match + ', ' + if_none_match.replace(suffixed, '"')
+            state['suffixed_tags'] = True
+
+        def gzip_start_response(status, headers, exc_info=None):
+            state['compress'] = self._compressible(environ, status, headers)
+            if status[:3] == '304' and state.get('suffixed_tags'):
+                # Not modified for a tag we suffixed: keep the compressed variant's tag
+                etag = _header(headers, 'ETag')
+                if etag:
+                    headers = _without(headers, 'ETag') + [('ETag', _gzip_etag(etag))]
+            elif state['compress']:
+                headers = _without(headers, 'Content-Length')
+                headers.append(('Content-Encoding', 'gzip'))
+                vary = _header(headers, 'Vary')
+                if not vary:
+                    headers.append(('Vary', 'Accept-Encoding'))
+                elif 'accept-encoding' not in vary.lower():
+                    headers = _without(headers, 'Vary') + [('Vary', vary + ', Accept-Encoding')]
+                etag = _header(headers, 'ETag')
+                if etag:
+                    # The compressed body is a different representation
+                    headers = _without(headers, 'ETag') + [('ETag', _gzip_etag(etag))]
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, gzip_start_response)
+        if state.get('compress') is False:
+            # Passed through as is, keeping the server's file_wrapper (sendfile)
+            self._record(_endpoint(environ), False, 0, 0)
+            return app_iter
+        return self._body(environ, app_iter, state)
+
+    def _body(self, environ, app_iter, state):
+        raw = sent = 0
+        compressor = None
+        try:
+            for chunk in app_iter:
+                raw += len(chunk)
+                if compressor is None and state.get('compress'):
+                    compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: gzip container
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                    if not chunk:
+                        continue
+                sent += len(chunk)
+                yield chunk
+            if compressor is None and state.get('compress'):
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # empty body
+            if compressor is not None:
+                chunk = compressor.flush()
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            self._record(_endpoint(environ), compressor is not None, raw, sent)
+
+    def _record(self, endpoint, compressed, raw, sent):
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, [0, 0, 0, 0])
+            counters[0] += 1
+            counters[1] += compressed
+            counters[2] += raw
+            counters[3] += sent
+
+    def stats(self):
+        """Totals and, per endpoint, responses, how many were compressed and the bytes saved."""
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    'responses': responses,
+                    'compressed': compressed,
+                    'bytes_in': raw,
+                    'bytes_out': sent,
+                    'bytes_saved': raw - sent,
+                }
+                for endpoint, (responses, compressed, raw, sent) in self._endpoints.items()
+            }
+        saved = sum(e['bytes_saved'] for e in endpoints.values())
+        raw = sum(e['bytes_in'] for e in endpoints.values())
+        return {
+            'min_size': self.min_size,
+            'level': self.level,
+            'bytes_saved': saved,
+            'ratio': round(saved / float(raw), 3) if raw else None,
+            'endpoints': dict(sorted(endpoints.items(), key=lambda item: -item[1]['bytes_saved'])),
+        }
+
+
+def configure_compression(app):
+    """Wrap app.wsgi_app in GzipMiddleware unless COMPRESS is off; returns the middleware."""
+    if not app.config.get('COMPRESS', True):
+        return None
+    middleware = GzipMiddleware(
+        app.wsgi_app,
+        min_size=app.config.get('COMPRESS_MIN_SIZE', 1024),
+        level=app.config.get('COMPRESS_LEVEL', 6),
+    )
+    app.wsgi_app = middleware
+    app.before_request(_remember_endpoint)
+    return middleware
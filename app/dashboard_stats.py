@@ -0,0 +1,179 @@
+"""
+Cached counters for the admin dashboard and the admin home page.
+
+Both pages used to count questions, students and admins and load the five
+newest questions and the top students on every refresh (five queries for
+the dashboard, three for home). They now render from a ``DashboardSnapshot``
+loaded by a single statement:
+
+* users ranked per (role, section) with window functions: the size of
+  every partition and its five best students by legacy marks,
+* questions ranked by q_id: their total and the five newest.
+
+The snapshot is dropped by ``invalidate()`` on the admin write paths
+(students and questions added, edited or deleted, imports, score resets).
+Finished quizzes call ``scores_changed()``, which only shortens the
+snapshot's life to DASHBOARD_STATS_SCORE_DELAY seconds so a burst of
+submissions reloads it once. Nothing is served older than
+DASHBOARD_STATS_TTL seconds, which also bounds what another worker process
+(or a path without a hook) can leave stale.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from app import app, db
+from app.models import User, Questions
+
+
+TOP = 5
+
+QuestionSummary = namedtuple('QuestionSummary', ['q_id', 'ques', 'time_limit'])
+StudentSummary = namedtuple('StudentSummary', ['id', 'username', 'marks'])
+
+
+def _best_first(student):
+    """Sort key: highest marks first, students with marks before those without, then by id."""
+    return (-(student.marks or 0), student.marks is None, student.id)
+
+
+class DashboardSnapshot(object):
+
+    def __init__(self, question_count, recent_questions, students, admin_count, top_students):
+        self.question_count = question_count
+        self.recent_questions = recent_questions
+        self.admin_count = admin_count
+        self._students = students  # section_id -> count
+        self._top = top_students  # section_id -> [StudentSummary], best first
+
+    def student_count(self, section_id=None):
+        """Students in one section, or in all of them."""
+        if section_id:
+            return self._students.get(section_id, 0)
+        return sum(self._students.values())
+
+    def top_students(self, section_id=None):
+        """The TOP students by marks (no marks counting as 0), of one section or overall."""
+        if section_id:
+            return list(self._top.get(section_id, []))
+        merged = [student for students in self._top.values() for student in students]
+        return sorted(merged, key=_best_first)[:TOP]
+
+    def scored_students(self):
+        """The TOP students that have marks, best first."""
+        return [student for student in self.top_students() if student.marks is not None]
+
+
+def _load_snapshot():
+    """Everything the two pages show, in one UNION ALL statement."""
+    partition = (User.is_admin, User.section_id)
+    users = db.session.query(
+        User.id.label('id'),
+        User.username.label('label'),
+        User.marks.label('number'),
+        User.section_id.label('section_id'),
+        User.is_admin.label('is_admin'),
+        db.func.row_number().over(
+            partition_by=partition,
+            order_by=(db.desc(db.func.coalesce(User.marks, 0)), User.marks.is_(None), User.id)
+        ).label('position'),
+        db.func.count(User.id).over(partition_by=partition).label('total')
+    ).subquery()
+    questions = db.session.query(
+        Questions.q_id.label('id'),
+        Questions.ques.label('label'),
+        Questions.time_limit.label('number'),
+        db.func.row_number().over(order_by=db.desc(Questions.q_id)).label('position'),
+        db.func.count(Questions.q_id).over().label('total')
+    ).subquery()
+
+    rows = db.session.query(
+        db.literal('user').label('kind'), users.c.id, users.c.label, users.c.number,
+        users.c.section_id, users.c.is_admin, users.c.total
+    ).filter(users.c.position <= TOP).union_all(db.session.query(
+        db.literal('question').label('kind'), questions.c.id, questions.c.label, questions.c.number,
+        db.null(), db.null(), questions.c.total
+    ).filter(questions.c.position <= TOP)).all()
+
+    question_count = admin_count = 0
+    recent_questions = []
+    students = {}
+    top = {}
+    for kind, row_id, label, number, section_id, is_admin, total in rows:
+        if kind == 'question':
+            question_count = total
+            recent_questions.append(QuestionSummary(row_id, label, number))
+        elif is_admin:
+            admin_count = total
+        else:
+            students[section_id] = total
+            top.setdefault(section_id, []).append(StudentSummary(row_id, label, number))
+    recent_questions.sort(key=lambda q: q.q_id, reverse=True)
+    for section_students in top.values():
+        section_students.sort(key=_best_first)
+    return DashboardSnapshot(question_count, recent_questions, students, admin_count, top)
+
+
+class DashboardStats(object):
+
+    def __init__(self, ttl=30, score_delay=5):
+        self.ttl = ttl
+        self.score_delay = score_delay
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._expires_at = 0.0
+        self._version = 0
+        self._score_changes = 0
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is not None and now < self._expires_at:
+                self.hits += 1
+                return self._snapshot
+            version, score_changes = self._version, self._score_changes
+        snapshot = _load_snapshot()
+        with self._lock:
+            self.loads += 1
+            # An invalidation during the load means the snapshot may be stale
+            if version == self._version and self.ttl > 0:
+                self._snapshot = snapshot
+                self._loaded_at = now
+                self._expires_at = now + self.ttl
+                if score_changes != self._score_changes:
+                    self._expires_at = min(self._expires_at, time.monotonic() + self.score_delay)
+        return snapshot
+
+    def invalidate(self):
+        """Reload on the next request (after an admin write)."""
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            self._snapshot = None
+
+    def scores_changed(self):
+        """A quiz finished: the marks shown may lag by at most score_delay seconds."""
+        with self._lock:
+            self._score_changes += 1
+            self._expires_at = min(self._expires_at, time.monotonic() + self.score_delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'loads': self.loads,
+                'invalidations': self.invalidations,
+                'ttl': self.ttl,
+                'score_delay': self.score_delay,
+                'age': round(time.monotonic() - self._loaded_at, 1) if self._snapshot is not None else None,
+            }
+
+
+dashboard_stats = DashboardStats(
+    ttl=app.config.get('DASHBOARD_STATS_TTL', 30),
+    score_delay=app.config.get('DASHBOARD_STATS_SCORE_DELAY', 5),
+)
@@ -0,0 +1,153 @@
+"""
+Streaming CSV downloads.
+
+Exports used to build the whole file in a StringIO and hand ``getvalue()`` to
+``make_response``, so memory held several copies of the file and nothing was
+sent until the last row was written. ``csv_response`` streams instead: rows
+are pulled from the database in batches (``keyset_batches`` or
+``yield_per``), encoded into ~64 KB chunks and, when the client accepts it,
+gzip-compressed on the fly.
+
+The long-format exports (one row per QuizScore or StudentResponse) are
+described by ``LongExport`` so the same rows can be streamed to the browser
+or written to a file by the background job runner.
+"""
+import csv
+import io
+import zlib
+from collections import namedtuple
+
+from flask import Response, request, stream_with_context
+
+from app import app, db
+from app.models import User, QuizScore, QuestionSet, StudentResponse
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def keyset_batches(query, key, batch_size=1000):
+    """
+    Yield the rows of `query` ordered by the unique column `key`, fetching
+    `batch_size` rows at a time with ``key > last`` so no cursor stays open
+    between batches. `key` must be selected as the first column.
+    """
+    last = None
+    while True:
+        batch_query = query if last is None else query.filter(key > last)
+        rows = batch_query.order_by(key).limit(batch_size).all()
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last = rows[-1][0]
+        if len(rows) < batch_size:
+            return
+
+
+def csv_chunks(header, rows):
+    """Encode a header and rows as UTF-8 CSV, yielded in chunks of about CHUNK_SIZE bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _client_accepts_gzip():
+    if request.args.get('gzip') == '0' or not app.config.get('EXPORT_GZIP', True):
+        return False
+    return 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+
+
+def csv_response(filename, header, rows):
+    """
+    A streamed text/csv attachment. `rows` is an iterable that is consumed
+    lazily inside the request context (database batches are fetched as the
+    client reads). Compressed with gzip Content-Encoding when accepted.
+    """
+    chunks = csv_chunks(header, rows)
+    headers = {
+        'Content-Disposition': 'attachment; filename={}'.format(filename),
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no',  # let proxies pass chunks through
+    }
+    if _client_accepts_gzip():
+        chunks = gzip_chunks(chunks, app.config.get('EXPORT_GZIP_LEVEL', 6))
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        headers['Cache-Control'] = 'no-transform'  # ?gzip=0 or EXPORT_GZIP off: keep it plain
+    return Response(stream_with_context(chunks), mimetype='text/csv', headers=headers)
+
+
+# `query` selects `key` (a unique id column) first; `row` formats one result row
+LongExport = namedtuple('LongExport', ['filename', 'header', 'query', 'key', 'row'])
+
+
+def export_rows(export, batch_size=1000):
+    return (export.row(r) for r in keyset_batches(export.query, export.key, batch_size))
+
+
+def _timestamp(value):
+    return value.isoformat() if value else ''
+
+
+def score_history_export(set_id=None):
+    """Every QuizScore (each attempt) with its student and set."""
+    query = db.session.query(
+        QuizScore.id, User.username, User.email, User.section, QuizScore.question_set_id,
+        QuestionSet.name, QuizScore.quiz_category, QuizScore.score, QuizScore.status, QuizScore.timestamp
+    ).join(User, QuizScore.user_id == User.id).outerjoin(
+        QuestionSet, QuizScore.question_set_id == QuestionSet.id
+    )
+    if set_id:
+        query = query.filter(QuizScore.question_set_id == set_id)
+    return LongExport(
+        filename='score_history_set_{}.csv'.format(set_id) if set_id else 'score_history.csv',
+        header=['Score ID', 'Username', 'Email', 'Section', 'Question Set ID', 'Question Set', 'Category',
+                'Score', 'Status', 'Timestamp'],
+        query=query,
+        key=QuizScore.id,
+        row=lambda r: [r[0], r[1], r[2], r[3] or 'Default', r[4], r[5], r[6], r[7], r[8], _timestamp(r[9])],
+    )
+
+
+def responses_export(set_id=None):
+    """Every StudentResponse with its student."""
+    query = db.session.query(
+        StudentResponse.id, User.username, User.section, StudentResponse.question_set_id,
+        StudentResponse.question_id, StudentResponse.selected_answer, StudentResponse.is_correct,
+        StudentResponse.quiz_category, StudentResponse.timestamp
+    ).join(User, StudentResponse.user_id == User.id)
+    if set_id:
+        query = query.filter(StudentResponse.question_set_id == set_id)
+    return LongExport(
+        filename='responses_set_{}.csv'.format(set_id) if set_id else 'responses.csv',
+        header=['Response ID', 'Username', 'Section', 'Question Set ID', 'Question ID', 'Selected Answer',
+                'Correct', 'Category', 'Timestamp'],
+        query=query,
+        key=StudentResponse.id,
+        row=lambda r: [r[0], r[1], r[2] or 'Default', r[3], r[4], r[5], 'yes' if r[6] else 'no', r[7],
+                       _timestamp(r[8])],
+    )
+
+
+LONG_EXPORTS = {
+    'score_history': score_history_export,
+    'responses': responses_export,
+}
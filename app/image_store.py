@@ -0,0 +1,216 @@
+"""
+Content-addressed store for question images.
+
+Uploads used to be saved as ``static/question_images/<timestamp>_<name>``,
+so the same picture uploaded for several questions was stored once per
+upload, and it was served with Flask's default static caching. Now:
+
+* ``store()`` streams the upload to a temporary file in chunks, hashing it
+  as it goes, and renames it to ``<sha256>.<ext>``. If that file already
+  exists, the copy is dropped and the existing file is reused.
+* The reference count of a file is the number of Questions rows whose
+  ``image_file`` names it. ``release()`` runs after a question is deleted
+  or gets a new image, and removes only the files nothing references.
+* ``send_image()`` serves content-addressed files with the hash as a
+  strong ETag and a year-long ``immutable`` Cache-Control, so students load
+  each image once. Older timestamped names are still served, but
+  revalidated on every use since their bytes could change.
+
+Files stay in static/question_images, so ``image_file`` keeps holding a
+bare file name and existing rows and CSV imports work unchanged.
+``flask dedupe-images`` moves the older files into the store.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import request, abort
+from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
+
+from app import app, db
+from app.models import Questions
+
+
+CONTENT_NAME = re.compile(r'^([0-9a-f]{64})\.([a-z0-9]+)$')
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def is_content_addressed(name):
+    return bool(name and CONTENT_NAME.match(name))
+
+
+def _extension(filename):
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lstrip('.').lower()
+    return EXTENSION_ALIASES.get(ext, ext) or 'bin'
+
+
+class ImageStore(object):
+
+    def __init__(self, root, chunk_size=64 * 1024, max_bytes=None, max_age=365 * 24 * 3600, grace=60):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.grace = grace  # seconds a freshly stored file is safe from release()
+        # Held from the existence check to the rename in store() and around
+        # count + unlink in release(), so a file is not removed under a
+        # concurrent upload of the same bytes
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.removed = 0
+        self.served = 0
+        self.not_modified = 0
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def store(self, file_storage):
+        """Save an uploaded FileStorage; returns the ``<sha256>.<ext>`` name to put in image_file."""
+        return self._store_stream(file_storage.stream, file_storage.filename)
+
+    def _store_stream(self, stream, filename):
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if self.max_bytes and size > self.max_bytes:
+                        raise ImageTooLarge('Image is larger than {} MB.'.format(self.max_bytes // (1024 * 1024)))
+                    digest.update(chunk)
+                    out.write(chunk)
+            name = '{}.{}'.format(digest.hexdigest(), _extension(filename))
+            target = self.path(name)
+            with self._lock:
+                if os.path.exists(target):
+                    # Same bytes already stored: refresh the mtime so a
+                    # concurrent release() leaves the file for this upload
+                    os.utime(target, None)
+                    self.deduplicated += 1
+                else:
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, target)
+                    self.stored += 1
+            return name
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def reference_counts(self, names):
+        """name -> number of questions using it, for the given names."""
+        names = [n for n in set(names) if n]
+        if not names:
+            return {}
+        counts = dict.fromkeys(names, 0)
+        counts.update(db.session.query(Questions.image_file, db.func.count(Questions.q_id))
+                      .filter(Questions.image_file.in_(names))
+                      .group_by(Questions.image_file).all())
+        return counts
+
+    def release(self, names):
+        """
+        Remove the files no question references any more. Call after the
+        delete or update is committed; returns the names removed.
+        """
+        removed = []
+        with self._lock:
+            for name, count in self.reference_counts(names).items():
+                path = self.path(name)
+                # Names come from the database; never follow them out of the store
+                if count or secure_filename(name) != name or not os.path.isfile(path):
+                    continue
+                if time.time() - os.path.getmtime(path) < self.grace:
+                    continue  # just stored again by an upload that is not committed yet
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed.append(name)
+            self.removed += len(removed)
+        return removed
+
+    def send_image(self, name):
+        """Response for GET /question_images/<name> with the cache headers for its kind."""
+        if secure_filename(name) != name:
+            abort(404)
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            abort(404)
+        match = CONTENT_NAME.match(name)
+        if match:
+            etag, weak = match.group(1), False
+            cache_control = 'public, max-age={}, immutable'.format(self.max_age)
+        else:
+            etag, weak = '{:x}-{:x}'.format(int(stat.st_mtime), stat.st_size), True
+            cache_control = 'public, no-cache'
+
+        if request.if_none_match.contains_weak(etag) if weak else request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            self.not_modified += 1
+        else:
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            # wrap_file hands the file to the server's wsgi.file_wrapper (sendfile) when it has one
+            response = app.response_class(wrap_file(request.environ, open(path, 'rb')),
+                                          mimetype=mimetype, direct_passthrough=True)
+            response.content_length = stat.st_size
+            self.served += 1
+        response.set_etag(etag, weak=weak)
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    def adopt(self, name):
+        """
+        Move an older (timestamped) image into the store and point its
+        questions at the new name; returns the new name, or None if the
+        file is missing. The old file goes once nothing references it.
+        """
+        path = self.path(name)
+        if is_content_addressed(name) or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            new_name = self._store_stream(f, name)
+        Questions.query.filter_by(image_file=name).update({'image_file': new_name}, synchronize_session=False)
+        db.session.commit()
+        self.release([name])
+        return new_name
+
+    def collect_garbage(self):
+        """Remove stored files no question references (past the grace period); returns their names."""
+        if not os.path.isdir(self.root):
+            return []
+        return self.release([n for n in os.listdir(self.root) if is_content_addressed(n)])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'removed': self.removed,
+                'served': self.served,
+                'not_modified': self.not_modified,
+            }
+
+
+image_store = ImageStore(
+    os.path.join(app.root_path, 'static', 'question_images'),
+    chunk_size=app.config.get('IMAGE_UPLOAD_CHUNK_SIZE', 64 * 1024),
+    max_bytes=app.config.get('IMAGE_MAX_BYTES'),
+    max_age=app.config.get('IMAGE_MAX_AGE', 365 * 24 * 3600),
+)
@@ -0,0 +1,348 @@
+"""
+Classical item statistics for a question set, computed with NumPy.
+
+A set's answers are held as a students x items matrix R of response codes
+(0 = unanswered, else 8 * correct + chosen option 1..4). Correctness X and
+choices C are bit slices of R, and from them:
+
+* difficulty      p_j, the proportion of students answering item j correctly
+* point-biserial  corrected item-total correlation of item j with the
+                  score on the other items
+* discrimination  p_j in the top 27% of total scores minus p_j in the
+                  bottom 27% (Kelley's upper/lower groups)
+* distractors     for every option, the share of the upper group choosing it
+                  minus the share of the lower group (negative is good for a
+                  distractor)
+* KR-20           reliability of the 0/1 scores; Cronbach's alpha uses the
+                  point-weighted item scores, so the two differ only when
+                  questions carry different points
+
+A student who answered a question more than once keeps the best attempt.
+
+Loading R is the expensive part: on SQLite one grouped query returns a
+string of codes per student (reading the covering index
+ix_student_response_set_student), other databases return one row per
+answer. ``ItemStatsCache`` keeps R per set and afterwards only reads the
+answers newer than the last one it has seen.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import sqlalchemy
+
+from app import db
+from app.models import Questions, StudentResponse, ResponseTally
+
+
+CHOICES = ('A', 'B', 'C', 'D')
+GROUP_FRACTION = 0.27
+CORRECT = 8  # bit of a response code; the low bits are the option number
+
+ItemStats = namedtuple('ItemStats', [
+    'students', 'items', 'group_size', 'mean_score', 'sd_score', 'kr20', 'alpha', 'by_question'
+])
+
+
+def _case(whens, else_):
+    """CASE WHEN ... END; SQLAlchemy before 1.4 takes the whens as one list."""
+    if tuple(int(part) for part in sqlalchemy.__version__.split('.')[:2]) < (1, 4):
+        return db.case(list(whens), else_=else_)
+    return db.case(*whens, else_=else_)
+
+
+def _response_code():
+    """
+    CORRECT for a correct answer (its option is the question's answer,
+    filled in by ResponseMatrix), else the option chosen, matched by text or
+    by letter: 1..4, or 0 if none matches.
+    """
+    options = (Questions.a, Questions.b, Questions.c, Questions.d)
+    whens = [(StudentResponse.is_correct, CORRECT)]
+    whens += [(StudentResponse.selected_answer == column, number) for number, column in enumerate(options, 1)]
+    whens += [(StudentResponse.selected_answer == letter, number) for number, letter in enumerate(CHOICES, 1)]
+    return _case(whens, else_=0)
+
+
+def _fetch_array(query, columns):
+    """Run a query of integer columns straight into an (n, columns) int64 array."""
+    result = db.session.execute(query.statement)
+    return np.fromiter(itertools.chain.from_iterable(result), dtype=np.int64).reshape(-1, columns)
+
+
+def _load_responses(set_id, newest, after_id=None):
+    """(user_ids, question_ids, codes) of a set's answers with after_id < id <= newest."""
+    def answers(*columns):
+        query = db.session.query(*columns).join(Questions, StudentResponse.question_id == Questions.q_id)
+        if after_id is None:
+            return query.filter(StudentResponse.question_set_id == set_id, StudentResponse.id <= newest)
+        # "+ 0" keeps the planner on the primary key range instead of scanning the set's index
+        return query.filter(StudentResponse.id > after_id, StudentResponse.id <= newest,
+                            StudentResponse.question_set_id + 0 == set_id)
+
+    if after_id is not None or db.engine.dialect.name != 'sqlite':
+        data = _fetch_array(answers(StudentResponse.user_id, StudentResponse.question_id, _response_code()), 3)
+        return data[:, 0], data[:, 1], data[:, 2]
+
+    # One row per student, the answers packed as "question_id*16 + code,..." by SQLite
+    rows = db.session.execute(answers(
+        StudentResponse.user_id,
+        db.func.count(StudentResponse.id),
+        db.func.group_concat(StudentResponse.question_id * 16 + _response_code())
+    ).group_by(StudentResponse.user_id).statement).fetchall()
+    packed = np.fromstring(','.join(text for _, _, text in rows), dtype=np.int64, sep=',') if rows \
+        else np.zeros(0, dtype=np.int64)
+    user_ids = np.repeat(np.array([user_id for user_id, _, _ in rows], dtype=np.int64),
+                         np.array([count for _, count, _ in rows], dtype=np.int64))
+    return user_ids, packed >> 4, packed & 15
+
+
+class ResponseMatrix(object):
+    """The R matrix of one set, grown as new students and answers arrive."""
+
+    def __init__(self, questions):
+        self.question_ids = np.array([q.q_id for q in questions], dtype=np.int64)
+        # Option number of each question's answer, for the correct codes
+        self.answers = np.array([
+            next((number for number, option in enumerate((q.a, q.b, q.c, q.d), 1) if option == q.ans), 0)
+            for q in questions
+        ], dtype=np.int8)
+        self.rows = {}  # user_id -> row of R
+        self.R = np.zeros((0, len(questions)), dtype=np.int8)
+        self.responses = 0
+
+    @property
+    def students(self):
+        return len(self.rows)
+
+    def _student_rows(self, user_ids):
+        unique, inverse = np.unique(user_ids, return_inverse=True)
+        for user_id in unique.tolist():
+            if user_id not in self.rows:
+                self.rows[user_id] = len(self.rows)
+        if len(self.rows) > self.R.shape[0]:
+            grown = np.zeros((max(len(self.rows), 2 * self.R.shape[0]), self.R.shape[1]), dtype=np.int8)
+            grown[:self.R.shape[0]] = self.R
+            self.R = grown
+        return np.array([self.rows[user_id] for user_id in unique.tolist()], dtype=np.int64)[inverse]
+
+    def add(self, user_ids, question_ids, codes):
+        """Merge answers into R; a cell keeps its highest code, i.e. the best attempt."""
+        self.responses += len(codes)
+        k = len(self.question_ids)
+        if not len(codes) or not k:
+            return
+        item = np.searchsorted(self.question_ids, question_ids)
+        known = self.question_ids[np.minimum(item, k - 1)] == question_ids
+        student = self._student_rows(user_ids[known])
+        item = item[known]
+        cells = student * k + item
+        codes = codes[known].astype(np.int8)
+        correct = codes == CORRECT
+        codes[correct] += self.answers[item[correct]]
+        if len(cells) and np.bincount(cells).max() > 1:
+            order = np.lexsort((codes, cells))
+            cells, codes = cells[order], codes[order]
+            last = np.append(cells[1:] != cells[:-1], True)
+            cells, codes = cells[last], codes[last]
+        flat = self.R.reshape(-1)
+        flat[cells] = np.maximum(flat[cells], codes)
+
+    def view(self):
+        return self.R[:self.students]
+
+    def user_ids(self):
+        """User id of every row of view()."""
+        ids = np.zeros(self.students, dtype=np.int64)
+        ids[list(self.rows.values())] = list(self.rows.keys())
+        return ids
+
+
+def _safe(values):
+    """Array -> list of floats, with NaN (undefined, e.g. zero variance) as None."""
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _reliability(scores, total):
+    """K/(K-1) * (1 - sum of item variances / variance of the total)."""
+    k = scores.shape[1]
+    total_var = total.var()
+    if k < 2 or total_var == 0:
+        return None
+    return float(k / (k - 1.0) * (1.0 - scores.var(axis=0).sum() / total_var))
+
+
+def item_statistics(R, questions, user_ids):
+    """
+    ItemStats of a students x items response-code matrix; `questions` are in
+    column order and `user_ids` (one per row) break ties between equal totals.
+    """
+    n, k = R.shape
+    if n == 0 or k == 0:
+        return ItemStats(n, k, 0, 0.0, 0.0, None, None, {})
+
+    Xf = (R >= CORRECT).astype(np.float64)
+    C = R & (CORRECT - 1)
+    total = Xf.sum(axis=1)
+    p = Xf.mean(axis=0)
+    item_var = p * (1.0 - p)
+
+    # Corrected point-biserial: correlate each item with the total of the other items
+    centered = total - total.mean()
+    cov_total = Xf.T.dot(centered) / n
+    rest_var = total.var() + item_var - 2.0 * cov_total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        point_biserial = (cov_total - item_var) / np.sqrt(item_var * rest_var)
+
+    # Upper and lower 27% by total score; ties go by user id, so the groups
+    # do not depend on the order in which students were loaded
+    group = max(1, int(round(GROUP_FRACTION * n)))
+    order = np.lexsort((user_ids, total))
+    lower, upper = order[:group], order[-group:]
+    discrimination = Xf[upper].mean(axis=0) - Xf[lower].mean(axis=0)
+    C_upper, C_lower = C[upper], C[lower]
+    distractors = np.stack([
+        (C_upper == number).mean(axis=0) - (C_lower == number).mean(axis=0)
+        for number in range(1, len(CHOICES) + 1)
+    ], axis=1)
+
+    points = np.array([q.points or 1 for q in questions], dtype=np.float64)
+    weighted = Xf * points
+
+    by_question = {}
+    for j, (question, pb, disc, dist) in enumerate(zip(questions, _safe(point_biserial), discrimination, distractors)):
+        by_question[question.q_id] = {
+            'difficulty': float(p[j]),
+            'point_biserial': pb,
+            'discrimination': float(disc),
+            'distractors': {letter: float(d) for letter, d in zip(CHOICES, dist)},
+        }
+    return ItemStats(
+        students=n,
+        items=k,
+        group_size=group,
+        mean_score=float(total.mean()),
+        sd_score=float(total.std()),
+        kr20=_reliability(Xf, total),
+        alpha=_reliability(weighted, weighted.sum(axis=1)),
+        by_question=by_question,
+    )
+
+
+def _set_questions(set_id):
+    return Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id).all()
+
+
+def compute_item_stats(set_id, questions=None):
+    """ItemStats for one set, loaded from scratch; `questions` defaults to the set's questions."""
+    questions = sorted(questions if questions is not None else _set_questions(set_id), key=lambda q: q.q_id)
+    newest = db.session.query(db.func.max(StudentResponse.id)).scalar() or 0
+    matrix = ResponseMatrix(questions)
+    matrix.add(*_load_responses(set_id, newest))
+    return item_statistics(matrix.view(), questions, matrix.user_ids())
+
+
+class ItemStatsCache(object):
+    """
+    ItemStats and the response matrix per set. A call first reads the set's
+    newest StudentResponse id and answer counters:
+
+    * unchanged: the cached ItemStats are returned;
+    * new answers only: those rows are merged into the matrix and the
+      statistics recomputed;
+    * fewer answers than the matrix holds (a reset or deleted questions),
+      or edited options: the matrix is loaded again.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # set_id -> _Entry
+        self.hits = 0
+        self.updates = 0
+        self.loads = 0
+        self.last_compute_ms = 0.0
+
+    class _Entry(object):
+        __slots__ = ('options', 'points', 'newest', 'counters', 'matrix', 'stats')
+
+    def _state(self, set_id):
+        """
+        (newest answer id, (responses, correct)) of the set, both over the
+        answers whose question still exists, as _load_responses reads them.
+        One query on the set's ResponseTally rows; the newest id is one
+        ix_student_response_set_question lookup per question, so answers in
+        other sets leave this set's entry alone.
+        """
+        newest_of_question = db.session.query(db.func.max(StudentResponse.id)).filter(
+            StudentResponse.question_set_id == ResponseTally.question_set_id,
+            StudentResponse.question_id == ResponseTally.question_id
+        ).correlate(ResponseTally).label('newest')
+        newest, responses, correct = db.session.query(
+            db.func.max(newest_of_question),
+            db.func.sum(ResponseTally.responses),
+            db.func.sum(ResponseTally.correct)
+        ).join(Questions, Questions.q_id == ResponseTally.question_id).filter(
+            ResponseTally.question_set_id == set_id
+        ).one()
+        return newest or 0, (int(responses or 0), int(correct or 0))
+
+    def get(self, set_id, questions=None):
+        questions = sorted(questions if questions is not None else _set_questions(set_id), key=lambda q: q.q_id)
+        options = hash(tuple((q.q_id, q.a, q.b, q.c, q.d, q.ans) for q in questions))
+        points = tuple(q.points for q in questions)
+        newest, counters = self._state(set_id)
+
+        # One computation at a time: the matrices are shared and large
+        with self._lock:
+            entry = self._entries.get(set_id)
+            if entry is not None and entry.options == options:
+                if entry.newest == newest and entry.counters == counters and entry.points == points:
+                    self._entries.move_to_end(set_id)
+                    self.hits += 1
+                    return entry.stats
+            else:
+                entry = None
+
+            started = time.perf_counter()
+            if entry is not None and entry.newest != newest:
+                entry.matrix.add(*_load_responses(set_id, newest, after_id=entry.newest))
+            if entry is not None and entry.matrix.responses == counters[0]:
+                self.updates += 1
+            else:
+                entry = self._Entry()
+                entry.options = options
+                entry.matrix = ResponseMatrix(questions)
+                entry.matrix.add(*_load_responses(set_id, newest))
+                self.loads += 1
+            entry.points, entry.newest, entry.counters = points, newest, counters
+            entry.stats = item_statistics(entry.matrix.view(), questions, entry.matrix.user_ids())
+            self.last_compute_ms = (time.perf_counter() - started) * 1000
+
+            self._entries[set_id] = entry
+            self._entries.move_to_end(set_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry.stats
+
+    def invalidate(self, set_id=None):
+        with self._lock:
+            if set_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(set_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'updates': self.updates,
+                'loads': self.loads,
+                'last_compute_ms': round(self.last_compute_ms, 2),
+            }
+
+
+item_stats_cache = ItemStatsCache()
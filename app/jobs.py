@@ -0,0 +1,266 @@
+"""
+Background job runner for heavy admin operations.
+
+Bulk imports, the score/analytics resets and the delete-all routes used to
+run inside the request thread: on a large database they blocked a waitress
+worker, could run into proxy timeouts and held the SQLite write lock while
+students were answering. Such routes now ``jobs.submit()`` a task and
+redirect to a progress page instead.
+
+* Jobs are rows of BackgroundJob, so their status survives the request and
+  is visible to every admin; result files (CSV reports and exports) are
+  written to JOB_DIR and downloaded when the job is done. Results of a
+  ``one_time`` task (the student import report, which holds passwords) are
+  deleted by their first download; the others are kept JOB_RESULT_TTL.
+* A small thread pool (JOB_WORKERS, default 1) runs them. At most
+  JOB_MAX_PENDING jobs may be queued or running; submitting the same kind
+  with the same parameters again returns the job already in flight.
+* Tasks write in batches of JOB_BATCH_SIZE rows and call ``job.pause()``
+  between batches, so answer inserts get the write lock in between.
+
+Like the write-behind buffer, the runner lives in the server process: jobs
+that were queued or running when the process stopped are marked failed the
+next time the runner starts.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import app, db
+from app.models import BackgroundJob
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobLimitError(Exception):
+    """Raised by submit() when JOB_MAX_PENDING jobs are already queued or running."""
+
+
+class JobContext(object):
+    """What a task gets: its parameters, progress reporting and a result file."""
+
+    def __init__(self, runner, job_id, params):
+        self.runner = runner
+        self.id = job_id
+        self.params = params
+        self.result_file = None
+        self.result_name = None
+        self._last_report = 0.0
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Record progress; throttled to one UPDATE per JOB_PROGRESS_INTERVAL."""
+        now = time.monotonic()
+        if not force and now - self._last_report < self.runner.app.config['JOB_PROGRESS_INTERVAL']:
+            return
+        self._last_report = now
+        values = {'progress': done}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        self.runner._update(self.id, **values)
+
+    def pause(self):
+        """Call between write batches so exam traffic can take the SQLite write lock."""
+        time.sleep(self.runner.app.config['JOB_BATCH_PAUSE'])
+
+    def result_path(self, download_name):
+        """Path of the file offered for download when the job is done."""
+        extension = os.path.splitext(download_name)[1]
+        self.result_file = '{}-{}{}'.format(self.id, uuid.uuid4().hex, extension)
+        self.result_name = download_name
+        return self.runner.path(self.result_file)
+
+
+class JobRunner(object):
+
+    def __init__(self, app):
+        self.app = app
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._started = False
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def task(self, kind, title, one_time=False):
+        """
+        Register a job function: ``fn(job)`` returns the final status message.
+        The result file of a `one_time` task can be downloaded only once.
+        """
+        def register(fn):
+            self._tasks[kind] = (fn, title, one_time)
+            return fn
+        return register
+
+    def title(self, kind):
+        return self._tasks[kind][1] if kind in self._tasks else kind
+
+    def one_time(self, kind):
+        return kind in self._tasks and self._tasks[kind][2]
+
+    def take_result(self, job):
+        """
+        Read and delete the result file of a one-time job; returns its bytes,
+        or None if it is gone or another request took it first.
+        """
+        table = BackgroundJob.__table__
+        with db.engine.begin() as conn:
+            claimed = conn.execute(table.update().where(
+                (table.c.id == job.id) & (table.c.result_file == job.result_file)
+            ).values(result_file=None)).rowcount
+        if not claimed:
+            return None
+        try:
+            with open(self.path(job.result_file), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+        finally:
+            self._remove(job.result_file)
+
+    def path(self, name):
+        return os.path.join(self.app.config['JOB_DIR'], name)
+
+    def save_upload(self, file):
+        """Store an uploaded file for a job; returns its name inside JOB_DIR."""
+        self._start()
+        name = 'upload-{}.csv'.format(uuid.uuid4().hex)
+        file.save(self.path(name))
+        return name
+
+    def submit(self, kind, params=None, user_id=None):
+        """Queue a job (or return the identical one in flight) and return its BackgroundJob."""
+        if kind not in self._tasks:
+            raise KeyError(kind)
+        self._start()
+        self._remove_expired()
+        params_json = json.dumps(params or {}, sort_keys=True)
+        with self._lock:
+            existing = BackgroundJob.query.filter(
+                BackgroundJob.kind == kind,
+                BackgroundJob.params == params_json,
+                BackgroundJob.status.in_(ACTIVE)
+            ).first()
+            if existing is not None:
+                self.deduplicated += 1
+                return existing
+            pending = BackgroundJob.query.filter(BackgroundJob.status.in_(ACTIVE)).count()
+            if pending >= self.app.config['JOB_MAX_PENDING']:
+                self.rejected += 1
+                raise JobLimitError('{} admin jobs are already waiting; try again when they finish.'.format(pending))
+            job = BackgroundJob(kind=kind, params=params_json, status=QUEUED, progress=0, user_id=user_id)
+            db.session.add(job)
+            db.session.commit()
+            self.submitted += 1
+            self._executor().submit(self._run, job.id)
+        return job
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.app.config['JOB_WORKERS'], thread_name_prefix='admin-job')
+            atexit.register(self.stop)
+        return self._pool
+
+    def _start(self):
+        """Once per process: create JOB_DIR, fail orphaned jobs and drop expired result files."""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            os.makedirs(self.app.config['JOB_DIR'], exist_ok=True)
+            BackgroundJob.query.filter(BackgroundJob.status.in_(ACTIVE)).update({
+                'status': FAILED,
+                'error': 'Interrupted by a server restart',
+                'finished_at': datetime.utcnow(),
+            }, synchronize_session=False)
+            db.session.commit()
+            self._remove_expired()
+            self._started = True
+
+    def _remove_expired(self):
+        """Delete result files older than JOB_RESULT_TTL (at startup and with every new job)."""
+        expired = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_RESULT_TTL'])
+        for job in BackgroundJob.query.filter(BackgroundJob.finished_at < expired,
+                                              BackgroundJob.result_file != None).all():
+            self._remove(job.result_file)
+            job.result_file = None
+        db.session.commit()
+
+    def _remove(self, name):
+        try:
+            os.remove(self.path(name))
+        except OSError:
+            pass
+
+    def _update(self, job_id, **values):
+        # Own short transaction, independent of the task's session
+        table = BackgroundJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == job_id).values(**values))
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            job = BackgroundJob.query.get(job_id)
+            fn = self._tasks[job.kind][0]
+            context = JobContext(self, job.id, json.loads(job.params or '{}'))
+            self._update(job_id, status=RUNNING, started_at=datetime.utcnow())
+            try:
+                message = fn(context)
+            except ValueError as e:
+                # Bad input (e.g. a CSV without the required columns): the message is for the admin
+                db.session.rollback()
+                self.failed += 1
+                self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow())
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('Background job %s (%s) failed', job_id, job.kind)
+                self.failed += 1
+                self._update(job_id, status=FAILED, error=str(e), finished_at=datetime.utcnow())
+            else:
+                self.completed += 1
+                table = BackgroundJob.__table__
+                values = {'status': DONE, 'finished_at': datetime.utcnow(),
+                          'progress': db.func.coalesce(table.c.total, table.c.progress),
+                          'result_file': context.result_file, 'result_name': context.result_name}
+                if message:
+                    values['message'] = message[:255]
+                self._update(job_id, **values)
+            finally:
+                upload = context.params.get('upload')
+                if upload:
+                    self._remove(upload)
+                db.session.remove()
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.app.config['JOB_WORKERS'],
+            'max_pending': self.app.config['JOB_MAX_PENDING'],
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+
+jobs = JobRunner(app)
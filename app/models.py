@@ -27,6 +27,11 @@ class QuestionSet(db.Model):
     description = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Active-set lookup per category
+    __table_args__ = (
+        db.Index('ix_question_set_category_active', 'quiz_category', 'is_active'),
+    )
+
     # Relationships
     questions = db.relationship('Questions', backref='question_set', lazy='dynamic')
     scores = db.relationship('QuizScore', backref='question_set', lazy='dynamic')
@@ -45,7 +50,7 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     shuffle_questions = db.Column(db.Boolean, default=False, nullable=False) # Feature to randomize questions per student
     session_token = db.Column(db.String(128), index=True)
-    section = db.Column(db.String(64), default='Default')  # Legacy string field
+    section = db.Column(db.String(64), default='Default', index=True)  # Legacy string field
     section_id = db.Column(db.Integer, db.ForeignKey('section.id'), nullable=True) # New FK
     
     # New relationship for quiz scores
@@ -63,7 +68,9 @@ class User(UserMixin, db.Model):
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # Served from the principal cache; imported here because it imports User
+    from app.principal import user_principals
+    return user_principals.get(int(id))
 
 
 class Questions(db.Model):
@@ -75,11 +82,16 @@ class Questions(db.Model):
     d = db.Column(db.String(100))
     ans = db.Column(db.String(100))
     time_limit = db.Column(db.Integer, default=60, nullable=False)
-    quiz_category = db.Column(db.String(64), default='General', nullable=False)
+    quiz_category = db.Column(db.String(64), default='General', nullable=False, index=True)
     
     # Link to a specific Question Set
     question_set_id = db.Column(db.Integer, db.ForeignKey('question_set.id'), nullable=True)
 
+    # Questions of a set in exam order
+    __table_args__ = (
+        db.Index('ix_questions_set_q_id', 'question_set_id', 'q_id'),
+    )
+
     # Enhanced Educational Content fields
     rationalization = db.Column(db.Text)  # Explanation of the correct answer
     points = db.Column(db.Integer, default=1, nullable=False)  # Weight for harder questions
@@ -102,6 +114,13 @@ class QuizScore(db.Model):
     score = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False, default='completed')  # 'completed' or 'incomplete'
+
+    __table_args__ = (
+        # A student's attempt at a set (retake checks, home page, admin students)
+        db.Index('ix_quiz_score_user_set_status', 'user_id', 'question_set_id', 'status', 'timestamp'),
+        # Leaderboard and rank index: scores of a set by status, best first
+        db.Index('ix_quiz_score_set_status_score', 'question_set_id', 'status', 'score'),
+    )
     
     def __repr__(self):
         return '<QuizScore: {} - {} points in {} ({})>'.format(self.user_id, self.score, self.quiz_category, self.status)
@@ -119,6 +138,16 @@ class StudentResponse(db.Model):
     quiz_category = db.Column(db.String(64), nullable=False)
     question_set_id = db.Column(db.Integer, db.ForeignKey('question_set.id'), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Analytics: responses of a set, per question
+        db.Index('ix_student_response_set_question', 'question_set_id', 'question_id'),
+        # Question deletes clear their responses by question_id alone
+        db.Index('ix_student_response_question', 'question_id'),
+        # Item statistics: a set's answers per student, read from the index alone
+        db.Index('ix_student_response_set_student', 'question_set_id', 'user_id', 'question_id',
+                 'is_correct', 'selected_answer'),
+    )
     
     # Define the relationship from the StudentResponse side with proper cascade
     question = db.relationship('Questions', backref=db.backref('responses', cascade='all, delete-orphan'))
@@ -127,3 +156,63 @@ class StudentResponse(db.Model):
     def __repr__(self):
         return '<StudentResponse: User {} answered {} for Q{} ({}correct)>'.format(
             self.user_id, self.selected_answer, self.question_id, '' if self.is_correct else 'in')
+
+
+class ResponseTally(db.Model):
+    """
+    Running counts of StudentResponse per (set, question, chosen answer).
+    Maintained in the same transaction as each response insert so analytics
+    never has to scan the response table; `flask rebuild-analytics` recomputes it.
+    """
+    __tablename__ = 'response_tally'
+
+    question_set_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    question_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    choice = db.Column(db.String(100), primary_key=True)  # same value as StudentResponse.selected_answer
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<ResponseTally: set {} Q{} {!r} = {}>'.format(
+            self.question_set_id, self.question_id, self.choice, self.responses)
+
+
+class StudentResponseTally(db.Model):
+    """Running answered/correct counts per (set, student), kept alongside ResponseTally."""
+    __tablename__ = 'response_student_tally'
+
+    question_set_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<StudentResponseTally: set {} user {} = {}/{}>'.format(
+            self.question_set_id, self.user_id, self.correct, self.responses)
+
+
+class BackgroundJob(db.Model):
+    """
+    A heavy admin operation run by the job runner (app/jobs.py) instead of
+    the request thread. The admin polls its progress and downloads
+    `result_file` (under JOB_DIR) once it is done.
+    """
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    result_file = db.Column(db.String(255))  # file name inside JOB_DIR
+    result_name = db.Column(db.String(255))  # download name
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<BackgroundJob: {} {} ({})>'.format(self.id, self.kind, self.status)
@@ -0,0 +1,134 @@
+"""
+Cached login principal for Flask-Login.
+
+``load_user()`` used to run ``User.query.get`` on every authenticated request,
+and ``before_request()`` then compared the row's session_token with the
+cookie. The few columns those checks and the templates need are now kept in
+a small TTL/LRU cache, and ``current_user`` is a ``UserPrincipal`` built from
+that record. Anything else (or any assignment) loads the real User row on
+first use, so routes that need the full model keep working unchanged.
+
+Entries live at most USER_CACHE_TTL seconds and are invalidated by the write
+paths that change a cached field (login, logout, account deletion, shuffle
+toggles, section edits). With several worker processes a login on another
+process is seen here after at most one TTL.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask_login import UserMixin
+
+from app import app
+from app.models import User
+
+
+PrincipalRecord = namedtuple('PrincipalRecord', [
+    'id', 'username', 'is_admin', 'section', 'section_id', 'session_token', 'shuffle_questions', 'marks'
+])
+
+
+def _principal_record(user):
+    return PrincipalRecord(**{field: getattr(user, field) for field in PrincipalRecord._fields})
+
+
+class UserPrincipal(UserMixin):
+    """Stand-in for ``current_user`` backed by a cached PrincipalRecord."""
+
+    def __init__(self, record):
+        object.__setattr__(self, '_record', record)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def user(self):
+        """The full User row, loaded on first access within this request."""
+        if self._user is None:
+            object.__setattr__(self, '_user', User.query.get(self._record.id))
+        return self._user
+
+    def __getattr__(self, name):
+        # Only reached for names that are not set on the principal itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in PrincipalRecord._fields:
+            return getattr(self._record, name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        # Writes go to the mapped row; the cached record is dropped so the
+        # next request reloads it
+        setattr(self.user, name, value)
+        if name in PrincipalRecord._fields:
+            object.__setattr__(self, '_record', self._record._replace(**{name: value}))
+        user_principals.invalidate(self._record.id)
+
+    def __repr__(self):
+        return '<UserPrincipal {}>'.format(self._record.username)
+
+
+class UserPrincipalCache(object):
+    """Size-bounded LRU of PrincipalRecords with a per-entry TTL."""
+
+    def __init__(self, ttl=30, max_entries=5000):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, PrincipalRecord)
+        self._version = 0
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Return a UserPrincipal for user_id, or None if the user does not exist."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None and cached[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return UserPrincipal(cached[1])
+            self.misses += 1
+            version = self._version
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        record = _principal_record(user)
+        with self._lock:
+            # An invalidation during the read means this record may be stale
+            if version == self._version and self.ttl > 0:
+                self._entries[user_id] = (now + self.ttl, record)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        principal = UserPrincipal(record)
+        object.__setattr__(principal, '_user', user)
+        return principal
+
+    def invalidate(self, user_id=None):
+        """Forget one user's record, or every record when user_id is None."""
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'cached_users': len(self._entries),
+                'ttl': self.ttl,
+            }
+
+
+user_principals = UserPrincipalCache(
+    ttl=app.config.get('USER_CACHE_TTL', 30),
+    max_entries=app.config.get('USER_CACHE_MAX', 5000),
+)
@@ -0,0 +1,84 @@
+"""
+Pre-rendered HTML of the question page's card body.
+
+``question()`` used to build a ``QuestionForm`` on every GET and render the
+stem, image, option radios and submit button through WTForms widgets,
+although that markup is the same for every student who sees the question.
+It is now rendered once per question version (question_body.html) and kept
+here; question.html only adds the per-student pieces around it (CSRF token,
+timer values, progress, the base layout).
+
+The version is the tuple of the columns the fragment shows (``FIELDS``),
+so an edit gives the question a new key and the next GET re-renders it; a
+stale fragment can never be served. The answer is not one of the fields
+and never appears in the fragment. Entries are kept LRU, at most
+QUESTION_FRAGMENT_CACHE_MAX.
+"""
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+from app import app
+
+
+FIELDS = ('q_id', 'ques', 'a', 'b', 'c', 'd', 'question_type', 'image_file')
+
+
+def question_version(q):
+    """What the fragment of question `q` (model row or cached record) depends on."""
+    return tuple(getattr(q, field) for field in FIELDS)
+
+
+class QuestionFragments(object):
+
+    def __init__(self, max_entries=1000, enabled=True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # q_id -> (version, Markup)
+        self.hits = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def get(self, q, render):
+        """The fragment of question `q`; `render()` builds its HTML on a miss."""
+        if not self.enabled:
+            return Markup(render())
+        version = question_version(q)
+        with self._lock:
+            entry = self._entries.get(q.q_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(q.q_id)
+                self.hits += 1
+                return entry[1]
+        # Rendered outside the lock; two requests racing on a miss both render
+        html = Markup(render())
+        with self._lock:
+            self.renders += 1
+            self._entries[q.q_id] = (version, html)
+            self._entries.move_to_end(q.q_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return html
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'renders': self.renders,
+                'evictions': self.evictions,
+            }
+
+
+question_fragments = QuestionFragments(
+    max_entries=app.config.get('QUESTION_FRAGMENT_CACHE_MAX', 1000),
+    enabled=app.config.get('QUESTION_FRAGMENT_CACHE', True),
+)
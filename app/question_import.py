@@ -0,0 +1,203 @@
+"""
+Bulk question import for /admin/bulk_upload_questions.
+
+The old loop ran ``Questions.query.filter_by(ques=...)`` and ``SELECT
+max(q_id)`` for every CSV row, and a concurrent insert could take the id it
+had just computed. ``import_questions`` instead:
+
+* parses the whole file into columns and validates them column by column,
+* loads the existing question texts in one query,
+* inserts in chunked transactions without a q_id, so SQLite hands out the
+  ids (one contiguous block per chunk, under its write lock),
+
+and returns a ``QuestionImportReport`` with one ``QuestionImportRow`` per CSV
+row. With ``dry_run=True`` nothing is written.
+"""
+from collections import namedtuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from app.models import Questions
+
+
+QuestionImportRow = namedtuple('QuestionImportRow', ['line', 'question', 'question_type', 'status', 'q_id', 'message'])
+
+CREATED = 'created'
+VALID = 'valid'  # dry run: would be created
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+FAILED = 'failed'
+
+# Column -> accepted CSV headers, first match wins
+COLUMNS = {
+    'question': ('question',),
+    'a': ('a', 'option_a'),
+    'b': ('b', 'option_b'),
+    'c': ('c', 'option_c'),
+    'd': ('d', 'option_d'),
+    'answer': ('answer', 'correct_answer'),
+    'time_limit': ('time_limit',),
+    'type': ('type',),
+    'category': ('category',),
+    'points': ('points',),
+    'rationalization': ('rationalization',),
+    'image_filename': ('image_filename',),
+}
+
+
+class QuestionImportReport(object):
+    """Per-row outcome of a question import, in file order."""
+
+    def __init__(self, rows, dry_run):
+        self.rows = rows
+        self.dry_run = dry_run
+
+    def count(self, status):
+        return sum(1 for row in self.rows if row.status == status)
+
+    @property
+    def accepted(self):
+        """Rows that were (or, in a dry run, would be) created."""
+        return self.count(VALID if self.dry_run else CREATED)
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'accepted': self.accepted,
+            'duplicates': self.count(DUPLICATE),
+            'invalid': self.count(INVALID),
+            'failed': self.count(FAILED),
+            'rows': [row._asdict() for row in self.rows],
+        }
+
+
+def _columns(rows):
+    """Transpose CSV dicts into {column: [stripped values]} with the header aliases resolved."""
+    rows = list(rows)
+    columns = {}
+    for name, headers in COLUMNS.items():
+        present = [h for h in headers if rows and h in rows[0]]
+        key = present[0] if present else None
+        columns[name] = [((row.get(key) or '') if key else '').strip() for row in rows]
+    return len(rows), columns
+
+
+def _int_column(values, default):
+    return [int(v) if v.isdigit() else default for v in values]
+
+
+def validate_questions(rows):
+    """
+    Validate the CSV rows in one pass per column. Returns (count, values,
+    errors): `values` are the Questions column dicts and `errors` the
+    per-row problem (None for valid rows).
+    """
+    count, col = _columns(rows)
+    types = [t or 'MCQ' for t in col['type']]
+    categories = [c or 'General' for c in col['category']]
+    time_limits = _int_column(col['time_limit'], 60)
+    points = _int_column(col['points'], 1)
+
+    # TF questions only need two options; MCQ and Image need all four
+    required = {'TF': ('question', 'a', 'b', 'answer'), 'MCQ': ('question', 'a', 'b', 'c', 'd', 'answer')}
+    required['Image'] = required['MCQ']
+    errors = [None] * count
+    for i, question_type in enumerate(types):
+        if question_type not in required:
+            errors[i] = 'unknown question type "{}"'.format(question_type)
+    for name in ('question', 'a', 'b', 'c', 'd', 'answer'):
+        for i, value in enumerate(col[name]):
+            if not value and errors[i] is None and name in required[types[i]]:
+                errors[i] = '{} is required'.format(name)
+
+    values = []
+    for i in range(count):
+        tf = types[i] == 'TF'
+        values.append({
+            'ques': col['question'][i],
+            'a': col['a'][i],
+            'b': col['b'][i],
+            'c': None if tf else col['c'][i],
+            'd': None if tf else col['d'][i],
+            'ans': col['answer'][i],
+            'time_limit': time_limits[i],
+            'question_type': types[i],
+            'category': categories[i],
+            'quiz_category': categories[i],
+            'points': points[i],
+            'rationalization': col['rationalization'][i],
+            'image_file': col['image_filename'][i] or None,
+        })
+    return count, values, errors
+
+
+def _ids_of(texts):
+    return dict(db.session.query(Questions.ques, Questions.q_id).filter(Questions.ques.in_(texts)))
+
+
+def _insert_chunk(chunk):
+    """Insert (index, values) pairs in one transaction; returns {index: q_id}, or None on a conflict."""
+    try:
+        db.session.execute(Questions.__table__.insert(), [v for _, v in chunk])
+        ids = _ids_of([v['ques'] for _, v in chunk])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return {index: ids.get(v['ques']) for index, v in chunk}
+
+
+def import_questions(rows, dry_run=False, on_chunk=None):
+    """
+    Import CSV question rows. Rows whose text already exists (in the
+    database or earlier in the file) are reported as duplicates. Commits
+    one transaction per chunk of QUESTION_IMPORT_CHUNK_SIZE rows unless
+    `dry_run`; `on_chunk(done, total)` is called after each chunk.
+    """
+    count, values, errors = validate_questions(rows)
+    existing = {text for (text,) in db.session.query(Questions.ques)}
+
+    statuses = [None] * count
+    messages = list(errors)
+    pending = []
+    for i in range(count):
+        if errors[i] is not None:
+            statuses[i] = INVALID
+        elif values[i]['ques'] in existing:
+            statuses[i] = DUPLICATE
+            messages[i] = 'question already exists'
+        else:
+            existing.add(values[i]['ques'])
+            statuses[i] = VALID
+            pending.append(i)
+
+    ids = {}
+    if not dry_run:
+        chunk_size = app.config['QUESTION_IMPORT_CHUNK_SIZE']
+        for start in range(0, len(pending), chunk_size):
+            chunk = [(i, values[i]) for i in pending[start:start + chunk_size]]
+            inserted = _insert_chunk(chunk)
+            if inserted is None:
+                # Another admin added some of these texts meanwhile: drop them and retry once
+                taken = _ids_of([v['ques'] for _, v in chunk])
+                for i, v in chunk:
+                    if v['ques'] in taken:
+                        statuses[i], messages[i] = DUPLICATE, 'question already exists'
+                chunk = [(i, v) for i, v in chunk if v['ques'] not in taken]
+                inserted = _insert_chunk(chunk) if chunk else {}
+                if inserted is None:
+                    for i, _ in chunk:
+                        statuses[i], messages[i] = FAILED, 'insert failed'
+                    continue
+            ids.update(inserted)
+            for i in inserted:
+                statuses[i] = CREATED
+            if on_chunk is not None:
+                on_chunk(min(start + chunk_size, len(pending)), len(pending))
+
+    report = [
+        QuestionImportRow(i + 2, values[i]['ques'], values[i]['question_type'], statuses[i], ids.get(i), messages[i])
+        for i in range(count)  # line 1 is the header
+    ]
+    return QuestionImportReport(report, dry_run)
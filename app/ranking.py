@@ -0,0 +1,323 @@
+"""
+Per-question-set rank index.
+
+Rank on the home and score pages used to be a COUNT(*) of better scores over
+QuizScore for every request. Each question set now gets a Fenwick tree over
+score values, loaded lazily with one query and kept up to date as completed
+scores are recorded or deleted, so rank, top score and percentile are
+O(log n) lookups that never touch the QuizScore table.
+
+The index follows the rank query home() and score() used before: only
+'completed' attempts by non-admin students count, ties share a rank and the
+next rank skips (1, 2, 2, 4).
+
+The leaderboard is separate: it lists LEADERBOARD_STATUSES ('completed'
+and 'incomplete'; disqualified attempts are left out), is ranked in SQL
+with a window function and is cached per (question set, section) until a
+score for that set is written.
+"""
+import threading
+from collections import namedtuple
+
+from app import db
+from app.models import QuizScore, User
+
+
+TopScorer = namedtuple('TopScorer', ['username', 'marks'])
+LeaderboardRow = namedtuple('LeaderboardRow', ['id', 'username', 'marks', 'rank', 'position'])
+
+# Statuses that appear on the leaderboard (disqualified attempts do not)
+LEADERBOARD_STATUSES = ('completed', 'incomplete')
+
+
+class ScoreRankIndex(object):
+    """Fenwick tree over the non-negative integer scores of one question set."""
+
+    def __init__(self, size=16):
+        self._size = size
+        self._tree = [0] * (size + 1)
+        self.total = 0
+        self._entries = {}  # quiz_score_id -> (score, user_id, username)
+
+    def _update(self, score, delta):
+        i = score + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _grow(self, score):
+        size = self._size
+        while score >= size:
+            size *= 2
+        entries = self._entries
+        self.__init__(size)
+        for qs_id, entry in entries.items():
+            self.add(qs_id, *entry)
+
+    def count_at_most(self, score):
+        """Number of scores <= score."""
+        if score < 0:
+            return 0
+        i = min(score + 1, self._size)
+        count = 0
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def _kth_smallest(self, k):
+        """Smallest score s with count_at_most(s) >= k (1-based k)."""
+        position = 0
+        step = 1 << self._size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self._size and self._tree[nxt] < k:
+                position = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return position  # tree index position + 1 holds score `position`
+
+    def add(self, quiz_score_id, score, user_id, username):
+        if quiz_score_id in self._entries:
+            return
+        score = max(0, score or 0)
+        if score >= self._size:
+            self._grow(score)
+        self._entries[quiz_score_id] = (score, user_id, username)
+        self._update(score, 1)
+        self.total += 1
+
+    def remove(self, quiz_score_id):
+        entry = self._entries.pop(quiz_score_id, None)
+        if entry is not None:
+            self._update(entry[0], -1)
+            self.total -= 1
+
+    def remove_user(self, user_id):
+        for qs_id in [k for k, entry in self._entries.items() if entry[1] == user_id]:
+            self.remove(qs_id)
+
+    def rank(self, score):
+        """Competition rank of a score: 1 + number of strictly better scores."""
+        return self.total - self.count_at_most(score) + 1
+
+    def top_score(self):
+        if not self.total:
+            return None
+        return self._kth_smallest(self.total)
+
+    def top_scorer(self):
+        top = self.top_score()
+        if top is None:
+            return None
+        # Earliest recorded attempt with the top score
+        qs_id = min(k for k, entry in self._entries.items() if entry[0] == top)
+        return TopScorer(username=self._entries[qs_id][2], marks=top)
+
+    def percentile(self, score):
+        """Percentile rank (0-100): share of scores below, counting ties as half."""
+        if not self.total:
+            return None
+        below = self.count_at_most(score - 1)
+        equal = self.count_at_most(score) - below
+        return 100.0 * (below + 0.5 * equal) / self.total
+
+
+class RankIndexRegistry(object):
+    """Lazily loaded ScoreRankIndex per question set."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self.loads = 0
+
+    def _index(self, set_id):
+        # Caller holds the lock. Loading under the lock means a score recorded
+        # concurrently is either in the query result or added right after.
+        index = self._indexes.get(set_id)
+        if index is None:
+            index = ScoreRankIndex()
+            rows = db.session.query(QuizScore.id, QuizScore.score, User.id, User.username).join(
+                User, QuizScore.user_id == User.id
+            ).filter(
+                QuizScore.question_set_id == set_id,
+                QuizScore.status == 'completed',
+                User.is_admin == False
+            ).all()
+            for qs_id, score, user_id, username in rows:
+                index.add(qs_id, score, user_id, username)
+            self._indexes[set_id] = index
+            self.loads += 1
+        return index
+
+    def rank(self, set_id, score):
+        with self._lock:
+            return self._index(set_id).rank(score)
+
+    def percentile(self, set_id, score):
+        with self._lock:
+            return self._index(set_id).percentile(score)
+
+    def top_scorer(self, set_id):
+        with self._lock:
+            return self._index(set_id).top_scorer()
+
+    def record(self, quiz_score, username):
+        """Add a committed QuizScore. Only completed attempts count for rank."""
+        if quiz_score.status != 'completed' or not quiz_score.question_set_id:
+            return
+        with self._lock:
+            index = self._indexes.get(quiz_score.question_set_id)
+            if index is not None:
+                index.add(quiz_score.id, quiz_score.score, quiz_score.user_id, username)
+
+    def remove_user(self, user_id):
+        """Forget every score of a user (score reset or account deletion)."""
+        with self._lock:
+            for index in self._indexes.values():
+                index.remove_user(user_id)
+
+    def invalidate(self, set_id=None):
+        """Drop loaded indexes so they are rebuilt from QuizScore on next use."""
+        with self._lock:
+            if set_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(set_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded_sets': len(self._indexes),
+                'loads': self.loads,
+                'scores': sum(index.total for index in self._indexes.values()),
+            }
+
+
+rank_index = RankIndexRegistry()
+
+
+def _leaderboard_filter(query, set_id, category, section_name, legacy):
+    query = query.filter(
+        User.is_admin == False,
+        QuizScore.status.in_(LEADERBOARD_STATUSES)
+    )
+    if legacy:
+        # Scores recorded before question_set_id existed (NULL), matched by category
+        query = query.filter(QuizScore.question_set_id == None, QuizScore.quiz_category == category)
+    else:
+        query = query.filter(QuizScore.question_set_id == set_id)
+    if section_name:
+        query = query.filter(User.section == section_name)
+    return query
+
+
+def _ranked_subquery(set_id, category, section_name, legacy):
+    """
+    One row per score with its competition rank (RANK(), so ties share a rank
+    and the next one skips, like 1, 1, 3) and its display position.
+    """
+    order = [QuizScore.score.desc(), QuizScore.timestamp.asc(), QuizScore.id.asc()]
+    query = db.session.query(
+        User.id.label('id'),
+        User.username.label('username'),
+        QuizScore.score.label('marks'),
+        db.func.rank().over(order_by=QuizScore.score.desc()).label('rank'),
+        db.func.row_number().over(order_by=order).label('position')
+    ).join(User, QuizScore.user_id == User.id)
+    return _leaderboard_filter(query, set_id, category, section_name, legacy).subquery()
+
+
+class LeaderboardCache(object):
+    """
+    Cached leaderboard slices per (question set, section). Entries are
+    dropped by ``invalidate(set_id)`` whenever a score for that set is written.
+    """
+
+    MAX_PAGES_PER_ENTRY = 50
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entries = {}  # (set_id, section_name) -> {'legacy', 'total', 'slices'}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, set_id=None):
+        """Forget cached rows for one set, or for every set when set_id is None."""
+        with self._lock:
+            self._version += 1
+            if set_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == set_id]:
+                    del self._entries[key]
+
+    def _entry(self, set_id, category, section_name):
+        key = (set_id, section_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            version = self._version
+        if entry is not None:
+            return entry, version
+        # Fall back to legacy NULL-set scores only when the set has none of its own
+        legacy = False
+        total = _leaderboard_filter(db.session.query(db.func.count(QuizScore.id)).join(
+            User, QuizScore.user_id == User.id), set_id, category, section_name, False).scalar()
+        if not total:
+            legacy = True
+            total = _leaderboard_filter(db.session.query(db.func.count(QuizScore.id)).join(
+                User, QuizScore.user_id == User.id), set_id, category, section_name, True).scalar()
+        entry = {'legacy': legacy, 'total': total, 'slices': {}}
+        with self._lock:
+            if version == self._version:
+                entry = self._entries.setdefault(key, entry)
+        return entry, version
+
+    def _slice(self, set_id, category, section_name, slice_key, build):
+        entry, version = self._entry(set_id, category, section_name)
+        with self._lock:
+            rows = entry['slices'].get(slice_key)
+            if rows is not None:
+                self.hits += 1
+                return rows, entry['total']
+            self.misses += 1
+        sub = _ranked_subquery(set_id, category, section_name, entry['legacy'])
+        rows = [LeaderboardRow(*row) for row in build(db.session.query(sub), sub)] if entry['total'] else []
+        with self._lock:
+            if version == self._version:
+                if len(entry['slices']) >= self.MAX_PAGES_PER_ENTRY:
+                    entry['slices'].clear()
+                entry['slices'][slice_key] = rows
+        return rows, entry['total']
+
+    def top(self, set_id, category, section_name=None, max_rank=3):
+        """Every row whose rank is <= max_rank (ties at the cut-off included)."""
+        rows, total = self._slice(
+            set_id, category, section_name, ('top', max_rank),
+            lambda query, sub: query.filter(sub.c.rank <= max_rank).order_by(sub.c.position).all()
+        )
+        return rows
+
+    def standings(self, set_id, category, section_name=None, page=1, per_page=25):
+        """One page of the full standings. Returns (rows, total_rows)."""
+        offset = (max(page, 1) - 1) * per_page
+        return self._slice(
+            set_id, category, section_name, ('page', page, per_page),
+            lambda query, sub: query.filter(
+                sub.c.position > offset, sub.c.position <= offset + per_page
+            ).order_by(sub.c.position).all()
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'cached_boards': len(self._entries),
+            }
+
+
+leaderboard_cache = LeaderboardCache()
@@ -1,19 +1,35 @@
-﻿from app import app, db, admin
-from flask import render_template, request, redirect, url_for, session, g, flash, make_response
+﻿from app import app, db, admin, gzip_middleware
+from flask import render_template, request, redirect, url_for, session, g, flash, send_file, abort
 try:
     from werkzeug.urls import url_parse
 except ImportError:
     from urllib.parse import urlparse as url_parse
-from werkzeug.utils import secure_filename
 from app.forms import LoginForm, RegistrationForm, QuestionForm, AdminQuestionForm, EditQuestionForm
-from app.models import User, Questions, QuizScore, Section, QuestionSet, StudentResponse
+from app.models import User, Questions, QuizScore, Section, QuestionSet, StudentResponse, BackgroundJob
+from app.cache import question_cache, section_cache
+from app.writebuffer import response_buffer
+from app.sessions import regenerate_session, FILE_ENDPOINTS
+from app.ranking import rank_index, leaderboard_cache
+from app.principal import user_principals
+from app.exports import csv_response, export_rows, LONG_EXPORTS
+from app.student_import import import_students, read_csv_rows
+from app.question_import import import_questions
+from app.jobs import jobs, JobLimitError
+from app import admin_jobs  # registers the job tasks
+from app.analytics import student_scores, summary_stats, question_breakdown, \
+    remove_set_tallies, remove_question_tallies
+from app.item_stats import item_stats_cache
+from app.dashboard_stats import dashboard_stats
+from app.image_store import image_store, ImageTooLarge
+from app.static_assets import static_assets
+from app.question_fragments import question_fragments
 from sqlalchemy import desc
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from flask_login import current_user, login_user, logout_user, login_required
+from flask_wtf.csrf import generate_csrf
 from flask_admin.contrib.sqla import ModelView
 from flask_admin import BaseView, expose
 from functools import wraps
-import csv
-import io
 import secrets
 import time
 import os
@@ -35,9 +51,10 @@ def get_active_question_set(category):
     """
     Helper to find the currently active QuestionSet for a given category.
     Returns None if no active set is found.
+    Served from the in-process question cache (a read-only QuestionSetRecord).
     """
     # 1. Try to find a set marked as active
-    active_set = QuestionSet.query.filter_by(quiz_category=category, is_active=True).first()
+    active_set = question_cache.active_set(category)
     
     if active_set:
         return active_set
@@ -48,6 +65,157 @@ def get_active_question_set(category):
     # If no set is active, return None
     return None
 
+def _get_quiz_question(q_id):
+    """
+    Look up a question for the ready/start_timer screens.
+    Uses the cached records of the student's current set and only falls back
+    to the database for legacy sessions or ids outside the set.
+    """
+    current_set_id = session.get('question_set_id')
+    if current_set_id:
+        q = question_cache.get_question(current_set_id, q_id)
+        if q:
+            return q
+    return Questions.query.filter_by(q_id=q_id).first()
+
+# Session keys that make up one quiz attempt. Per-question timer starts live in
+# a single 'start_times' dict, so ending an attempt is a fixed set of pops
+# instead of a scan of session.keys() for start_time_<id> entries.
+QUIZ_SESSION_KEYS = ('quiz_started', 'answered_questions', 'marks', 'current_category',
+                     'question_set_id', 'quiz_start_time', 'question_queue', 'start_times',
+                     'quiz_position')
+
+def clear_quiz_session():
+    """Remove all quiz attempt state from the session"""
+    for key in QUIZ_SESSION_KEYS:
+        session.pop(key, None)
+
+def get_question_start_time(q_id):
+    return session.get('start_times', {}).get(str(q_id))
+
+def set_question_start_time(q_id, timestamp):
+    start_times = dict(session.get('start_times', {}))
+    start_times[str(q_id)] = timestamp
+    session['start_times'] = start_times
+
+def pop_question_start_time(q_id):
+    start_times = session.get('start_times')
+    if start_times and str(q_id) in start_times:
+        start_times = dict(start_times)
+        start_times.pop(str(q_id))
+        session['start_times'] = start_times
+
+def note_score_recorded(quiz_score):
+    """Keep the rank index and leaderboard cache in step with a committed QuizScore"""
+    rank_index.record(quiz_score, current_user.username)
+    leaderboard_cache.invalidate(quiz_score.question_set_id)
+    dashboard_stats.scores_changed()
+
+def get_question_elapsed(q_id):
+    """Seconds since the server-side timer of a question started, or None if it was never started"""
+    question_start_time = get_question_start_time(q_id)
+    if not question_start_time:
+        return None
+    
+    # Convert timestamp back to datetime object
+    if isinstance(question_start_time, (int, float)):
+        question_start_time = datetime.fromtimestamp(question_start_time)
+    
+    current_time = datetime.utcnow().replace(tzinfo=None)
+    # Ensure question_start_time is also timezone-naive
+    if hasattr(question_start_time, 'tzinfo') and question_start_time.tzinfo is not None:
+        question_start_time = question_start_time.replace(tzinfo=None)
+    return (current_time - question_start_time).total_seconds()
+
+def get_next_queued_question(q_id):
+    """Return the id after q_id in the session's (possibly shuffled) queue, or None at the end"""
+    queue = session.get('question_queue', [])
+    try:
+        current_index = queue.index(q_id)
+        if current_index + 1 < len(queue):
+            return queue[current_index + 1]
+    except ValueError:
+        pass
+    return None
+
+def upcoming_question_ids(q_id, count):
+    """Up to `count` unanswered ids after q_id in the session's queue"""
+    queue = session.get('question_queue', [])
+    answered = set(session.get('answered_questions', []))
+    try:
+        start = queue.index(q_id) + 1
+    except ValueError:
+        return []
+    return [i for i in queue[start:] if i not in answered][:count]
+
+def question_prefetch_urls(q_ids):
+    """
+    Image URLs of the given quiz questions, for <link rel="prefetch"> on the
+    page before they are shown. Only the image: the text, choices and answer
+    stay behind the timer. At most QUIZ_PREFETCH_MAX URLs.
+    """
+    limit = app.config.get('QUIZ_PREFETCH_MAX', 2)
+    urls = []
+    for q_id in q_ids:
+        if len(urls) >= limit:
+            break
+        q = _get_quiz_question(q_id)
+        url = question_image_url(q.image_file) if q else None
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+def render_question_body(q):
+    """HTML of the parts of the question page that are the same for every student"""
+    form = QuestionForm(formdata=None, meta={'csrf': False})
+    form.options.choices = question_choices(q)
+    return render_template('question_body.html', form=form, q=q)
+
+def question_choices(q):
+    """Answer choices shown to the student, as (value, label) pairs"""
+    # True/False questions only use options A and B
+    if q.question_type == 'TF':
+        return [(q.a, q.a), (q.b, q.b)]
+    # For MCQ and Image questions, include all options
+    choices = [(q.a, q.a), (q.b, q.b)]
+    if q.c:
+        choices.append((q.c, q.c))
+    if q.d:
+        choices.append((q.d, q.d))
+    return choices
+
+def record_answer(q, option, time_taken):
+    """
+    Store a student's answer (MODULE 3: Real Distractor Analysis), mark the
+    question as answered to prevent re-submission and award the point.
+    Shared by the HTML question page and the JSON quiz API.
+    """
+    is_correct = (option == q.ans)
+    
+    # Save the response to database for distractor analysis
+    # (committed immediately, or group-committed when write-behind is enabled)
+    response_buffer.record(
+        user_id=current_user.id,
+        question_id=q.q_id,
+        selected_answer=option,  # This will be 'A', 'B', 'C', or 'D' format from form
+        is_correct=is_correct,
+        quiz_category=session.get('current_category', 'General'),
+        question_set_id=session.get('question_set_id') # Track the set
+    )
+    
+    answered_questions = session.get('answered_questions', [])
+    answered_questions.append(q.q_id)
+    session['answered_questions'] = answered_questions
+    
+    # Award 1 point for correct answer (NEW: 1 point scoring system)
+    if is_correct:
+        points = 1 if time_taken <= q.time_limit else 0  # No points for late answers
+        session['marks'] = session.get('marks', 0) + points
+    
+    # Clear the timing session for this question
+    pop_question_start_time(q.q_id)
+    return is_correct
+
 
 
 class SecureModelView(ModelView):
@@ -58,6 +226,35 @@ class SecureModelView(ModelView):
         return redirect(url_for('login', next=request.url))
 
 
+class UserModelView(SecureModelView):
+    """Raw User editor; role, section and delete changes affect who is ranked"""
+    def after_model_change(self, form, model, is_created):
+        rank_index.invalidate()
+        leaderboard_cache.invalidate()
+        user_principals.invalidate(model.id)
+        dashboard_stats.invalidate()
+        section_cache.invalidate()
+
+    def after_model_delete(self, model):
+        rank_index.invalidate()
+        leaderboard_cache.invalidate()
+        user_principals.invalidate(model.id)
+        dashboard_stats.invalidate()
+        section_cache.invalidate()
+
+
+class QuestionModelView(SecureModelView):
+    """Raw Questions editor that keeps the quiz question cache in sync"""
+    def after_model_change(self, form, model, is_created):
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
+
+    def after_model_delete(self, model):
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
+        image_store.release([model.image_file])
+
+
 class BulkUploadView(BaseView):
     @expose('/', methods=['GET', 'POST'])
     def index(self):
@@ -70,58 +267,13 @@ class BulkUploadView(BaseView):
                 return redirect(request.url)
             
             try:
-                stream = io.StringIO(file.stream.read().decode('utf-8-sig'))
-                reader = csv.DictReader(stream)
-                
-                # Normalize headers
-                if reader.fieldnames:
-                    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-                
-                created = []
-                active_section_name_from_session = session.get('active_section_name')
-                
-                for row in reader:
-                    username = row.get('username')
-                    email = row.get('email')
-                    
-                    if not username or not email:
-                        continue
-                        
-                    # Determine section name to use for the user
-                    csv_section_name = row.get('section', '').strip()
-                    final_section_name = 'Default' 
-                    
-                    if csv_section_name:
-                        final_section_name = csv_section_name
-                    elif active_section_name_from_session and active_section_name_from_session != 'All Classes':
-                        final_section_name = active_section_name_from_session
-                        
-                    # Check if user exists
-                    if User.query.filter((User.username==username)|(User.email==email)).first():
-                        continue
-                        
-                    password = secrets.token_urlsafe(8)
-                    user = User(username=username, email=email, section=final_section_name)
-                    
-                    # Link to Section model via FK
-                    if final_section_name != 'Default':
-                        # Try to find existing section in DB
-                        section_obj = Section.query.filter_by(name=final_section_name).first()
-                        if not section_obj:
-                            # If not found, create new Section entry
-                            section_obj = Section(name=final_section_name, is_active=True) 
-                            db.session.add(section_obj)
-                            db.session.flush() # Assign an ID before commit
-                        user.section_id = section_obj.id
-                        
-                    user.set_password(password)
-                    db.session.add(user)
-                    created.append((username, email, password, final_section_name))
-                    
+                report = import_students(read_csv_rows(file), default_section=session.get('active_section_name'))
                 db.session.commit()
-                for u, e, p, s in created:
-                    flash(f"Created user {u} ({e}) in '{s}' with password: {p}")
-                if not created:
+                dashboard_stats.invalidate()
+                section_cache.invalidate()
+                for row in report.created:
+                    flash(f"Created user {row.username} ({row.email}) in '{row.section}' with password: {row.password}")
+                if not report.created:
                     flash('No new users were created (possibly duplicates).')
                     
             except Exception as e:
@@ -147,39 +299,9 @@ class SectionModelView(SecureModelView):
         file = form.student_csv.data
         if file:
             try:
-                stream = io.StringIO(file.stream.read().decode('utf-8-sig'))
-                reader = csv.DictReader(stream)
-                
-                # Normalize headers
-                if reader.fieldnames:
-                    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-                
-                count = 0
-                for row in reader:
-                    username = row.get('username', '').strip()
-                    email = row.get('email', '').strip()
-                    
-                    if not username or not email:
-                        continue
-                        
-                    # Check if user exists
-                    if User.query.filter((User.username==username)|(User.email==email)).first():
-                        continue
-                        
-                    password = secrets.token_urlsafe(8)
-                    user = User(username=username, email=email, is_admin=False)
-                    user.set_password(password)
-                    
-                    # Set legacy section string as well for compatibility
-                    # Note: model.name should be populated by the form
-                    if model.name:
-                        user.section = model.name
-                    
-                    # Add to this section (SQLAlchemy relationship)
-                    # This will automatically set section_id when the section is committed
-                    model.students.append(user)
-                    count += 1
-                
+                # Every row goes into this section; committed together with it by flask-admin
+                report = import_students(read_csv_rows(file), section=model)
+                count = len(report.created)
                 if count > 0:
                     flash(f'Added {count} students from CSV to section "{model.name}".', 'success')
             except Exception as e:
@@ -187,10 +309,21 @@ class SectionModelView(SecureModelView):
                 
         return super(SectionModelView, self).on_model_change(form, model, is_created)
 
+    def after_model_change(self, form, model, is_created):
+        # Students may have been moved into (or out of) this section
+        user_principals.invalidate()
+        dashboard_stats.invalidate()
+        section_cache.invalidate()
+
+    def after_model_delete(self, model):
+        user_principals.invalidate()
+        dashboard_stats.invalidate()
+        section_cache.invalidate()
+
 # Register admin views
 from app import db as _db
-admin.add_view(SecureModelView(User, _db.session, category='Models'))
-admin.add_view(SecureModelView(Questions, _db.session, category='Models', endpoint='db_questions'))
+admin.add_view(UserModelView(User, _db.session, category='Models'))
+admin.add_view(QuestionModelView(Questions, _db.session, category='Models', endpoint='db_questions'))
 admin.add_view(SectionModelView(Section, _db.session, category='Models', endpoint='db_sections'))
 admin.add_view(BulkUploadView(name='Bulk Upload', endpoint='bulk_upload'))
 
@@ -198,23 +331,47 @@ admin.add_view(BulkUploadView(name='Bulk Upload', endpoint='bulk_upload'))
 @app.context_processor
 def inject_sections():
     if current_user.is_authenticated and getattr(current_user, 'is_admin', False):
-        # Wrap in try-except to avoid issues during db migrations or if table doesn't exist yet
+        # Cached list (app/cache.py); the section table is missing only before the migrations ran
         try:
-            all_sections = Section.query.order_by(Section.name).all()
-            current_section_name = session.get('active_section_name', 'All Classes')
-            return dict(all_sections=all_sections, current_section_name=current_section_name)
-        except Exception:
+            all_sections = section_cache.sections()
+        except (OperationalError, ProgrammingError):
+            app.logger.warning('Sections unavailable for the admin menu', exc_info=True)
             return dict()
+        current_section_name = session.get('active_section_name', 'All Classes')
+        return dict(all_sections=all_sections, current_section_name=current_section_name)
     return dict()
 
+@app.template_global()
+def question_image_url(image_file):
+    """URL of a question image (served by question_image with cache headers), or None"""
+    return url_for('question_image', filename=image_file) if image_file else None
+
+@app.template_global()
+def asset_url(filename):
+    """Fingerprinted URL of a file under app/static (see app/static_assets.py)"""
+    return static_assets.url(filename)
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    return static_assets.send(filename)
+
+@app.route('/question_images/<filename>')
+def question_image(filename):
+    # Content-addressed names are cached as immutable; see app/image_store.py
+    return image_store.send_image(filename)
+
 @app.route('/switch_section/<int:section_id>')
 @admin_required
 def switch_section(section_id):
+    # Switching reloads the list, so sections added by another worker show up
+    section_cache.invalidate()
     if section_id == 0:
         session.pop('active_section_id', None)
         session['active_section_name'] = 'All Classes'
     else:
-        section = Section.query.get_or_404(section_id)
+        section = section_cache.get(section_id)
+        if section is None:
+            abort(404)
         session['active_section_id'] = section.id
         session['active_section_name'] = section.name
     
@@ -222,6 +379,8 @@ def switch_section(section_id):
 
 @app.before_request
 def before_request():
+    if request.endpoint in FILE_ENDPOINTS:
+        return
     g.user = current_user if current_user.is_authenticated else None
     
     # Single device login check
@@ -238,19 +397,15 @@ def home():
     """Home page with role-based content"""
     if current_user.is_authenticated:
         if current_user.is_admin:
-            # Admin home view
-            question_count = Questions.query.count()
-            student_count = User.query.filter_by(is_admin=False).count()
-            recent_scores = User.query.filter_by(is_admin=False).filter(
-                User.marks.isnot(None)
-            ).order_by(User.marks.desc()).limit(5).all()
+            # Admin home view, from the cached counters (app/dashboard_stats.py)
+            summary = dashboard_stats.snapshot()
             
             return render_template('index.html', 
                                  title='Admin Home',
                                  is_admin_view=True,
-                                 question_count=question_count,
-                                 student_count=student_count,
-                                 recent_scores=recent_scores)
+                                 question_count=summary.question_count,
+                                 student_count=summary.student_count(),
+                                 recent_scores=summary.scored_students())
         else:
             # Student home view
             # Count questions available to this student based on Active Set logic
@@ -263,7 +418,7 @@ def home():
             
             if active_set:
                 # Count questions in the active set
-                question_count = Questions.query.filter_by(question_set_id=active_set.id).count()
+                question_count = len(question_cache.set_questions(active_set.id))
                 
                 # Get student's score for THIS specific question set
                 student_score_record = QuizScore.query.filter_by(
@@ -275,22 +430,19 @@ def home():
                 user_score = student_score_record.score if student_score_record else 0
                 has_taken_quiz = student_score_record is not None
                 
-                # Get user rank for THIS question set
+                # Get user rank for THIS question set (in-memory rank index)
                 rank = None
+                percentile = None
                 if has_taken_quiz:
-                    better_scores = QuizScore.query.join(User).filter(
-                        QuizScore.question_set_id == active_set.id,
-                        QuizScore.score > user_score,
-                        QuizScore.status == 'completed',
-                        User.is_admin == False
-                    ).count()
-                    rank = better_scores + 1
+                    rank = rank_index.rank(active_set.id, user_score)
+                    percentile = rank_index.percentile(active_set.id, user_score)
             else:
                 # Fallback: Count all questions in category (Legacy behavior)
                 question_count = Questions.query.filter_by(quiz_category=category).count()
                 user_score = current_user.marks or 0
                 has_taken_quiz = current_user.marks is not None and current_user.marks > 0
                 rank = None
+                percentile = None
                 if has_taken_quiz:
                     better_scores = User.query.filter(
                         User.marks > user_score,
@@ -304,11 +456,14 @@ def home():
                                  user_score=user_score,
                                  question_count=question_count,
                                  has_taken_quiz=has_taken_quiz,
-                                 rank=rank)
+                                 rank=rank,
+                                 percentile=percentile)
     else:
         # Guest/unauthenticated view
         return render_template('index.html', title='Quiz App Home')
 
+LEADERBOARD_PER_PAGE = 25
+
 @app.route('/leaderboard')
 def leaderboard():
     """Show all students in a ranked list for a specific question set"""
@@ -372,75 +527,29 @@ def leaderboard():
             if current_user.is_authenticated and getattr(current_user, 'section', None) and current_user.section not in ['Default', 'General']:
                 section_name = current_user.section
 
-        # Base query for scores for the determined question set
-        query = db.session.query(QuizScore).join(
-            User, QuizScore.user_id == User.id
-        ).filter(
-            User.is_admin == False,
-            QuizScore.question_set_id == selected_set.id,
-            QuizScore.status.in_(['completed', 'incomplete'])
-        )
-
-        # Apply section filter if determined
-        if section_name:
-            query = query.filter(User.section == section_name)
-
-        # No free-text search on leaderboard. Compute ordered scores for the
-        # selected set (with optional section filter) and include a legacy
-        # fallback when no set-specific scores exist.
-        all_scores = query.order_by(QuizScore.score.desc(), QuizScore.timestamp.asc()).all()
-
-        # Legacy fallback: if no scores tied to this question_set_id, try
-        # scores recorded before question_set_id existed (NULL), matching the
-        # quiz_category. Apply the same section filter if present.
-        if not all_scores and selected_set:
-            fallback = db.session.query(QuizScore).join(
-                User, QuizScore.user_id == User.id
-            ).filter(
-                User.is_admin == False,
-                QuizScore.question_set_id == None,
-                QuizScore.quiz_category == selected_set.quiz_category,
-                QuizScore.status.in_(['completed', 'incomplete'])
-            )
-
-            if section_name:
-                fallback = fallback.filter(User.section == section_name)
-
-            all_scores = fallback.order_by(QuizScore.score.desc(), QuizScore.timestamp.asc()).all()
-
-        # Build top-ranked user list with tie-aware ranking. Include all users
-        # whose computed rank is 1..3 (so ties at rank 3 will be included).
-        users = []
-        prev_score = None
-        prev_rank = 0
-        position = 0
-        for qs in all_scores:
-            position += 1
-            score = qs.score
-            if score == prev_score:
-                rank = prev_rank
-            else:
-                rank = position
-                prev_rank = rank
-                prev_score = score
-
-            if rank > 3:
-                break
-
-            user = qs.student
-            user_obj = type('UserScore', (), {
-                'username': user.username,
-                'marks': qs.score,
-                'id': user.id,
-                'rank': rank
-            })()
-            users.append(user_obj)
+        # Ranking is done in SQL (RANK() window) and cached per set and section;
+        # the cache falls back to legacy NULL-set scores for the category when
+        # the set has none of its own.
+        view = request.args.get('view', 'top')
+        page = request.args.get('page', 1, type=int) or 1
+        total_rows = 0
+        if view == 'all':
+            users, total_rows = leaderboard_cache.standings(
+                selected_set.id, selected_set.quiz_category, section_name,
+                page=page, per_page=LEADERBOARD_PER_PAGE)
+        else:
+            # Top-ranked users: include all users whose rank is 1..3 (ties at rank 3 included)
+            users = leaderboard_cache.top(selected_set.id, selected_set.quiz_category, section_name, max_rank=3)
         
         return render_template('leaderboard.html', 
                              title='Leaderboard',
                              users=users,
                              all_sets=all_sets,
                              selected_set=selected_set,
+                             view=view,
+                             page=page,
+                             per_page=LEADERBOARD_PER_PAGE,
+                             total_rows=total_rows,
                              is_admin=current_user.is_authenticated and current_user.is_admin)
         
     except Exception as e:
@@ -477,11 +586,11 @@ def login():
             # Determine user's section object
             user_section = None
             if user.section_id:
-                # Use relationship if linked
-                user_section = user.section_rel
+                # Linked section, from the cached list
+                user_section = section_cache.get(user.section_id)
             elif user.section:
                 # Fallback to string match for legacy users
-                user_section = Section.query.filter_by(name=user.section).first()
+                user_section = section_cache.by_name(user.section)
             
             # If section exists and is marked inactive, block login
             if user_section and not user_section.is_active:
@@ -489,7 +598,10 @@ def login():
                 return redirect(url_for('login'))
 
         db.session.commit()
+        user_principals.invalidate(user.id)
         
+        # New session id at login: an id planted before it (session fixation) is dropped
+        regenerate_session(session)
         login_user(user)
         session['user_id'] = user.id
         session['session_token'] = session_token
@@ -513,6 +625,8 @@ def register():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        dashboard_stats.invalidate()
+        section_cache.invalidate()  # its free-text section joins the student filter
         session['user_id'] = user.id
         session['marks'] = 0
         return redirect(url_for('home'))
@@ -529,6 +643,7 @@ def disqualify_quiz():
     if not session.get('quiz_started'):
         return {'status': 'ignored'}
         
+    response_buffer.flush()
     current_category = session.get('current_category', 'General')
     current_marks = session.get('marks', 0)
     current_set_id = session.get('question_set_id')
@@ -546,19 +661,11 @@ def disqualify_quiz():
     try:
         db.session.add(quiz_score)
         db.session.commit()
+        note_score_recorded(quiz_score)
         
         # Clear session completely
-        session.pop('quiz_started', None)
-        session.pop('answered_questions', None)
-        session.pop('marks', None)
-        session.pop('current_category', None)
-        session.pop('question_set_id', None)
-        session.pop('quiz_start_time', None)
-        
-        # Clear all timing data
-        keys_to_remove = [key for key in session.keys() if key.startswith('start_time_')]
-        for key in keys_to_remove:
-            session.pop(key, None)
+        clear_quiz_session()
+        regenerate_session(session)
             
         return {'status': 'disqualified'}
     except Exception as e:
@@ -605,6 +712,7 @@ def start_quiz(category='General'):
     
     # SECURITY: Check if user has any active quiz session - AUTO-RECORD INCOMPLETE QUIZ
     if session.get('quiz_started'):
+        response_buffer.flush()
         # Auto-record the incomplete quiz with current score
         current_category = session.get('current_category', 'General')
         current_marks = session.get('marks', 0)
@@ -623,23 +731,14 @@ def start_quiz(category='General'):
         try:
             db.session.add(quiz_score)
             db.session.commit()
+            note_score_recorded(quiz_score)
             flash(f'Previous {current_category} quiz auto-recorded with score {current_marks} (incomplete). No further attempts allowed.', 'warning')
         except Exception as e:
             db.session.rollback()
             flash('Error recording previous quiz. Contact administrator.', 'error')
         
         # Clear session completely
-        session.pop('quiz_started', None)
-        session.pop('answered_questions', None)
-        session.pop('marks', None)
-        session.pop('current_category', None)
-        session.pop('question_set_id', None) # Clear set ID
-        session.pop('quiz_start_time', None)
-        
-        # Clear all timing data
-        keys_to_remove = [key for key in session.keys() if key.startswith('start_time_')]
-        for key in keys_to_remove:
-            session.pop(key, None)
+        clear_quiz_session()
         
         # Now check if they already have a score for the requested set (again, just in case)
         existing_score = QuizScore.query.filter_by(
@@ -661,7 +760,7 @@ def start_quiz(category='General'):
     session.permanent = True  # Make session persistent across browser sessions
     
     # Get all questions in this SPECIFIC SET
-    all_questions = Questions.query.filter_by(question_set_id=active_set.id).all()
+    all_questions = question_cache.set_questions(active_set.id)
     
     if not all_questions:
         # Fallback: check if there are legacy questions with this category but no set ID? 
@@ -683,6 +782,9 @@ def start_quiz(category='General'):
     session['question_queue'] = question_ids
     
     flash(f'Starting {category}: {active_set.name}. WARNING: Leaving will auto-record your current score and end the quiz permanently.', 'warning')
+    if request.args.get('mode') == 'api':
+        # Single-page quiz driven by the JSON API (see app/api.py)
+        return redirect(url_for('quiz_app'))
     return redirect(url_for('ready', q_id=question_ids[0]))
 
 @app.route('/ready/<int:q_id>')
@@ -698,7 +800,7 @@ def ready(q_id):
         return redirect(url_for('start_quiz'))
     
     # Get the question to display time limit
-    q = Questions.query.filter_by(q_id=q_id).first()
+    q = _get_quiz_question(q_id)
     if not q:
         flash('Question not found.', 'error')
         return redirect(url_for('start_quiz'))
@@ -716,6 +818,8 @@ def ready(q_id):
                          time_limit=q.time_limit,
                          current_question=current_question_number,
                          total_questions=total_questions,
+                         # The image downloads while the student reads this screen, not on the clock
+                         prefetch_urls=question_prefetch_urls([q_id]),
                          title=f'Ready - Question {current_question_number}')
 
 @app.route('/start_timer/<int:q_id>', methods=['POST'])
@@ -731,18 +835,18 @@ def start_timer(q_id):
         return redirect(url_for('start_quiz'))
     
     # Check if question exists
-    q = Questions.query.filter_by(q_id=q_id).first()
+    q = _get_quiz_question(q_id)
     if not q:
         flash('Question not found.', 'error')
         return redirect(url_for('start_quiz'))
     
     # SECURITY: Check if start time already exists to prevent timer restart exploit
-    if f'start_time_{q_id}' in session:
+    if get_question_start_time(q_id) is not None:
         flash('Question timer already started. Cannot restart timer.', 'warning')
         return redirect(url_for('question', id=q_id))
     
     # Set the start time for this specific question (store as timestamp)
-    session[f'start_time_{q_id}'] = datetime.utcnow().timestamp()
+    set_question_start_time(q_id, datetime.utcnow().timestamp())
     
     # Redirect to the question
     return redirect(url_for('question', id=q_id))
@@ -764,7 +868,7 @@ def question(id):
     current_set_id = session.get('question_set_id')
     
     # Get the question in current category AND set
-    q = Questions.query.filter_by(q_id=id, question_set_id=current_set_id).first()
+    q = question_cache.get_question(current_set_id, id) if current_set_id else None
     
     if not q:
         # Fallback: check query without set ID if set ID is missing (legacy)
@@ -773,69 +877,47 @@ def question(id):
 
     if not q:
         # If this ID is missing, jump to the next available question in this set
-        next_q = Questions.query.filter(
-            Questions.q_id > id, 
-            Questions.question_set_id == current_set_id
-        ).order_by(Questions.q_id.asc()).first()
+        next_q = question_cache.next_question(current_set_id, id) if current_set_id else None
         if next_q:
             return redirect(url_for('ready', q_id=next_q.q_id))
         return redirect(url_for('score'))
 
     # SECURITY CHECK: Ensure start_time exists for this question
-    question_start_time = session.get(f'start_time_{id}')
-    if not question_start_time:
+    time_taken = get_question_elapsed(id)
+    if time_taken is None:
         # No start time means they haven't gone through the ready screen
         return redirect(url_for('ready', q_id=id))
     
-    # Convert timestamp back to datetime object
-    if isinstance(question_start_time, (int, float)):
-        question_start_time = datetime.fromtimestamp(question_start_time)
-    
     # Server-side timer enforcement
-    current_time = datetime.utcnow().replace(tzinfo=None)
-    # Ensure question_start_time is also timezone-naive
-    if hasattr(question_start_time, 'tzinfo') and question_start_time.tzinfo is not None:
-        question_start_time = question_start_time.replace(tzinfo=None)
-    time_taken = (current_time - question_start_time).total_seconds()
     remaining_time = max(0, q.time_limit - time_taken)
     
     # Check if time has expired
     if time_taken > q.time_limit:
         flash('Time is up! Moving to next question.', 'warning')
         # Clear the start time for this question
-        session.pop(f'start_time_{id}', None)
+        pop_question_start_time(id)
         
         # Move to next question in queue or score
-        queue = session.get('question_queue', [])
-        try:
-            current_index = queue.index(id)
-            if current_index + 1 < len(queue):
-                return redirect(url_for('ready', q_id=queue[current_index + 1]))
-        except ValueError:
-            pass
-            
+        next_id = get_next_queued_question(id)
+        if next_id is not None:
+            return redirect(url_for('ready', q_id=next_id))
         return redirect(url_for('score'))
 
     # Anti-cheating: Check if question was already answered
     answered_questions = session.get('answered_questions', [])
     if id in answered_questions:
         # Skip to next question if already answered
-        session.pop(f'start_time_{id}', None)  # Clear timing
+        pop_question_start_time(id)  # Clear timing
         
-        queue = session.get('question_queue', [])
-        try:
-            current_index = queue.index(id)
-            if current_index + 1 < len(queue):
-                return redirect(url_for('ready', q_id=queue[current_index + 1]))
-        except ValueError:
-            pass
-            
+        next_id = get_next_queued_question(id)
+        if next_id is not None:
+            return redirect(url_for('ready', q_id=next_id))
         return redirect(url_for('score'))
 
     # Handle form submission
     if request.method == 'POST':
         # Re-check timer on submission with buffer for latency
-        time_taken = (datetime.utcnow().replace(tzinfo=None) - question_start_time).total_seconds()
+        time_taken = get_question_elapsed(id)
         if time_taken > (q.time_limit + 5):  # 5 second buffer for latency
             flash(f'Time limit exceeded by {time_taken - q.time_limit:.1f} seconds! Answer recorded but may receive reduced credit.', 'warning')
         
@@ -845,61 +927,18 @@ def question(id):
         
         option = request.form['options']
         
-        # Record the student's response for analytics (MODULE 3: Real Distractor Analysis)
-        from app.models import StudentResponse
-        
-        is_correct = (option == q.ans)
-        current_category = session.get('current_category', 'General')
-        
-        # Save the response to database for distractor analysis
-        response = StudentResponse(
-            user_id=g.user.id,
-            question_id=q.q_id,
-            selected_answer=option,  # This will be 'A', 'B', 'C', or 'D' format from form
-            is_correct=is_correct,
-            quiz_category=current_category,
-            question_set_id=current_set_id # Track the set
-        )
-        db.session.add(response)
-        db.session.commit()  # Commit immediately to ensure data is saved
-        
-        # Mark question as answered to prevent re-submission
-        answered_questions.append(id)
-        session['answered_questions'] = answered_questions
-        
-        # Award 1 point for correct answer (NEW: 1 point scoring system)
-        if option == q.ans:
-            points = 1 if time_taken <= q.time_limit else 0  # No points for late answers
-            session['marks'] = session.get('marks', 0) + points
-        
-        # Clear the timing session for this question
-        session.pop(f'start_time_{id}', None)
+        # Record the student's response, mark it answered and award points
+        record_answer(q, option, time_taken)
         
         # Go to the next question's ready screen using the randomized queue
-        queue = session.get('question_queue', [])
-        try:
-            current_index = queue.index(id)
-            if current_index + 1 < len(queue):
-                return redirect(url_for('ready', q_id=queue[current_index + 1]))
-        except ValueError:
-            pass # Should not happen if flow is correct
-            
+        next_id = get_next_queued_question(id)
+        if next_id is not None:
+            return redirect(url_for('ready', q_id=next_id))
         return redirect(url_for('score'))
 
-    # Prepare form for GET request
-    form = QuestionForm()
-    
-    # Handle different question types for choices
-    if q.question_type == 'TF':
-        form.options.choices = [(q.a, q.a), (q.b, q.b)]
-    else:
-        # For MCQ and Image questions, include all options
-        choices = [(q.a, q.a), (q.b, q.b)]
-        if q.c:
-            choices.append((q.c, q.c))
-        if q.d:
-            choices.append((q.d, q.d))
-        form.options.choices = choices
+    # Stem, image and options come pre-rendered; only the CSRF token and
+    # the timer/progress values below are per student
+    question_body = question_fragments.get(q, lambda: render_question_body(q))
     
     # Calculate progress
     # Use the session queue length for accurate total count
@@ -909,13 +948,16 @@ def question(id):
     current_question_number = len(answered_questions) + 1
     
     return render_template('question.html', 
-                         form=form, 
+                         question_body=question_body,
+                         csrf_token=generate_csrf() if app.config.get('WTF_CSRF_ENABLED', True) else None,
                          q=q, 
                          title=f'Question {current_question_number}',
                          current_question=current_question_number,
                          total_questions=total_questions,
                          remaining_time=int(remaining_time),
-                         time_taken=int(time_taken))
+                         time_taken=int(time_taken),
+                         prefetch_urls=question_prefetch_urls(
+                             upcoming_question_ids(id, app.config.get('QUIZ_PREFETCH_AHEAD', 1))))
 
 
 @app.route('/score')
@@ -928,6 +970,7 @@ def score():
     
     # Only update score if quiz was actually started
     if session.get('quiz_started'):
+        response_buffer.flush()  # all answers must be stored before the attempt is final
         final_score = session.get('marks', 0)
         current_category = session.get('current_category', 'General')
         current_set_id = session.get('question_set_id')
@@ -948,57 +991,28 @@ def score():
         
         try:
             db.session.commit()
+            note_score_recorded(quiz_score)
         except Exception:
             db.session.rollback()
         
-        # Clear quiz session completely
-        session.pop('quiz_started', None)
-        session.pop('answered_questions', None)
-        session.pop('marks', None)
-        session.pop('current_category', None)
-        session.pop('question_set_id', None)
-        session.pop('quiz_start_time', None)
-        
-        # Clear all individual question timing data
-        keys_to_remove = [key for key in session.keys() if key.startswith('start_time_')]
-        for key in keys_to_remove:
-            session.pop(key, None)
-        
         # Get total possible score for this SET (based on actual questions in queue)
         question_queue = session.get('question_queue', [])
         total_questions = len(question_queue)
+        
+        # Clear quiz session completely
+        clear_quiz_session()
             
         max_possible_score = total_questions * 1
         
         # Get user's rank for THIS specific question set
         rank = None
         top_user = None
+        percentile = None
         if current_set_id:
-            # Calculate rank based on scores for this question set
-            better_scores = QuizScore.query.join(User).filter(
-                QuizScore.question_set_id == current_set_id,
-                QuizScore.score > final_score,
-                QuizScore.status == 'completed',
-                User.is_admin == False
-            ).count()
-            rank = better_scores + 1
-            
-            # Get highest score user for this question set
-            top_score_record = QuizScore.query.join(User).filter(
-                QuizScore.question_set_id == current_set_id,
-                QuizScore.status == 'completed',
-                User.is_admin == False
-            ).order_by(QuizScore.score.desc()).first()
-            
-            if top_score_record:
-                # Access user via backref relationship
-                user = top_score_record.student
-                # Create a simple object for template compatibility
-                top_user_obj = type('UserScore', (), {
-                    'username': user.username,
-                    'marks': top_score_record.score
-                })()
-                top_user = top_user_obj
+            # Rank, percentile and highest scorer come from the in-memory rank index
+            rank = rank_index.rank(current_set_id, final_score)
+            percentile = rank_index.percentile(current_set_id, final_score)
+            top_user = rank_index.top_scorer(current_set_id)
         else:
             # Fallback to legacy marks-based ranking
             better_scores = User.query.filter(
@@ -1018,7 +1032,7 @@ def score():
             
             # Get all questions in current SET to determine which were missed
             if current_set_id:
-                 all_questions = Questions.query.filter_by(question_set_id=current_set_id).order_by(Questions.q_id).all()
+                 all_questions = question_cache.set_questions(current_set_id)
             else:
                  all_questions = Questions.query.filter_by(quiz_category=current_category).order_by(Questions.q_id).all()
             
@@ -1038,6 +1052,7 @@ def score():
                              max_possible_score=max_possible_score,
                              total_questions=total_questions,
                              rank=rank,
+                             percentile=percentile,
                              top_user=top_user,
                              missed_questions=missed_questions)
     else:
@@ -1056,6 +1071,8 @@ def auto_record_quiz():
     if not session.get('quiz_started'):
         return {'status': 'error', 'message': 'No active quiz session'}
     
+    response_buffer.flush()  # all answers must be stored before the attempt is final
+    
     # Get current quiz data
     current_category = session.get('current_category', 'General')
     current_marks = session.get('marks', 0)
@@ -1084,19 +1101,10 @@ def auto_record_quiz():
     try:
         db.session.add(quiz_score)
         db.session.commit()
+        note_score_recorded(quiz_score)
         
         # Clear session data
-        session.pop('quiz_started', None)
-        session.pop('answered_questions', None)
-        session.pop('marks', None)
-        session.pop('current_category', None)
-        session.pop('question_set_id', None)
-        session.pop('quiz_start_time', None)
-        
-        # Clear all timing data
-        keys_to_remove = [key for key in session.keys() if key.startswith('start_time_')]
-        for key in keys_to_remove:
-            session.pop(key, None)
+        clear_quiz_session()
         
         # Update legacy marks field for compatibility
         current_user.marks = current_marks
@@ -1119,6 +1127,7 @@ def logout():
     
     # SECURITY: Auto-record any incomplete quiz before logout
     if session.get('quiz_started') and not current_user.is_admin:
+        response_buffer.flush()
         current_category = session.get('current_category', 'General')
         current_marks = session.get('marks', 0)
         current_set_id = session.get('question_set_id')
@@ -1143,24 +1152,17 @@ def logout():
                 db.session.add(quiz_score)
                 current_user.marks = current_marks
                 db.session.commit()
+                note_score_recorded(quiz_score)
             except Exception:
                 db.session.rollback()
     
+    user_principals.invalidate(current_user.id)
     logout_user()
     
     # SECURITY: Clear all quiz session data on logout
     session.pop('user_id', None)
-    session.pop('marks', None)
-    session.pop('quiz_started', None)
-    session.pop('answered_questions', None)
-    session.pop('current_category', None)
-    session.pop('question_set_id', None)
-    session.pop('quiz_start_time', None)
-    
-    # Clear all individual question timing data
-    keys_to_remove = [key for key in session.keys() if key.startswith('start_time_')]
-    for key in keys_to_remove:
-        session.pop(key, None)
+    clear_quiz_session()
+    regenerate_session(session)
         
     return redirect(url_for('home'))
 
@@ -1172,31 +1174,111 @@ def logout():
 @admin_required
 def admin_dashboard():
     """Main admin dashboard"""
-    question_count = Questions.query.count()
+    # Cached counters, at most one query (see app/dashboard_stats.py)
+    summary = dashboard_stats.snapshot()
     
     # Filter students by active section
     active_section_id = session.get('active_section_id')
-    student_query = User.query.filter_by(is_admin=False)
-    
-    if active_section_id:
-        student_query = student_query.filter_by(section_id=active_section_id)
-        
-    student_count = student_query.count()
-    admin_count = User.query.filter_by(is_admin=True).count()
-    
-    recent_questions = Questions.query.order_by(Questions.q_id.desc()).limit(5).all()
-    
-    top_students = student_query.order_by(
-        db.desc(db.func.coalesce(User.marks, 0))
-    ).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                          title='Admin Dashboard',
-                         question_count=question_count,
-                         student_count=student_count,
-                         admin_count=admin_count,
-                         recent_questions=recent_questions,
-                         top_students=top_students)
+                         question_count=summary.question_count,
+                         student_count=summary.student_count(active_section_id),
+                         admin_count=summary.admin_count,
+                         recent_questions=summary.recent_questions,
+                         top_students=summary.top_students(active_section_id))
+
+@app.route('/admin/runtime_stats')
+@admin_required
+def admin_runtime_stats():
+    """Counters of the in-process caches and write buffers (JSON)"""
+    return {
+        'question_cache': question_cache.stats(),
+        'response_buffer': response_buffer.stats(),
+        'rank_index': rank_index.stats(),
+        'leaderboard_cache': leaderboard_cache.stats(),
+        'user_principals': user_principals.stats(),
+        'jobs': jobs.stats(),
+        'item_stats': item_stats_cache.stats(),
+        'dashboard_stats': dashboard_stats.stats(),
+        'section_cache': section_cache.stats(),
+        'image_store': image_store.stats(),
+        'static_assets': static_assets.stats(),
+        'compression': gzip_middleware.stats() if gzip_middleware else None,
+        'question_fragments': question_fragments.stats(),
+    }
+
+def _start_job(kind, params=None, back_url=None):
+    """Queue a background job and send the admin to its progress page"""
+    wants_json = request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html
+    try:
+        job = jobs.submit(kind, params, user_id=current_user.id)
+    except JobLimitError as e:
+        if wants_json:
+            return {'status': 'error', 'message': str(e)}, 429
+        flash(str(e), 'error')
+        return redirect(back_url or url_for('admin_jobs'))
+    if wants_json:
+        return {'job_id': job.id, 'status': job.status, 'status_url': url_for('admin_job_status', job_id=job.id)}, 202
+    return redirect(url_for('admin_job', job_id=job.id, next=back_url))
+
+def _job_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'title': jobs.title(job.kind),
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'error': job.error,
+        'download_url': url_for('admin_job_download', job_id=job.id) if job.result_file and job.status == 'done' else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+@app.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    """Recent background jobs"""
+    recent = BackgroundJob.query.order_by(BackgroundJob.id.desc()).limit(50).all()
+    return render_template('admin/jobs.html', title='Background Jobs', jobs=[_job_dict(j) for j in recent])
+
+@app.route('/admin/jobs/<int:job_id>')
+@admin_required
+def admin_job(job_id):
+    """Progress page of one job; polls admin_job_status"""
+    job = BackgroundJob.query.get_or_404(job_id)
+    back_url = request.args.get('next', '')
+    if not back_url.startswith('/') or back_url.startswith('//'):
+        back_url = url_for('admin_jobs')
+    return render_template('admin/job.html', title=jobs.title(job.kind), job=_job_dict(job), back_url=back_url)
+
+@app.route('/admin/jobs/<int:job_id>/status')
+@admin_required
+def admin_job_status(job_id):
+    """Status and progress of a job (JSON)"""
+    return _job_dict(BackgroundJob.query.get_or_404(job_id))
+
+@app.route('/admin/jobs/<int:job_id>/download')
+@admin_required
+def admin_job_download(job_id):
+    """The file a finished job produced"""
+    job = BackgroundJob.query.get_or_404(job_id)
+    if job.status != 'done' or not job.result_file or not os.path.exists(jobs.path(job.result_file)):
+        flash('This job has no file to download (it may have expired).', 'error')
+        return redirect(url_for('admin_job', job_id=job.id))
+    if jobs.one_time(job.kind):
+        data = jobs.take_result(job)
+        if data is None:
+            flash('This file has already been downloaded.', 'error')
+            return redirect(url_for('admin_job', job_id=job.id))
+        response = app.response_class(data, mimetype='text/csv')
+        response.headers['Cache-Control'] = 'no-store'
+    else:
+        response = send_file(jobs.path(job.result_file), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename={}'.format(job.result_name)
+    return response
 
 @app.route('/admin_questions')
 @admin_required
@@ -1283,19 +1365,14 @@ def admin_add_question():
             ]
     
     if form.validate_on_submit():
-        # Handle image upload
+        # Handle image upload: stored once per distinct content (app/image_store.py)
         image_filename = None
         if form.image.data:
-            image_file = form.image.data
-            filename = secure_filename(image_file.filename)
-            # Add timestamp to avoid conflicts
-            timestamp = str(int(time.time()))
-            image_filename = f"{timestamp}_{filename}"
-            
-            # Save to question_images directory
-            image_path = os.path.join(app.root_path, 'static', 'question_images', image_filename)
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            image_file.save(image_path)
+            try:
+                image_filename = image_store.store(form.image.data)
+            except ImageTooLarge as e:
+                flash(str(e), 'error')
+                return render_template('admin/add_question.html', title='Add Question', form=form)
         
         # Get the next available question ID
         max_id = db.session.query(db.func.max(Questions.q_id)).scalar() or 0
@@ -1330,6 +1407,8 @@ def admin_add_question():
         
         db.session.add(question)
         db.session.commit()
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
         flash(f'{form.question_type.data} question added successfully! Question ID: {new_q_id}', 'success')
         return redirect(url_for('admin_questions'))
     
@@ -1383,23 +1462,17 @@ def admin_edit_question(q_id):
             ]
     
     if form.validate_on_submit():
-        # Handle image upload
+        # Handle image upload; the old file is released after the commit
+        old_image = None
         if form.image.data:
-            # Delete old image if it exists
-            if question.image_file:
-                old_image_path = os.path.join(app.root_path, 'static', 'question_images', question.image_file)
-                if os.path.exists(old_image_path):
-                    os.remove(old_image_path)
-            
-            # Save new image
-            image_file = form.image.data
-            filename = secure_filename(image_file.filename)
-            timestamp = str(int(time.time()))
-            image_filename = f"{timestamp}_{filename}"
-            
-            image_path = os.path.join(app.root_path, 'static', 'question_images', image_filename)
-            os.makedirs(os.path.dirname(image_path), exist_ok=True)
-            image_file.save(image_path)
+            try:
+                image_filename = image_store.store(form.image.data)
+            except ImageTooLarge as e:
+                flash(str(e), 'error')
+                return render_template('admin/edit_question.html', title=f'Edit Question {q_id}',
+                                       form=form, question=question)
+            if image_filename != question.image_file:
+                old_image = question.image_file
             question.image_file = image_filename
         
         # Update question data
@@ -1419,6 +1492,10 @@ def admin_edit_question(q_id):
         question.question_type = form.question_type.data
         
         db.session.commit()
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
+        # Removed only if no other question uses the same image
+        image_store.release([old_image])
         flash(f'{form.question_type.data} question updated successfully!', 'success')
         return redirect(url_for('admin_questions'))
     
@@ -1437,21 +1514,19 @@ def admin_delete_question(q_id):
     try:
         # Manually delete related StudentResponse records first to ensure no Integrity Error
         from app.models import StudentResponse
+        response_buffer.flush()
+        remove_question_tallies([q_id])
         # Using delete(synchronize_session=False) is faster and safer for bulk deletes
         deleted_responses = StudentResponse.query.filter_by(question_id=q_id).delete(synchronize_session=False)
-        
-        # Delete associated image file if exists
-        if hasattr(question, 'image_file') and question.image_file:
-            image_path = os.path.join(app.root_path, 'static', 'question_images', question.image_file)
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                except OSError:
-                    pass  # Continue even if file deletion fails
+        image_file = question.image_file
         
         # Delete the question
         db.session.delete(question)
         db.session.commit()
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
+        # Delete the image file unless another question still uses it
+        image_store.release([image_file])
         
         if deleted_responses > 0:
             flash(f'Question "{question_text}..." and {deleted_responses} related responses deleted successfully!', 'success')
@@ -1484,21 +1559,18 @@ def admin_delete_selected():
         
         # Manually delete related StudentResponse records first to avoid SQLAlchemy UPDATE issue
         from app.models import StudentResponse
+        response_buffer.flush()
+        remove_question_tallies(question_ids)
         deleted_responses = StudentResponse.query.filter(StudentResponse.question_id.in_(question_ids)).delete(synchronize_session=False)
-        
-        # Delete associated image files
-        for question in questions_to_delete:
-            if hasattr(question, 'image_file') and question.image_file:
-                image_path = os.path.join(app.root_path, 'static', 'question_images', question.image_file)
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except OSError:
-                        pass  # Continue even if file deletion fails
+        image_files = [question.image_file for question in questions_to_delete]
         
         # Delete questions
         deleted_count = Questions.query.filter(Questions.q_id.in_(question_ids)).delete(synchronize_session=False)
         db.session.commit()
+        question_cache.invalidate()
+        dashboard_stats.invalidate()
+        # Delete the image files no remaining question uses
+        image_store.release(image_files)
         
         flash(f'Successfully deleted {deleted_count} questions and {deleted_responses} related responses!', 'success')
         
@@ -1541,6 +1613,7 @@ def admin_assign_set():
         )
         
         db.session.commit()
+        question_cache.invalidate()
         flash(f'Successfully assigned {updated_count} questions to "{target_set_name}".', 'success')
         
     except Exception as e:
@@ -1549,29 +1622,104 @@ def admin_assign_set():
         
     return redirect(url_for('admin_questions'))
 
+ADMIN_STUDENTS_PER_PAGE = 50
+ADMIN_STUDENTS_MAX_PER_PAGE = 500
+ADMIN_STUDENTS_SORTS = ('score', 'username', 'section', 'date')
+
+
+def _admin_students_filters():
+    """Section, sort and paging arguments shared by the students page and its JSON variant"""
+    session_section = session.get('active_section_name', 'All Classes')
+    default_section = 'All' if session_section == 'All Classes' else session_section
+    selected_section = request.args.get('section', default_section)
+    sort = request.args.get('sort', 'score')
+    if sort not in ADMIN_STUDENTS_SORTS:
+        sort = 'score'
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = request.args.get('per_page', ADMIN_STUDENTS_PER_PAGE, type=int) or ADMIN_STUDENTS_PER_PAGE
+    per_page = min(max(per_page, 1), ADMIN_STUDENTS_MAX_PER_PAGE)
+    return selected_section, sort, page, per_page
+
+
+def admin_student_rows(selected_set, selected_section, sort='score', page=1, per_page=ADMIN_STUDENTS_PER_PAGE):
+    """
+    One page of students with their latest score for the selected set (or
+    their latest score in any set when none is active).
+    Returns (rows, total, summary); sorting, filtering and paging run in SQL.
+    """
+    # Latest attempt per student: ROW_NUMBER() over the set's scores
+    latest = db.session.query(
+        QuizScore.user_id.label('user_id'),
+        QuizScore.score.label('score'),
+        QuizScore.status.label('status'),
+        QuizScore.quiz_category.label('quiz_category'),
+        QuizScore.timestamp.label('timestamp'),
+        db.func.row_number().over(
+            partition_by=QuizScore.user_id,
+            order_by=(QuizScore.timestamp.desc(), QuizScore.id.desc())
+        ).label('rn')
+    )
+    if selected_set:
+        latest = latest.filter(QuizScore.question_set_id == selected_set.id)
+    latest = latest.subquery()
+
+    base = db.session.query(User).outerjoin(
+        latest, db.and_(latest.c.user_id == User.id, latest.c.rn == 1)
+    ).filter(User.is_admin == False)
+    if selected_section != 'All':
+        base = base.filter(User.section == selected_section)
+
+    # Summary cards over the whole filter (the template used to count the full list)
+    scored = db.func.nullif(latest.c.score, 0)  # the cards only count non-zero scores
+    total, attempted, average, highest = base.with_entities(
+        db.func.count(User.id), db.func.count(scored), db.func.avg(scored), db.func.max(latest.c.score)
+    ).one()
+    summary = {
+        'total': total,
+        'attempted': attempted,
+        'average_score': round(average, 1) if average is not None else 0,
+        'highest_score': highest or 0,
+    }
+
+    order = {
+        'score': [db.func.coalesce(latest.c.score, 0).desc(), User.id],
+        'username': [db.func.lower(User.username), User.id],
+        'section': [db.func.coalesce(User.section, 'Default'), db.func.lower(User.username), User.id],
+        'date': [latest.c.timestamp == None, latest.c.timestamp.desc(), User.id],  # not started last
+    }[sort]
+    page_rows = base.with_entities(
+        User.id, User.username, User.email, User.section, User.marks, User.shuffle_questions,
+        latest.c.score, latest.c.status, latest.c.quiz_category, latest.c.timestamp
+    ).order_by(*order).limit(per_page).offset((page - 1) * per_page).all()
+
+    rows = []
+    for (user_id, username, email, section, marks, shuffle, score, status, category, timestamp) in page_rows:
+        rows.append({
+            'id': user_id,
+            'username': username,
+            'email': email,
+            'section': section or 'Default',
+            'legacy_marks': marks,  # Keep legacy field for compatibility
+            'quiz_score': score,
+            'quiz_status': status or 'Not Started',  # Only show status for current set
+            'quiz_category': category,
+            'quiz_timestamp': timestamp,
+            'display_score': score if score is not None else 'Not Started',  # Only show score if they took THIS set
+            'shuffle_questions': bool(shuffle),
+        })
+    return rows, total, summary
+
+
 @app.route('/admin_students', methods=['GET', 'POST'])
 @admin_required
 def admin_students():
     """View all students and their scores including incomplete attempts"""
     
-    # Get all unique sections for the filter dropdown
-    # 1. Fetch from Section model (Official sections)
-    db_sections = Section.query.with_entities(Section.name).all()
-    db_section_names = [s[0] for s in db_sections]
-    
-    # 2. Fetch from User model (Legacy/Ad-hoc sections)
-    user_sections = db.session.query(User.section).filter(User.is_admin==False).distinct().all()
-    user_section_names = [s[0] for s in user_sections if s[0]]
+    # Section names for the filter dropdown: Section rows plus legacy User.section values (cached)
+    sections = section_cache.filter_names()
     
-    # 3. Combine and sort
-    sections = sorted(list(set(db_section_names + user_section_names)))
-    
-    # Determine default section from session (Nav bar selection)
-    session_section = session.get('active_section_name', 'All Classes')
-    default_section = 'All' if session_section == 'All Classes' else session_section
-    
-    # Get selected section from query parameters, defaulting to the session section
-    selected_section = request.args.get('section', default_section)
+    # Section defaults to the nav bar selection; sort and page come from the query string
+    selected_section, sort, page, per_page = _admin_students_filters()
     
     # Find the currently active Question Set (any category)
     # This displays what quiz students are currently taking
@@ -1580,60 +1728,42 @@ def admin_students():
     # Note: selected_set is now independent of the section filter
     # It shows the globally active question set, not per-section
     
-    # Base query
-    query = User.query.filter_by(is_admin=False)
-    
-    # Apply filter if specific section selected
-    if selected_section != 'All':
-        query = query.filter_by(section=selected_section)
-        
-    # Get filtered students
-    students = query.all()
-
-    # Create enhanced student data with quiz score details
-    enhanced_students = []
-    for student in students:
-        # Refresh student object to get latest data
-        db.session.refresh(student)
-        
-        # Get quiz score for this student for the SELECTED question set
-        if selected_set:
-            # Filter by question_set_id to show scores for this specific set
-            student_score = QuizScore.query.filter_by(
-                user_id=student.id,
-                question_set_id=selected_set.id
-            ).order_by(QuizScore.timestamp.desc()).first()
-        else:
-            # Fallback: Get latest score (any set) if no set is selected
-            student_score = QuizScore.query.filter_by(user_id=student.id).order_by(QuizScore.timestamp.desc()).first()
-        
-        # Determine if student has any score at all
-        has_any_score = student_score is not None or student.marks is not None
-        
-        student_data = {
-            'id': student.id,
-            'username': student.username,
-            'email': student.email,
-            'section': student.section or 'Default',  # Add section to data
-            'legacy_marks': student.marks,  # Keep legacy field for compatibility
-            'quiz_score': student_score.score if student_score else None,
-            'quiz_status': student_score.status if student_score else 'Not Started',  # Only show status for current set
-            'quiz_category': student_score.quiz_category if student_score else None,
-            'quiz_timestamp': student_score.timestamp if student_score else None,
-            'display_score': student_score.score if student_score else 'Not Started',  # Only show score if they took THIS set
-            'shuffle_questions': getattr(student, 'shuffle_questions', False)
-        }
-        enhanced_students.append(student_data)
-    
-    # Sort by score (handling None values)
-    enhanced_students.sort(key=lambda x: (x['quiz_score'] or 0), reverse=True)
+    # One windowed query for the page, one aggregate for the summary cards
+    enhanced_students, total, summary = admin_student_rows(selected_set, selected_section, sort, page, per_page)
     
     return render_template('admin/students.html', 
                          title='Student Scores & Performance', 
                          students=enhanced_students,
                          sections=sections,
                          selected_section=selected_section,
-                         selected_set=selected_set)
+                         selected_set=selected_set,
+                         summary=summary,
+                         sort=sort,
+                         page=page,
+                         per_page=per_page,
+                         total=total,
+                         rank_offset=(page - 1) * per_page)
+
+@app.route('/admin_students/data')
+@admin_required
+def admin_students_data():
+    """JSON page of the students table, for loading it incrementally"""
+    selected_section, sort, page, per_page = _admin_students_filters()
+    selected_set = QuestionSet.query.filter_by(is_active=True).first()
+    rows, total, summary = admin_student_rows(selected_set, selected_section, sort, page, per_page)
+    for row in rows:
+        row['quiz_timestamp'] = row['quiz_timestamp'].isoformat() if row['quiz_timestamp'] else None
+    return {
+        'students': rows,
+        'section': selected_section,
+        'sort': sort,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'has_next': page * per_page < total,
+        'summary': summary,
+        'question_set': {'id': selected_set.id, 'name': selected_set.name} if selected_set else None,
+    }
 
 @app.route('/admin_bulk_upload_students', methods=['GET', 'POST'])
 @admin_required
@@ -1645,84 +1775,12 @@ def admin_bulk_upload_students():
             flash('No file uploaded', 'error')
             return redirect(request.url)
         
-        try:
-            stream = io.StringIO(file.stream.read().decode('utf-8-sig'))
-            reader = csv.DictReader(stream)
-            
-            # Normalize headers: strip whitespace and convert to lowercase
-            if reader.fieldnames:
-                reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
-            
-            # Validate headers
-            if not reader.fieldnames or 'username' not in reader.fieldnames or 'email' not in reader.fieldnames:
-                flash('CSV file must contain "username" and "email" columns. "section" is optional.', 'error')
-                return redirect(request.url)
-                
-            # Get active section details from session
-            active_section_name_from_session = session.get('active_section_name')
-
-            created = []
-            
-            for row in reader:
-                # Use get() with default to None, keys are now guaranteed lowercase
-                username = row.get('username')
-                email = row.get('email')
-                
-                # Determine section name to use for the user
-                csv_section_name = row.get('section', '').strip()
-                final_section_name = 'Default' # Default if nothing else
-                
-                if csv_section_name:
-                    final_section_name = csv_section_name
-                elif active_section_name_from_session and active_section_name_from_session != 'All Classes':
-                    final_section_name = active_section_name_from_session
-                
-                # Skip empty rows or rows with missing data
-                if not username or not email:
-                    continue
-                    
-                username = username.strip()
-                email = email.strip()
-                
-                if not username or not email:
-                    continue
-                    
-                # Check if user exists
-                if User.query.filter((User.username==username)|(User.email==email)).first():
-                    continue
-                    
-                password = secrets.token_urlsafe(8)
-                user = User(username=username, email=email, is_admin=False, section=final_section_name) # Keep legacy string field
-                
-                # Link to Section model via FK
-                if final_section_name != 'Default':
-                    # Try to find existing section in DB
-                    section_obj = Section.query.filter_by(name=final_section_name).first()
-                    if not section_obj:
-                        # If not found, create new Section entry
-                        section_obj = Section(name=final_section_name, is_active=True) # New sections default to active
-                        db.session.add(section_obj)
-                        db.session.flush() # Assign an ID before commit
-                    user.section_id = section_obj.id
-                
-                user.set_password(password)
-                db.session.add(user)
-                created.append((username, email, password, final_section_name))
-            
-            db.session.commit()
-            
-            if created:
-                flash(f"Successfully created {len(created)} students.", 'success')
-            else:
-                flash('No new users were created (possibly duplicates or invalid data).', 'warning')
-                
-        except UnicodeDecodeError:
-             flash('Invalid file format. Please upload a valid CSV file (UTF-8 encoded).', 'error')
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error processing file: {str(e)}', 'error')
-            
-        return redirect(url_for('admin_students'))
+        # Hashing the generated passwords takes a while: run it as a background job
+        upload = jobs.save_upload(file)
+        return _start_job('import_students', {
+            'upload': upload,
+            'default_section': session.get('active_section_name'),
+        }, url_for('admin_students'))
         
     return render_template('admin/bulk_upload.html', 
                          title='Bulk Upload Students',
@@ -1740,6 +1798,7 @@ def admin_toggle_shuffle(user_id):
     
     try:
         db.session.commit()
+        user_principals.invalidate(user_id)
         status_msg = "enabled" if student.shuffle_questions else "disabled"
         
         # Check if AJAX request
@@ -1766,6 +1825,7 @@ def admin_toggle_shuffle_all():
         # Using bulk update for efficiency
         User.query.filter_by(is_admin=False).update({User.shuffle_questions: enable})
         db.session.commit()
+        user_principals.invalidate()
         
         status_msg = "ENABLED" if enable else "DISABLED"
         flash(f'Randomization {status_msg} for ALL students.', 'success')
@@ -1790,6 +1850,10 @@ def admin_reset_student_score(user_id):
         
         # Commit all changes
         db.session.commit()
+        rank_index.remove_user(user_id)
+        leaderboard_cache.invalidate()
+        user_principals.invalidate(user_id)
+        dashboard_stats.invalidate()
         
         # Refresh the student object to ensure updated data
         db.session.refresh(student)
@@ -1815,6 +1879,8 @@ def admin_add_student():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        dashboard_stats.invalidate()
+        section_cache.invalidate()  # its free-text section joins the student filter
         flash(f'Student {user.username} added successfully!', 'success')
         return redirect(url_for('admin_students'))
     return render_template('register.html', title='Add Student', form=form)
@@ -1827,74 +1893,64 @@ def admin_delete_student(user_id):
     username = student.username
     db.session.delete(student)
     db.session.commit()
+    rank_index.remove_user(user_id)
+    leaderboard_cache.invalidate()
+    user_principals.invalidate(user_id)
+    dashboard_stats.invalidate()
+    section_cache.invalidate()
     flash(f'Student {username} deleted successfully!', 'success')
     return redirect(url_for('admin_students'))
 
 @app.route('/admin/export/scores')
 @admin_required
 def admin_export_scores():
-    """Export all student scores as CSV"""
+    """Export all student scores as CSV (streamed)"""
     try:
         # Query all non-admin users - Sorted Alphabetically (Case-Insensitive)
-        students = User.query.filter_by(is_admin=False).order_by(
-            db.func.lower(User.username).asc()
-        ).all()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['Username', 'Email', 'Score'])
-        
-        # Write student data
-        for student in students:
-            score = student.marks if student.marks is not None else 'Not Started'
-            writer.writerow([student.username, student.email, score])
-        
-        # Create response
-        csv_data = output.getvalue()
-        output.close()
-        
-        response = make_response(csv_data)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=student_scores.csv'
+        students = db.session.query(User.username, User.email, User.marks).filter(
+            User.is_admin == False
+        ).order_by(db.func.lower(User.username).asc())
+        student_count = students.count()
+        
+        # Rows are fetched in batches while the response is being sent
+        rows = (
+            [username, email, marks if marks is not None else 'Not Started']
+            for username, email, marks in students.yield_per(app.config['EXPORT_BATCH_SIZE'])
+        )
+        response = csv_response('student_scores.csv', ['Username', 'Email', 'Score'], rows)
         
-        flash(f'Exported scores for {len(students)} students', 'success')
+        flash(f'Exported scores for {student_count} students', 'success')
         return response
         
     except Exception as e:
         flash(f'Error exporting scores: {str(e)}', 'error')
         return redirect(url_for('admin_students'))
 
+@app.route('/admin/export/score_history')
+@admin_required
+def admin_export_score_history():
+    """Long-format export: one row per QuizScore (every attempt), optionally for one set"""
+    return _long_export('score_history')
+
+@app.route('/admin/export/responses')
+@admin_required
+def admin_export_responses():
+    """Long-format export: one row per StudentResponse, optionally for one set"""
+    return _long_export('responses')
+
+def _long_export(name):
+    """Stream a long-format export, or hand it to the job runner with ?background=1"""
+    set_id = request.args.get('set_id', type=int)
+    if request.args.get('background'):
+        return _start_job('export', {'export': name, 'set_id': set_id}, url_for('admin_students'))
+    export = LONG_EXPORTS[name](set_id)
+    return csv_response(export.filename, export.header, export_rows(export, app.config['EXPORT_BATCH_SIZE']))
+
 @app.route('/admin/reset_all_scores', methods=['POST'])
 @admin_required
 def admin_reset_scores():
     """Reset all student scores (legacy marks only, keep QuizScore history)"""
-    try:
-        # Fetch all non-admin users
-        students = User.query.filter_by(is_admin=False).all()
-        
-        # Reset their legacy marks to None (but keep QuizScore history)
-        reset_count = 0
-        for student in students:
-            if student.marks is not None:
-                student.marks = None
-                reset_count += 1
-        
-        # Commit to database
-        db.session.commit()
-        
-        if reset_count > 0:
-            flash(f'All student legacy scores have been reset. {reset_count} students can retake the quiz. (Quiz history preserved)', 'success')
-        else:
-            flash('No legacy scores to reset - all students already have no scores.', 'info')
-            
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error resetting scores: {str(e)}', 'error')
-    
-    return redirect(url_for('admin_students'))
+    return _start_job('reset_legacy_scores', back_url=url_for('admin_students'))
 
 @app.route('/admin/bulk_upload_questions', methods=['GET', 'POST'])
 @admin_required
@@ -1906,71 +1962,24 @@ def admin_bulk_upload_questions():
             flash('No file uploaded', 'error')
             return redirect(request.url)
         
+        dry_run = bool(request.form.get('dry_run') or request.args.get('dry_run'))
+        if not dry_run:
+            return _start_job('import_questions', {'upload': jobs.save_upload(file)}, url_for('admin_questions'))
+        
         try:
-            stream = io.StringIO(file.stream.read().decode('utf-8-sig'))
-            csv_input = csv.DictReader(stream)
+            # Expected columns: question, a (or option_a), b (or option_b), c (or option_c), d (or option_d), answer (or correct_answer), time_limit, type, category, points, rationalization, image_filename
+            report = import_questions(read_csv_rows(file), dry_run=True)
             
-            created = 0
-            for row in csv_input:
-                # Expected columns: question, a (or option_a), b (or option_b), c (or option_c), d (or option_d), answer (or correct_answer), time_limit, type, category, points, rationalization, image_filename
-                question_text = row.get('question', '').strip()
-                option_a = row.get('a', row.get('option_a', '')).strip()
-                option_b = row.get('b', row.get('option_b', '')).strip()
-                option_c = row.get('c', row.get('option_c', '')).strip()
-                option_d = row.get('d', row.get('option_d', '')).strip()
-                correct_answer = row.get('answer', row.get('correct_answer', '')).strip()
-                time_limit = int(row.get('time_limit', 60)) if row.get('time_limit', '').strip().isdigit() else 60
-                question_type = row.get('type', 'MCQ').strip()
-                category = row.get('category', 'General').strip()
-                points = int(row.get('points', 1)) if row.get('points', '').strip().isdigit() else 1
-                rationalization = row.get('rationalization', '').strip()
-                image_filename = row.get('image_filename', '').strip()
-                
-                # Validate required fields based on question type
-                if question_type == 'TF':
-                    if not all([question_text, option_a, option_b, correct_answer]):
-                        continue
-                    option_c = None
-                    option_d = None
-                elif question_type in ['MCQ', 'Image']:
-                    if not all([question_text, option_a, option_b, option_c, option_d, correct_answer]):
-                        continue
-                else:
-                    continue  # Skip invalid question types
-                        
-                # Check if question already exists
-                if Questions.query.filter_by(ques=question_text).first():
-                    continue
-                
-                # Get next available question ID
-                max_id = db.session.query(db.func.max(Questions.q_id)).scalar() or 0
-                new_q_id = max_id + 1
-                
-                question = Questions(
-                    q_id=new_q_id,
-                    ques=question_text,
-                    a=option_a,
-                    b=option_b,
-                    c=option_c,
-                    d=option_d,
-                    ans=correct_answer,
-                    time_limit=time_limit,
-                    question_type=question_type,
-                    category=category,
-                    points=points,
-                    rationalization=rationalization,
-                    image_file=image_filename if image_filename else None,
-                    quiz_category=category
-                )
-                
-                db.session.add(question)
-                created += 1
+            if request.accept_mimetypes.accept_json and not request.accept_mimetypes.accept_html:
+                return report.as_dict()
             
-            db.session.commit()
-            flash(f'Successfully added {created} questions! Supported types: MCQ, TF, Image', 'success')
+            # Nothing was written: show the validation report on the upload page
+            return render_template('admin/bulk_upload.html',
+                                 title='Bulk Upload Questions',
+                                 upload_type='questions',
+                                 report=report)
             
         except Exception as e:
-            db.session.rollback()
             flash(f'Error processing file: {str(e)}', 'error')
             
         return redirect(url_for('admin_questions'))
@@ -1993,31 +2002,20 @@ def admin_bulk_questions():
 @app.route('/admin/export/questions')
 @admin_required
 def admin_export_questions():
-    """Export all questions as CSV"""
+    """Export all questions as CSV (streamed)"""
     try:
         # Query all questions
-        questions = Questions.query.order_by(Questions.quiz_category, Questions.q_id).all()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['Question ID', 'Category', 'Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Correct Answer', 'Time Limit'])
+        questions = db.session.query(
+            Questions.q_id, Questions.quiz_category, Questions.ques, Questions.a, Questions.b,
+            Questions.c, Questions.d, Questions.ans, Questions.time_limit
+        ).order_by(Questions.quiz_category, Questions.q_id)
+        question_count = questions.count()
         
-        # Write question data
-        for q in questions:
-            writer.writerow([q.q_id, q.quiz_category, q.ques, q.a, q.b, q.c, q.d, q.ans, q.time_limit])
+        header = ['Question ID', 'Category', 'Question', 'Option A', 'Option B', 'Option C', 'Option D', 'Correct Answer', 'Time Limit']
+        rows = (list(q) for q in questions.yield_per(app.config['EXPORT_BATCH_SIZE']))
+        response = csv_response('quiz_questions.csv', header, rows)
         
-        # Create response
-        csv_data = output.getvalue()
-        output.close()
-        
-        response = make_response(csv_data)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = 'attachment; filename=quiz_questions.csv'
-        
-        flash(f'Exported {len(questions)} questions', 'success')
+        flash(f'Exported {question_count} questions', 'success')
         return response
         
     except Exception as e:
@@ -2028,61 +2026,19 @@ def admin_export_questions():
 @admin_required
 def admin_reset_all_scores():
     """Delete all quiz scores and reset legacy marks (Complete reset)"""
-    try:
-        # Delete all quiz scores from QuizScore table
-        deleted_count = QuizScore.query.delete()
-        
-        # Also reset legacy marks for all students
-        students = User.query.filter_by(is_admin=False).all()
-        reset_legacy_count = 0
-        for student in students:
-            if student.marks is not None:
-                student.marks = None
-                reset_legacy_count += 1
-        
-        db.session.commit()
-        
-        flash(f'COMPLETE RESET: Deleted {deleted_count} quiz score records and reset {reset_legacy_count} legacy scores. All students can now retake the quiz.', 'success')
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error clearing all scores: {str(e)}', 'error')
-    
-    return redirect(url_for('admin_students'))
+    return _start_job('clear_all_scores', back_url=url_for('admin_students'))
 
 @app.route('/admin/delete_questions', methods=['POST'])
 @admin_required
 def admin_delete_all_questions():
     """Delete all rows in Questions table (Clear exam)"""
-    try:
-        # Delete all questions
-        deleted_count = Questions.query.delete()
-        db.session.commit()
-        
-        flash(f'All questions deleted. {deleted_count} questions removed.', 'success')
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error deleting questions: {str(e)}', 'error')
-    
-    return redirect(url_for('admin_questions'))
+    return _start_job('delete_questions', back_url=url_for('admin_questions'))
 
 @app.route('/admin/delete_questions/<category>', methods=['POST'])
 @admin_required
 def admin_delete_category_questions(category):
     """Delete only questions in a specific category"""
-    try:
-        # Delete questions in specific category
-        deleted_count = Questions.query.filter_by(quiz_category=category).delete()
-        db.session.commit()
-        
-        flash(f'Deleted {deleted_count} questions from {category} category.', 'success')
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error deleting {category} questions: {str(e)}', 'error')
-    
-    return redirect(url_for('admin_questions'))
+    return _start_job('delete_questions', {'category': category}, url_for('admin_questions'))
 
 # ===============================
 # QUESTION SET MANAGEMENT ROUTES
@@ -2133,6 +2089,7 @@ def admin_add_question_set():
         )
         db.session.add(new_set)
         db.session.commit()
+        question_cache.invalidate()
         flash(f'Question Set "{name}" created for {category}.', 'success')
         
     except Exception as e:
@@ -2162,6 +2119,7 @@ def admin_toggle_question_set(id):
             msg = f'Deactivated "{q_set.name}".'
             
         db.session.commit()
+        question_cache.invalidate()
         flash(msg, 'success')
         
     except Exception as e:
@@ -2188,8 +2146,11 @@ def admin_delete_question_set(id):
         return redirect(url_for('admin_question_sets'))
         
     try:
+        # Its responses lose their set id, so they drop out of the set counters
+        remove_set_tallies(q_set.id)
         db.session.delete(q_set)
         db.session.commit()
+        question_cache.invalidate()
         flash(f'Question Set "{q_set.name}" deleted.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -2205,9 +2166,6 @@ def admin_delete_question_set(id):
 @admin_required
 def admin_analytics():
     """MODULE 3: Real Analytics dashboard with actual distractor analysis"""
-    from sqlalchemy import func, case, desc, or_
-    from app.models import StudentResponse
-    
     # Get all question sets for the dropdown
     all_sets = QuestionSet.query.order_by(QuestionSet.quiz_category, QuestionSet.name).all()
     
@@ -2245,99 +2203,15 @@ def admin_analytics():
                                  'total_responses': 0,
                                  'correct_responses': 0
                              },
-                             question_analytics=[])
-    
-    # Filter responses by the selected question set ID
-    # This ensures we only show analytics for responses to questions in THIS specific set
-    responses_query = StudentResponse.query.filter_by(question_set_id=selected_set.id)
-    all_responses = responses_query.all()
-    
-    # Calculate overall statistics
-    if all_responses:
-        unique_students = set(r.user_id for r in all_responses)
-        correct_responses = [r for r in all_responses if r.is_correct]
-        total_responses = len(all_responses)
-        
-        # Calculate scores per student for this question set
-        student_scores = {}
-        for response in all_responses:
-            if response.user_id not in student_scores:
-                student_scores[response.user_id] = {'correct': 0, 'total': 0}
-            student_scores[response.user_id]['total'] += 1
-            if response.is_correct:
-                student_scores[response.user_id]['correct'] += 1
-        
-        scores = [data['correct'] for data in student_scores.values()]
-        
-        stats = {
-            'total_students': len(unique_students),
-            'highest_score': max(scores) if scores else 0,
-            'lowest_score': min(scores) if scores else 0,
-            'average_score': sum(scores) / len(scores) if scores else 0,
-            'total_responses': total_responses,
-            'correct_responses': len(correct_responses)
-        }
-    else:
-        stats = {
-            'total_students': 0,
-            'highest_score': 0,
-            'lowest_score': 0,
-            'average_score': 0,
-            'total_responses': 0,
-            'correct_responses': 0
-        }
+                             question_analytics=[],
+                             item_stats=None)
     
-    # Get questions for this specific question set
+    # Two grouped queries over this set's responses (see app/analytics.py)
     questions = Questions.query.filter_by(question_set_id=selected_set.id).order_by(Questions.q_id).all()
-    
-    # REAL DISTRACTOR ANALYSIS with SQLAlchemy queries
-    question_analytics = []
-    
-    for question in questions:
-        # Query actual student responses for this question IN THIS SET
-        question_responses = StudentResponse.query.filter_by(
-            question_id=question.q_id,
-            question_set_id=selected_set.id
-        ).all()
-        
-        if not question_responses:
-            # No responses yet
-            analytics = {
-                'question': question,
-                'total_responses': 0,
-                'correct_count': 0,
-                'success_rate': 0,
-                'choice_a': 0,
-                'choice_b': 0,
-                'choice_c': 0,
-                'choice_d': 0
-            }
-        else:
-            # Calculate real distractor analysis
-            total_responses = len(question_responses)
-            correct_count = sum(1 for r in question_responses if r.is_correct)
-            success_rate = (correct_count / total_responses) * 100 if total_responses > 0 else 0
-            
-            # Count choices A, B, C, D
-            choice_counts = {
-                'A': sum(1 for r in question_responses if r.selected_answer == 'A'),
-                'B': sum(1 for r in question_responses if r.selected_answer == 'B'), 
-                'C': sum(1 for r in question_responses if r.selected_answer == 'C'),
-                'D': sum(1 for r in question_responses if r.selected_answer == 'D')
-            }
-            
-            analytics = {
-                'question': question,
-                'total_responses': total_responses,
-                'correct_count': correct_count,
-                'success_rate': success_rate,
-                'choice_a': choice_counts['A'],
-                'choice_b': choice_counts['B'],
-                'choice_c': choice_counts['C'],
-                'choice_d': choice_counts['D']
-            }
-        
-        question_analytics.append(analytics)
+    stats = summary_stats(student_scores(selected_set.id))
+    question_analytics = question_breakdown(selected_set.id, questions)
+    # Difficulty, discrimination and reliability, cached until new answers arrive
+    item_stats = item_stats_cache.get(selected_set.id, questions)
     
     return render_template('admin/analytics.html',
                          title='Quiz Analytics - Real Distractor Analysis',
@@ -2346,14 +2220,13 @@ def admin_analytics():
                          all_sets=all_sets,
                          active_set_obj=selected_set,
                          stats=stats,
-                         question_analytics=question_analytics)
+                         question_analytics=question_analytics,
+                         item_stats=item_stats)
 
 @app.route('/admin/analytics/export')
 @admin_required
 def admin_analytics_export():
     """Export analytics data as CSV"""
-    from app.models import StudentResponse
-    
     set_id_param = request.args.get('set_id')
     selected_set = None
     
@@ -2371,59 +2244,43 @@ def admin_analytics_export():
         flash('No question set selected for export.', 'error')
         return redirect(url_for('admin_analytics'))
     
-    # Get questions for this specific question set
-    questions = Questions.query.filter_by(question_set_id=selected_set.id).order_by(Questions.q_id).all()
+    header = ['Question ID', 'Category', 'Question Text', 'Correct Answer', 'Total Responses', 'Success Rate', 'Correct Count', 'A Count', 'B Count', 'C Count', 'D Count',
+              'Difficulty', 'Point-Biserial', 'Discrimination (27%)', 'Distractor A', 'Distractor B', 'Distractor C', 'Distractor D']
+    
+    def _stat(value):
+        return '' if value is None else f'{value:.3f}'
+    
+    def rows():
+        # One row per question; the counts come from the analytics counters
+        questions = Questions.query.filter_by(question_set_id=selected_set.id).order_by(Questions.q_id).all()
+        item_stats = item_stats_cache.get(selected_set.id, questions)
+        for qa in question_breakdown(selected_set.id, questions):
+            question = qa['question']
+            success_rate = f"{qa['success_rate']:.1f}%" if qa['total_responses'] > 0 else "0%"
+            item = item_stats.by_question.get(question.q_id)
+            if item is None:
+                item_columns = [''] * 7
+            else:
+                item_columns = [_stat(item['difficulty']), _stat(item['point_biserial']), _stat(item['discrimination'])] + \
+                    [_stat(item['distractors'][letter]) for letter in ('A', 'B', 'C', 'D')]
+            yield [
+                question.q_id,
+                question.quiz_category,
+                question.ques,
+                question.ans,
+                qa['total_responses'],
+                success_rate,
+                qa['correct_count'],
+                qa['choice_a'],
+                qa['choice_b'],
+                qa['choice_c'],
+                qa['choice_d']
+            ] + item_columns
     
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Question ID', 'Category', 'Question Text', 'Correct Answer', 'Total Responses', 'Success Rate', 'Correct Count', 'A Count', 'B Count', 'C Count', 'D Count'])
-    
-    for question in questions:
-        # Query responses for this question in this set
-        responses = StudentResponse.query.filter_by(
-            question_id=question.q_id,
-            question_set_id=selected_set.id
-        ).all()
-        
-        total_responses = len(responses)
-        correct_count = sum(1 for r in responses if r.is_correct)
-        success_rate = f"{(correct_count / total_responses) * 100:.1f}%" if total_responses > 0 else "0%"
-        
-        # Count choices
-        choice_counts = {
-            'A': sum(1 for r in responses if r.selected_answer == 'A'),
-            'B': sum(1 for r in responses if r.selected_answer == 'B'), 
-            'C': sum(1 for r in responses if r.selected_answer == 'C'),
-            'D': sum(1 for r in responses if r.selected_answer == 'D')
-        }
-        
-        writer.writerow([
-            question.q_id,
-            question.quiz_category,
-            question.ques,
-            question.ans,
-            total_responses,
-            success_rate,
-            correct_count,
-            choice_counts['A'],
-            choice_counts['B'],
-            choice_counts['C'],
-            choice_counts['D']
-        ])
-    
-    # Create response
-    csv_data = output.getvalue()
-    output.close()
-    
-    response = make_response(csv_data)
-    response.headers['Content-Type'] = 'text/csv'
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     safe_set_name = selected_set.name.replace(' ', '_').replace('/', '_')
     filename = f'analytics_export_{safe_set_name}_{timestamp}.csv'
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response = csv_response(filename, header, rows())
     
     return response
 
@@ -2431,27 +2288,16 @@ def admin_analytics_export():
 @admin_required
 def admin_analytics_reset():
     """Reset analytics data (StudentResponse records) for a specific question set"""
-    from app.models import StudentResponse
-    
     set_id_param = request.form.get('set_id')
     
-    try:
-        if set_id_param and set_id_param.isdigit():
-            selected_set = QuestionSet.query.get(int(set_id_param))
-            if selected_set:
-                # Delete only for specific question set
-                deleted_count = StudentResponse.query.filter_by(question_set_id=selected_set.id).delete()
-                msg = f'Analytics data for "{selected_set.name}" has been reset. ({deleted_count} records deleted)'
-                db.session.commit()
-                flash(msg, 'success')
-                return redirect(url_for('admin_analytics', set_id=selected_set.id))
-            else:
-                flash('Question set not found.', 'error')
+    if set_id_param and set_id_param.isdigit():
+        selected_set = QuestionSet.query.get(int(set_id_param))
+        if selected_set:
+            return _start_job('analytics_reset', {'set_id': selected_set.id},
+                              url_for('admin_analytics', set_id=selected_set.id))
         else:
-            flash('Invalid question set ID.', 'error')
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error resetting analytics data: {str(e)}', 'error')
+            flash('Question set not found.', 'error')
+    else:
+        flash('Invalid question set ID.', 'error')
     
     return redirect(url_for('admin_analytics'))
@@ -0,0 +1,301 @@
+"""
+Server-side session storage.
+
+Flask's default session serialises the whole quiz state (question queue,
+answered ids, per-question timers) into a signed cookie that is re-sent on
+every request. With a server-side backend the cookie only carries an opaque
+session id and the data lives in memory or in a small SQLite file.
+
+Select the backend with ``SESSION_BACKEND`` ('sqlite', 'memory' or 'cookie').
+
+Requests for the cacheable files (``FILE_ENDPOINTS``) get a null session:
+the store is neither read nor written for them. Flask opens the session
+before it matches the URL, so they are recognised by the fixed part of
+their URL rules.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+# Cacheable files: served without loading the session or the user
+FILE_ENDPOINTS = ('static', 'static_asset', 'question_image')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed."""
+
+    def __init__(self, initial=None, sid=None, new=False, expires=None, store=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.store = store
+        self.modified = False
+        self.accessed = False
+
+    def regenerate(self):
+        """
+        Move the data to a fresh id and drop the old one from the store, so
+        an id known before a login (or logout) is worthless afterwards.
+        """
+        if self.store is not None and not self.new:
+            self.store.delete(self.sid)
+        self.sid = secrets.token_urlsafe(32)
+        self.new = False
+        self.modified = True
+        self.accessed = True
+
+
+def regenerate_session(session):
+    """Rotate the session id; a no-op for Flask's cookie session, whose value changes anyway."""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+
+class SessionStore(object):
+    """Interface for session backends. Data is stored as a serialised string."""
+
+    def load(self, sid):
+        """Return (data, expires) for a live session, or None."""
+        raise NotImplementedError
+
+    def save(self, sid, data, expires):
+        raise NotImplementedError
+
+    def touch(self, sid, expires):
+        """Extend the expiry of a session without rewriting its data."""
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Remove idle sessions. Returns the number of removed entries."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store. Fast, but sessions are lost on restart and not
+    shared between worker processes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._data[sid]
+                return None
+            return entry
+
+    def save(self, sid, data, expires):
+        with self._lock:
+            self._data[sid] = (data, expires)
+
+    def touch(self, sid, expires):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is not None:
+                self._data[sid] = (entry[0], expires)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, entry in self._data.items() if entry[1] < now]
+            for sid in expired:
+                del self._data[sid]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteSessionStore(SessionStore):
+    """Store backed by its own SQLite file so sessions survive restarts and
+    are shared by every worker on the machine."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)')
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            'SELECT data, expires FROM sessions WHERE sid = ? AND expires >= ?',
+            (sid, time.time())
+        ).fetchone()
+        return row
+
+    def save(self, sid, data, expires):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)',
+            (sid, data, expires)
+        )
+        conn.commit()
+
+    def touch(self, sid, expires):
+        conn = self._connect()
+        conn.execute('UPDATE sessions SET expires = ? WHERE sid = ?', (expires, sid))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._connect()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._connect()
+        cursor = conn.execute('DELETE FROM sessions WHERE expires < ?', (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a SessionStore; the cookie holds only the id."""
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    def __init__(self, store, idle_timeout=4 * 3600, touch_interval=60, purge_interval=600):
+        self.store = store
+        self.idle_timeout = idle_timeout
+        self.touch_interval = touch_interval
+        self.purge_interval = purge_interval
+        self._last_purge = time.time()
+        self._file_prefixes = None
+
+    def _is_file_request(self, app, request):
+        if self._file_prefixes is None:
+            # On the first request, when every route is registered
+            self._file_prefixes = tuple(
+                rule.rule.split('<', 1)[0] for rule in app.url_map.iter_rules() if rule.endpoint in FILE_ENDPOINTS
+            )
+        return request.path.startswith(self._file_prefixes)
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True, store=self.store)
+
+    def open_session(self, app, request):
+        if self._is_file_request(app, request):
+            # One store lookup per image and stylesheet would buy nothing
+            return self.make_null_session(app)
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if not sid:
+            return self._new_session()
+        entry = self.store.load(sid)
+        if entry is None:
+            # Unknown or expired id: never adopt an id chosen by the client
+            return self._new_session()
+        data, expires = entry
+        try:
+            initial = self.serializer.loads(data)
+        except ValueError:
+            return self._new_session()
+        return self.session_class(initial, sid=sid, expires=expires, store=self.store)
+
+    def save_session(self, app, session, response):
+        if self.is_null_session(session):
+            return
+        cookie_name = app.config['SESSION_COOKIE_NAME']
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        self._maybe_purge()
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        expires = now + self.idle_timeout
+        if session.modified or session.new:
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), expires)
+        elif session.expires is not None and session.expires - now < self.idle_timeout - self.touch_interval:
+            # Sliding idle expiry, written at most once per touch_interval
+            self.store.touch(session.sid, expires)
+            return
+        else:
+            return
+
+        response.set_cookie(
+            cookie_name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            self.store.purge_expired()
+        except sqlite3.Error:
+            pass
+
+
+def configure_sessions(app):
+    """Install the server-side session interface selected by SESSION_BACKEND."""
+    backend = (app.config.get('SESSION_BACKEND') or 'cookie').lower()
+    if backend == 'cookie':
+        return None
+    if backend == 'memory':
+        store = MemorySessionStore()
+    elif backend == 'sqlite':
+        store = SqliteSessionStore(app.config['SESSION_SQLITE_PATH'])
+    else:
+        raise ValueError('Unknown SESSION_BACKEND: {}'.format(backend))
+    app.session_interface = ServerSideSessionInterface(
+        store,
+        idle_timeout=app.config.get('SESSION_IDLE_TIMEOUT', 4 * 3600),
+        touch_interval=app.config.get('SESSION_TOUCH_INTERVAL', 60),
+    )
+    return app.session_interface
@@ -0,0 +1,74 @@
+"""
+SQLite connection tuning.
+
+With the default rollback journal one writer blocks every reader, which
+shows up as "database is locked" under the 64-thread waitress server. When
+the database is SQLite and SQLITE_TUNING is on, every new DBAPI connection
+gets the PRAGMAs from the SQLITE_* Config keys (WAL, busy_timeout,
+synchronous, cache/mmap sizes, temp_store, foreign_keys), and the engine
+uses a connection pool sized for a threaded server.
+
+Call ``configure_sqlite_engine(app)`` before ``SQLAlchemy(app)`` and
+``install_sqlite_pragmas(app, db)`` right after it.
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+def _is_sqlite_file(uri):
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') not in ('sqlite:', 'sqlite:/')
+
+
+def configure_sqlite_engine(app):
+    """Add pool settings to SQLALCHEMY_ENGINE_OPTIONS for a file-based SQLite database."""
+    config = app.config
+    if not config.get('SQLITE_TUNING') or not _is_sqlite_file(config['SQLALCHEMY_DATABASE_URI']):
+        return
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    # QueuePool explicitly: older SQLAlchemy defaults to NullPool for SQLite files,
+    # newer to a 5 + 10 QueuePool, both poor fits for 64 waitress threads
+    options.setdefault('poolclass', QueuePool)
+    options.setdefault('pool_size', config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', config['SQLITE_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', config['SQLITE_POOL_TIMEOUT'])
+    connect_args = dict(options.get('connect_args') or {})
+    connect_args.setdefault('check_same_thread', False)
+    connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT'] / 1000.0)
+    options['connect_args'] = connect_args
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def sqlite_pragmas(config):
+    """The PRAGMA statements applied to each new connection, in order."""
+    return [
+        'PRAGMA journal_mode={}'.format(config['SQLITE_JOURNAL_MODE']),
+        'PRAGMA busy_timeout={:d}'.format(config['SQLITE_BUSY_TIMEOUT']),
+        'PRAGMA synchronous={}'.format(config['SQLITE_SYNCHRONOUS']),
+        'PRAGMA cache_size={:d}'.format(config['SQLITE_CACHE_SIZE']),
+        'PRAGMA mmap_size={:d}'.format(config['SQLITE_MMAP_SIZE']),
+        'PRAGMA temp_store={}'.format(config['SQLITE_TEMP_STORE']),
+        'PRAGMA foreign_keys={}'.format('ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'),
+    ]
+
+
+def install_sqlite_pragmas(app, db):
+    """Run the configured PRAGMAs on every new connection of the app's engine."""
+    config = app.config
+    if not config.get('SQLITE_TUNING') or not config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    statements = sqlite_pragmas(config)
+
+    def on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', on_connect)
@@ -0,0 +1,229 @@
+"""
+Fingerprinted, gzip-precompressed static files.
+
+Every page loads Bootstrap, jQuery, Popper and the app stylesheets, and the
+home, login and register pages a large picture each; in a classroom sixty
+browsers fetch them at once over the same Wi-Fi. Templates now link them
+with ``asset_url('css/bootstrap.min.css')``, which returns
+``/assets/css/bootstrap.min.<hash>.css``:
+
+* the hash changes with the content, so responses carry a year-long
+  ``immutable`` Cache-Control and a strong ETag and browsers never
+  revalidate them;
+* text files (CSS, JS, SVG) have a gzip -9 copy built ahead of time in
+  static/dist, sent when the request's Accept-Encoding allows gzip
+  (with ``Vary: Accept-Encoding``);
+* bodies go through ``wsgi.file_wrapper``, so a server with sendfile
+  support (waitress, gunicorn) copies them without reading them into Python.
+
+``build()`` runs at startup and is also ``flask build-assets``.
+static/dist/manifest.json remembers each file's size, mtime and hash, so a
+boot only stats the files and re-hashes the ones that changed. If the
+pipeline is off (STATIC_PIPELINE=0) or the manifest can't be written,
+``asset_url()`` falls back to the plain /static URL.
+
+CSS is not rewritten: stylesheets must not reference other static files by
+relative url() (the shipped ones only use data: URLs).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, abort, url_for
+from werkzeug.wsgi import wrap_file
+
+from app import app
+
+
+MANIFEST_VERSION = 1
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+EXCLUDED_DIRS = ('dist', 'question_images')  # build output; question images have their own store
+MIN_GZIP_SAVING = 0.1  # keep the .gz copy only if it is at least 10% smaller
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprinted(name, digest):
+    """css/site.css -> css/site.<first 12 hex digits>.css"""
+    root, ext = os.path.splitext(name)
+    return '{}.{}{}'.format(root, digest[:12], ext)
+
+
+def _write_gzip(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + '.tmp'
+    # mtime=0 keeps the output identical between builds
+    with open(source, 'rb') as src, open(tmp, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=raw, mtime=0) as out:
+            for chunk in iter(lambda: src.read(64 * 1024), b''):
+                out.write(chunk)
+    os.replace(tmp, target)
+
+
+class StaticAssets(object):
+
+    def __init__(self, static_dir, dist_dir, max_age=365 * 24 * 3600, enabled=True):
+        self.static_dir = static_dir
+        self.dist_dir = dist_dir
+        self.max_age = max_age
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._files = {}  # static path -> manifest entry
+        self._by_url = {}  # fingerprinted path -> static path
+        self.hashed = 0
+        self.served = 0
+        self.served_gzip = 0
+        self.not_modified = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.dist_dir, 'manifest.json')
+
+    def _sources(self):
+        for dirpath, dirnames, filenames in os.walk(self.static_dir):
+            if dirpath == self.static_dir:
+                dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS]
+            for filename in filenames:
+                if not filename.startswith('.'):
+                    path = os.path.join(dirpath, filename)
+                    yield os.path.relpath(path, self.static_dir).replace(os.sep, '/'), path
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('files', {})
+
+    def build(self):
+        """
+        Bring static/dist up to date; returns the number of files hashed.
+        Unchanged files (same size and mtime as in the manifest) are not read.
+        """
+        previous = self._read_manifest()
+        files = {}
+        hashed = 0
+        for name, path in self._sources():
+            stat = os.stat(path)
+            entry = previous.get(name)
+            gz_ok = not entry or not entry['gzip'] or \
+                os.path.exists(os.path.join(self.dist_dir, entry['gzip']))
+            if not (entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime and gz_ok):
+                digest = _sha256(path)
+                hashed += 1
+                url = _fingerprinted(name, digest)
+                entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest, 'url': url, 'gzip': None}
+                if name.lower().endswith(COMPRESSIBLE):
+                    gz_name = url + '.gz'
+                    gz_path = os.path.join(self.dist_dir, gz_name)
+                    if not os.path.exists(gz_path):
+                        _write_gzip(path, gz_path)
+                    if os.path.getsize(gz_path) <= stat.st_size * (1 - MIN_GZIP_SAVING):
+                        entry['gzip'] = gz_name
+                    else:
+                        os.remove(gz_path)
+            files[name] = entry
+
+        if hashed or set(files) != set(previous):
+            os.makedirs(self.dist_dir, exist_ok=True)
+            tmp = self.manifest_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'files': files}, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.manifest_path)
+            self._remove_stale(files)
+
+        with self._lock:
+            self._files = files
+            self._by_url = {entry['url']: name for name, entry in files.items()}
+            self.hashed += hashed
+        return hashed
+
+    def _remove_stale(self, files):
+        """Delete .gz copies of older versions."""
+        keep = {entry['gzip'] for entry in files.values() if entry['gzip']}
+        for dirpath, dirnames, filenames in os.walk(self.dist_dir):
+            for filename in filenames:
+                if filename.endswith('.gz'):
+                    path = os.path.join(dirpath, filename)
+                    if os.path.relpath(path, self.dist_dir).replace(os.sep, '/') not in keep:
+                        os.remove(path)
+
+    def url(self, filename):
+        """Fingerprinted URL of a file under app/static (plain /static URL if it is not in the manifest)."""
+        entry = self._files.get(filename) if self.enabled else None
+        if entry is None:
+            return url_for('static', filename=filename)
+        return url_for('static_asset', filename=entry['url'])
+
+    def send(self, filename):
+        """Response for GET /assets/<fingerprinted name>."""
+        name = self._by_url.get(filename)
+        if name is None:
+            abort(404)
+        entry = self._files[name]
+        source = os.path.join(self.static_dir, *name.split('/'))
+        path, encoding, etag = source, None, entry['sha256']
+        if entry['gzip'] and request.accept_encodings['gzip']:
+            path, encoding, etag = os.path.join(self.dist_dir, *entry['gzip'].split('/')), 'gzip', etag + '-gzip'
+
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            self.not_modified += 1
+        else:
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                abort(404)
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            # wrap_file hands the file to the server's wsgi.file_wrapper (sendfile) when it has one
+            response = app.response_class(wrap_file(request.environ, f), mimetype=mimetype, direct_passthrough=True)
+            response.content_length = os.fstat(f.fileno()).st_size
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+                self.served_gzip += 1
+            self.served += 1
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'.format(self.max_age)
+        if entry['gzip']:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'files': len(self._files),
+                'precompressed': sum(1 for entry in self._files.values() if entry['gzip']),
+                'hashed': self.hashed,
+                'served': self.served,
+                'served_gzip': self.served_gzip,
+                'not_modified': self.not_modified,
+            }
+
+
+static_assets = StaticAssets(
+    app.static_folder,
+    app.config.get('STATIC_DIST_DIR') or os.path.join(app.static_folder, 'dist'),
+    max_age=app.config.get('STATIC_MAX_AGE', 365 * 24 * 3600),
+    enabled=app.config.get('STATIC_PIPELINE', True),
+)
+
+if static_assets.enabled:
+    try:
+        static_assets.build()
+    except OSError:
+        # e.g. a read-only install: serve the plain /static URLs instead
+        app.logger.warning('Static asset pipeline disabled: could not build %s', static_assets.dist_dir, exc_info=True)
+        static_assets.enabled = False
@@ -0,0 +1,205 @@
+"""
+Bulk student import shared by the three CSV entry points (the Bulk Upload
+admin view, the Section editor's CSV field and /admin_bulk_upload_students).
+
+The old loops ran, per row, a duplicate-check query, a Section lookup and a
+serial ``generate_password_hash`` (a deliberately slow key derivation) inside
+the request thread. ``import_students`` instead:
+
+* loads the existing usernames, emails and sections in one query each,
+* validates every row in memory (duplicates inside the file included),
+* hashes the generated passwords in parallel on a process pool (a thread
+  pool in the frozen exe),
+* inserts the new users with chunked executemany INSERTs,
+
+and returns an ``ImportReport`` with one ``ImportRow`` per CSV row.
+"""
+import atexit
+import csv
+import io
+import multiprocessing
+import secrets
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from app import app, db
+from app.models import User, Section
+
+
+ImportRow = namedtuple('ImportRow', ['line', 'username', 'email', 'section', 'status', 'password', 'message'])
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+class ImportReport(object):
+    """Per-row outcome of an import; `rows` are ImportRow tuples in file order."""
+
+    def __init__(self, rows, sections_created):
+        self.rows = rows
+        self.sections_created = sections_created
+
+    @property
+    def created(self):
+        return [row for row in self.rows if row.status == CREATED]
+
+    @property
+    def skipped(self):
+        return [row for row in self.rows if row.status != CREATED]
+
+    def count(self, status):
+        return sum(1 for row in self.rows if row.status == status)
+
+    def as_dict(self, include_passwords=True):
+        return {
+            'created': self.count(CREATED),
+            'duplicates': self.count(DUPLICATE),
+            'invalid': self.count(INVALID),
+            'sections_created': self.sections_created,
+            'rows': [dict(row._asdict(), password=row.password if include_passwords else None)
+                     for row in self.rows],
+        }
+
+
+class PasswordHasher(object):
+    """
+    Hashes passwords on a process pool, created on first use and kept for
+    later imports. Small batches, and platforms where the pool cannot start,
+    are hashed in the calling thread.
+
+    A spawned worker starts the interpreter again and runs the main script
+    as ``__mp_main__``; the entry points (main.py, production_server.py)
+    call ``freeze_support()`` and don't import the app in that case. The
+    PyInstaller build would start the whole exe per worker, so there the
+    pool is a thread pool instead (hashlib releases the GIL while hashing).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._broken = False
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None and not self._broken:
+                workers = app.config['STUDENT_IMPORT_WORKERS']
+                if getattr(sys, 'frozen', False):
+                    self._pool = ThreadPoolExecutor(workers or multiprocessing.cpu_count())
+                else:
+                    # spawn: safe under the threaded server and the same on Windows
+                    context = multiprocessing.get_context('spawn')
+                    self._pool = ProcessPoolExecutor(workers, mp_context=context)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def hash_all(self, passwords):
+        passwords = list(passwords)
+        if len(passwords) < app.config['STUDENT_IMPORT_POOL_MIN']:
+            return [generate_password_hash(p) for p in passwords]
+        try:
+            pool = self._executor()
+            if pool is not None:
+                workers = app.config['STUDENT_IMPORT_WORKERS'] or multiprocessing.cpu_count()
+                chunksize = max(1, len(passwords) // (workers * 4))
+                return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
+        except Exception as e:
+            app.logger.error('Password hashing pool unavailable (%s); hashing serially', e)
+            self.shutdown(broken=True)
+        return [generate_password_hash(p) for p in passwords]
+
+    def shutdown(self, broken=False):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=not broken)
+            self._pool = None
+            self._broken = self._broken or broken
+
+
+password_hasher = PasswordHasher()
+
+
+def read_csv_rows(file):
+    """DictReader over an uploaded (or opened binary) file, with lower-cased, stripped headers."""
+    reader = csv.DictReader(io.StringIO(file.read().decode('utf-8-sig')))
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    return reader
+
+
+def import_students(rows, default_section=None, section=None):
+    """
+    Create the students described by `rows` (dicts with username, email and
+    optionally section). The section of a row is its own ``section`` column,
+    else `default_section`, else 'Default'; missing Section rows are created.
+    Passing a Section model as `section` puts every row in that section and
+    ignores the column (the Section editor).
+
+    Runs in the caller's transaction: the caller commits or rolls back.
+    """
+    default_section = default_section if default_section and default_section != 'All Classes' else 'Default'
+
+    existing_usernames = {name for (name,) in db.session.query(User.username)}
+    existing_emails = {email for (email,) in db.session.query(User.email)}
+    sections = dict(db.session.query(Section.name, Section.id))
+
+    report = []
+    pending = []
+    for line, row in enumerate(rows, start=2):  # line 1 is the header
+        username = (row.get('username') or '').strip()
+        email = (row.get('email') or '').strip()
+        if section is not None:
+            section_name = section.name
+        else:
+            section_name = (row.get('section') or '').strip() or default_section
+        if not username or not email:
+            report.append(ImportRow(line, username, email, section_name, INVALID, None,
+                                    'username and email are required'))
+            continue
+        if username in existing_usernames or email in existing_emails:
+            taken = 'username' if username in existing_usernames else 'email'
+            report.append(ImportRow(line, username, email, section_name, DUPLICATE, None,
+                                    '{} already exists'.format(taken)))
+            continue
+        existing_usernames.add(username)
+        existing_emails.add(email)
+        report.append(None)  # filled in once the password is known
+        pending.append((len(report) - 1, line, username, email, section_name))
+
+    sections_created = []
+    if section is not None:
+        db.session.flush()  # a new Section needs its id before the users reference it
+    else:
+        for name in sorted({entry[4] for entry in pending} - set(sections) - {'Default'}):
+            new_section = Section(name=name, is_active=True)  # New sections default to active
+            db.session.add(new_section)
+            sections_created.append(name)
+        if sections_created:
+            db.session.flush()
+            sections.update(db.session.query(Section.name, Section.id).filter(Section.name.in_(sections_created)))
+
+    passwords = [secrets.token_urlsafe(8) for _ in pending]
+    hashes = password_hasher.hash_all(passwords)
+
+    values = []
+    for (index, line, username, email, section_name), password, password_hash in zip(pending, passwords, hashes):
+        values.append({
+            'username': username,
+            'email': email,
+            'password_hash': password_hash,
+            'is_admin': False,
+            'shuffle_questions': False,
+            'section': section_name,  # Keep legacy string field
+            'section_id': section.id if section is not None else sections.get(section_name) if section_name != 'Default' else None,
+        })
+        report[index] = ImportRow(line, username, email, section_name, CREATED, password, None)
+
+    chunk_size = app.config['STUDENT_IMPORT_CHUNK_SIZE']
+    for start in range(0, len(values), chunk_size):
+        db.session.execute(User.__table__.insert(), values[start:start + chunk_size])
+
+    return ImportReport(report, sections_created)
@@ -0,0 +1,162 @@
+"""
+Group-commit buffer for StudentResponse inserts.
+
+With RESPONSE_WRITE_BEHIND enabled, the answer POST only appends the
+response to a bounded in-process queue. A background flusher inserts queued
+rows in batches inside one transaction, so a class submitting together costs
+one commit (and one fsync on SQLite) per batch instead of one per click.
+
+Routes that finalise an attempt call ``response_buffer.flush()`` first, so
+every answer is in the database before the score is recorded.
+
+Both paths update the analytics counters (app/analytics.py) in the same
+transaction as the response rows.
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from app import app, db
+from app.models import StudentResponse
+from app.analytics import record_tallies
+
+
+class ResponseWriteBuffer(object):
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = app.config.get('RESPONSE_WRITE_BEHIND', False)
+        self.max_queue = app.config.get('RESPONSE_BUFFER_MAX', 10000)
+        self.batch_size = app.config.get('RESPONSE_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('RESPONSE_FLUSH_INTERVAL', 0.05)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one writer at a time (flusher or forced flush)
+        self._thread = None
+        self._stopping = False
+
+        self.batches = 0
+        self.rows_written = 0
+        self.forced_flushes = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def record(self, **fields):
+        """Store one StudentResponse, buffered or committed immediately."""
+        fields.setdefault('timestamp', datetime.utcnow())
+        if not self.enabled:
+            db.session.add(StudentResponse(**fields))
+            record_tallies(db.session, [fields])
+            db.session.commit()
+            return
+        self._ensure_thread()
+        with self._cond:
+            # Bounded queue: back-pressure instead of unbounded memory growth
+            while len(self._queue) >= self.max_queue:
+                self._cond.wait(self.flush_interval)
+            self._queue.append(fields)
+            depth = len(self._queue)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if depth >= self.batch_size:
+                self._cond.notify_all()
+
+    def flush(self):
+        """Write everything queued so far. Safe to call when disabled."""
+        if not self.enabled:
+            return 0
+        self.forced_flushes += 1
+        written = 0
+        while True:
+            count = self._flush_batch()
+            written += count
+            if not count:
+                return written
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='response-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopping:
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait()
+                if len(self._queue) < self.batch_size:
+                    # Give the batch a short window to fill up
+                    self._cond.wait(self.flush_interval)
+            self._flush_batch()
+
+    def stop(self):
+        self._stopping = True
+        with self._cond:
+            self._cond.notify_all()
+        self.flush()
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            with self._cond:
+                rows = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._cond.notify_all()
+            if not rows:
+                return 0
+            started = time.perf_counter()
+            with self.app.app_context():
+                self._write(rows)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+            return len(rows)
+
+    def _write(self, rows):
+        table = StudentResponse.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert(), rows)
+                record_tallies(conn, rows)
+            self.rows_written += len(rows)
+        except Exception as e:
+            # Retry row by row so one bad row does not drop the whole batch
+            self.app.logger.error('Batched response insert failed (%s); retrying row by row', e)
+            for row in rows:
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(table.insert(), [row])
+                        record_tallies(conn, [row])
+                    self.rows_written += 1
+                except Exception as row_error:
+                    self.errors += 1
+                    self.app.logger.error('Dropped response %r: %s', row, row_error)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queue_depth': len(self._queue),
+            'max_queue_depth': self.max_depth,
+            'queue_capacity': self.max_queue,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'forced_flushes': self.forced_flushes,
+            'errors': self.errors,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'avg_flush_ms': round(self._total_flush_ms / self.batches, 3) if self.batches else 0.0,
+            'max_flush_ms': round(self.max_flush_ms, 3),
+        }
+
+
+response_buffer = ResponseWriteBuffer(app)
@@ -0,0 +1,112 @@
+"""
+Distractor analysis: per-question Python loops vs the analytics counters.
+
+Seeds a question set with a large synthetic StudentResponse table (and
+rebuilds the counter tables from it), then times the old admin_analytics()
+computation (load every response, then one query and four counting passes
+per question) against app/analytics.py, and reports the time of the
+analytics page and CSV export requests.
+
+    python bench_analytics.py --students 1000 --questions 100
+"""
+import argparse
+import random
+import time
+
+from bench_common import app, db, seed_exam, login_client, QueryCounter
+from app.models import User, Questions, StudentResponse
+from app.analytics import student_scores, summary_stats, question_breakdown, rebuild_tallies
+
+
+def seed_responses(set_id, usernames):
+    rng = random.Random(7)
+    with app.app_context():
+        user_ids = [u.id for u in User.query.filter(User.username.in_(usernames)).all()]
+        question_ids = [q.q_id for q in Questions.query.filter_by(question_set_id=set_id).all()]
+        rows = []
+        for user_id in user_ids:
+            for q_id in question_ids:
+                letter = rng.choice('ABCD')
+                rows.append({'user_id': user_id, 'question_id': q_id, 'selected_answer': letter,
+                             'is_correct': letter == 'B', 'quiz_category': 'General',
+                             'question_set_id': set_id})
+        db.session.execute(StudentResponse.__table__.insert(), rows)
+        db.session.commit()
+        rebuild_tallies(set_id)
+        return len(rows)
+
+
+def legacy_analytics(set_id):
+    """The previous admin_analytics() body, kept here for comparison."""
+    all_responses = StudentResponse.query.filter_by(question_set_id=set_id).all()
+    student_scores = {}
+    for response in all_responses:
+        entry = student_scores.setdefault(response.user_id, {'correct': 0, 'total': 0})
+        entry['total'] += 1
+        if response.is_correct:
+            entry['correct'] += 1
+    scores = [data['correct'] for data in student_scores.values()]
+    stats = {'highest_score': max(scores), 'lowest_score': min(scores), 'average_score': sum(scores) / len(scores)}
+    analytics = []
+    for question in Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id).all():
+        responses = StudentResponse.query.filter_by(question_id=question.q_id, question_set_id=set_id).all()
+        analytics.append({
+            'total_responses': len(responses),
+            'correct_count': sum(1 for r in responses if r.is_correct),
+            'choice_a': sum(1 for r in responses if r.selected_answer == 'A'),
+            'choice_b': sum(1 for r in responses if r.selected_answer == 'B'),
+            'choice_c': sum(1 for r in responses if r.selected_answer == 'C'),
+            'choice_d': sum(1 for r in responses if r.selected_answer == 'D'),
+        })
+    return stats, analytics
+
+
+def counter_analytics(set_id):
+    return summary_stats(student_scores(set_id)), question_breakdown(set_id)
+
+
+def timed(fn, *args):
+    with QueryCounter() as queries:
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+    return result, elapsed, queries.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=100)
+    args = parser.parse_args()
+
+    set_id, usernames = seed_exam(students=args.students, questions=args.questions)
+    total = seed_responses(set_id, usernames)
+    print('{} questions x {} students = {} responses'.format(args.questions, args.students, total))
+    print('{:<22} {:>10} {:>9}'.format('computation', 'ms', 'queries'))
+
+    with app.app_context():
+        (old_stats, old_rows), old_s, old_q = timed(legacy_analytics, set_id)
+        db.session.remove()
+        (new_stats, new_rows), new_s, new_q = timed(counter_analytics, set_id)
+        for key in old_rows[0]:
+            assert [r[key] for r in old_rows] == [r[key] for r in new_rows], key
+        for key in old_stats:
+            assert old_stats[key] == new_stats[key], key
+    print('{:<22} {:>10.1f} {:>9}'.format('python loops (old)', old_s * 1000, old_q))
+    print('{:<22} {:>10.1f} {:>9}'.format('counter tables', new_s * 1000, new_q))
+    print('speedup: {:.1f}x'.format(old_s / new_s))
+
+    with app.app_context():
+        admin = User(username='bench_admin', email='bench_admin@bench.local', is_admin=True,
+                     password_hash=User.query.filter_by(username=usernames[0]).first().password_hash)
+        db.session.add(admin)
+        db.session.commit()
+    client = login_client('bench_admin')
+    for path in ('/admin/analytics?set_id={}', '/admin/analytics/export?set_id={}'):
+        started = time.perf_counter()
+        assert client.get(path.format(set_id)).status_code == 200
+        print('GET {:<36} {:>8.1f} ms'.format(path.format(set_id), (time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    main()
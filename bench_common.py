@@ -0,0 +1,81 @@
+"""
+Shared setup for the bench_*.py scripts.
+
+Every benchmark runs against a throw-away SQLite database in a temp folder,
+so app.db is never touched. Import this module BEFORE anything from ``app``.
+"""
+import os
+import tempfile
+
+BENCH_DIR = tempfile.mkdtemp(prefix='quiz_bench_')
+os.environ['DATABASE_URL'] = os.environ.get('BENCH_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(BENCH_DIR, 'bench.db')
+os.environ['SESSION_SQLITE_PATH'] = os.path.join(BENCH_DIR, 'sessions.db')
+
+from sqlalchemy import event
+
+from app import app, db
+from app.models import User, Questions, QuestionSet
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def seed_exam(students=60, questions=20, category='General', password=BENCH_PASSWORD):
+    """
+    Create an active QuestionSet with `questions` MCQ questions and `students`
+    student accounts in its category. Returns (set_id, usernames).
+    """
+    with app.app_context():
+        db.create_all()
+        q_set = QuestionSet(name='Bench Set', quiz_category=category, is_active=True)
+        db.session.add(q_set)
+        db.session.flush()
+        start_id = (db.session.query(db.func.max(Questions.q_id)).scalar() or 0) + 1
+        for i in range(questions):
+            db.session.add(Questions(
+                q_id=start_id + i,
+                ques='Bench question {} of set {}?'.format(i + 1, q_set.id),
+                a='Option A', b='Option B', c='Option C', d='Option D', ans='Option B',
+                quiz_category=category, question_set_id=q_set.id, time_limit=60,
+            ))
+        # One hash for everybody: PBKDF2 per student would dominate the setup time
+        template = User(username='_', email='_')
+        template.set_password(password)
+        usernames = []
+        for i in range(students):
+            username = 'bench_{}_{}'.format(q_set.id, i)
+            db.session.add(User(username=username, email=username + '@bench.local',
+                                section=category, password_hash=template.password_hash))
+            usernames.append(username)
+        db.session.commit()
+        return q_set.id, usernames
+
+
+class QueryCounter(object):
+    """Counts SQL statements executed on the app's engine while active."""
+
+    def __init__(self):
+        self.count = 0
+        with app.app_context():
+            self.engine = db.engine
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def login_client(username, password=BENCH_PASSWORD):
+    """Return a Flask test client logged in as `username`."""
+    client = app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError('Login failed for {}'.format(username))
+    return client
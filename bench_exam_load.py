@@ -0,0 +1,187 @@
+"""
+End-to-end concurrent exam load generator.
+
+Creates N synthetic students and one active QuestionSet, then runs every
+student through login -> start_quiz -> ready -> start_timer -> question
+(GET + POST) ... -> score at the same time, one thread per student. Requests go
+either to the WSGI app in-process (Flask test clients) or over HTTP to a
+waitress server started on localhost with the same thread count as
+production_server.py.
+
+Reports exams/s, requests/s, p50/p95/p99 latency per endpoint, HTTP errors,
+"database is locked" errors and SQL statements per completed exam.
+
+    python bench_exam_load.py --students 60 --questions 20
+    python bench_exam_load.py --students 120 --questions 20 --waitress --threads 64
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import build_opener, HTTPCookieProcessor, HTTPRedirectHandler
+
+from bench_common import app, db, seed_exam, QueryCounter, BENCH_PASSWORD
+from sqlalchemy import event
+
+
+ENDPOINTS = ['login', 'start_quiz', 'ready', 'start_timer', 'question GET', 'question POST', 'score']
+
+
+class InProcessClient(object):
+    """Flask test client; returns (status, redirect path)."""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method.lower())(path, data=data)
+        response.close()
+        return response.status_code, urlsplit(response.headers.get('Location', '')).path
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient(object):
+    """urllib client with its own cookie jar; redirects are returned, not followed."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urlencode(data or {}).encode() if method == 'POST' else None
+        try:
+            response = self.opener.open(self.base_url + path, data=body, timeout=120)
+        except HTTPError as e:
+            response = e
+        response.read()
+        response.close()
+        return response.code, urlsplit(response.headers.get('Location') or '').path
+
+
+class LoadStats(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completed = 0
+        self.failed = 0
+
+    def timed(self, endpoint, client, method, path, data=None, expect=(200, 302)):
+        started = time.perf_counter()
+        status, location = client.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if status not in expect:
+                self.errors[endpoint] += 1
+        if status not in expect:
+            raise RuntimeError('{} {} -> {}'.format(method, path, status))
+        return location
+
+
+def run_student(make_client, username, stats, start_gate):
+    client = make_client()
+    start_gate.wait()
+    try:
+        stats.timed('login', client, 'POST', '/login', {'username': username, 'password': BENCH_PASSWORD}, expect=(302,))
+        location = stats.timed('start_quiz', client, 'GET', '/start_quiz', expect=(302,))
+        while '/ready/' in location:
+            q_id = int(location.rsplit('/', 1)[1])
+            stats.timed('ready', client, 'GET', location, expect=(200,))
+            stats.timed('start_timer', client, 'POST', '/start_timer/{}'.format(q_id))
+            stats.timed('question GET', client, 'GET', '/question/{}'.format(q_id), expect=(200,))
+            location = stats.timed('question POST', client, 'POST', '/question/{}'.format(q_id),
+                                   {'options': 'Option B'}, expect=(302,))
+        if '/score' not in location:
+            raise RuntimeError('exam ended at {}'.format(location))
+        stats.timed('score', client, 'GET', '/score', expect=(200,))
+    except Exception:
+        with stats._lock:
+            stats.failed += 1
+        return
+    with stats._lock:
+        stats.completed += 1
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))] if values else 0.0
+
+
+def start_waitress(port, threads):
+    from waitress import create_server
+    server = create_server(app, host='127.0.0.1', port=port, threads=threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=60, help='concurrent students (one thread each)')
+    parser.add_argument('--questions', type=int, default=20, help='questions in the exam')
+    parser.add_argument('--waitress', action='store_true', help='go through a local waitress server over HTTP')
+    parser.add_argument('--threads', type=int, default=64, help='waitress worker threads (production_server.py uses 64)')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    set_id, usernames = seed_exam(students=args.students, questions=args.questions)
+
+    locked = [0]
+
+    def on_error(context):
+        if 'database is locked' in str(context.original_exception):
+            locked[0] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'handle_error', on_error)
+
+    server = None
+    if args.waitress:
+        server = start_waitress(args.port, args.threads)
+        base_url = 'http://127.0.0.1:{}'.format(args.port)
+        make_client = lambda: HttpClient(base_url)
+        target = 'waitress ({} threads) on {}'.format(args.threads, base_url)
+    else:
+        make_client = InProcessClient
+        target = 'in-process WSGI app'
+
+    stats = LoadStats()
+    start_gate = threading.Barrier(len(usernames) + 1)
+    workers = [threading.Thread(target=run_student, args=(make_client, u, stats, start_gate)) for u in usernames]
+    for t in workers:
+        t.start()
+    with QueryCounter() as queries:
+        start_gate.wait()
+        started = time.perf_counter()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+    if server is not None:
+        server.close()
+
+    total_requests = sum(len(v) for v in stats.latencies.values())
+    print('Target: {}'.format(target))
+    print('Exam: {} questions, {} concurrent students'.format(args.questions, args.students))
+    print('Completed exams: {}  failed: {}  wall time: {:.2f}s'.format(stats.completed, stats.failed, elapsed))
+    print('Throughput: {:.2f} exams/s, {:.1f} requests/s'.format(stats.completed / elapsed, total_requests / elapsed))
+    print('HTTP errors: {}  database-locked errors: {}'.format(sum(stats.errors.values()), locked[0]))
+    if stats.completed:
+        print('SQL statements per completed exam: {:.1f}'.format(queries.count / stats.completed))
+    print()
+    print('{:<14} {:>8} {:>9} {:>9} {:>9} {:>7}'.format('endpoint', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for endpoint in ENDPOINTS:
+        values = stats.latencies.get(endpoint, [])
+        print('{:<14} {:>8} {:>9.1f} {:>9.1f} {:>9.1f} {:>7}'.format(
+            endpoint, len(values), percentile(values, 50) * 1000, percentile(values, 95) * 1000,
+            percentile(values, 99) * 1000, stats.errors.get(endpoint, 0)))
+
+
+if __name__ == '__main__':
+    main()
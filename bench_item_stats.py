@@ -0,0 +1,106 @@
+"""
+Item statistics (app/item_stats.py) at exam scale.
+
+Seeds a question set with a synthetic StudentResponse table (a Rasch model:
+student ability and item difficulty drawn from a normal distribution, and
+an option chosen for every answer), then times the cold computation split
+into the SQL load, the scatter into the response matrix and the NumPy
+statistics, a cached call, and the update after a batch of new answers.
+
+    python bench_item_stats.py --students 10000 --questions 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from bench_common import app, db, seed_exam
+from app.models import User, Questions, StudentResponse
+from app.analytics import rebuild_tallies
+from app.item_stats import item_stats_cache, item_statistics, ResponseMatrix, _load_responses
+
+
+def seed_responses(set_id, usernames, chunk=100000, seed=7):
+    rng = np.random.RandomState(seed)
+    with app.app_context():
+        user_ids = np.array([u.id for u in User.query.filter(User.username.in_(usernames)).all()])
+        question_ids = np.array([q.q_id for q in Questions.query.filter_by(question_set_id=set_id).all()])
+        ability = rng.normal(size=len(user_ids))
+        difficulty = rng.normal(size=len(question_ids))
+        correct = rng.random_sample((len(user_ids), len(question_ids))) < \
+            1.0 / (1.0 + np.exp(-(ability[:, None] - difficulty[None, :])))
+        wrong = np.array(['Option A', 'Option C', 'Option D'])[rng.randint(0, 3, size=correct.shape)]
+        answers = np.where(correct, 'Option B', wrong)
+
+        users, items = np.meshgrid(np.arange(len(user_ids)), np.arange(len(question_ids)), indexing='ij')
+        users, items = users.ravel(), items.ravel()
+        table = StudentResponse.__table__
+        for start in range(0, len(users), chunk):
+            u, i = users[start:start + chunk], items[start:start + chunk]
+            db.session.execute(table.insert(), [
+                {'user_id': int(user_ids[a]), 'question_id': int(question_ids[b]), 'selected_answer': answers[a, b],
+                 'is_correct': bool(correct[a, b]), 'quiz_category': 'General', 'question_set_id': set_id}
+                for a, b in zip(u, i)
+            ])
+            db.session.commit()
+        rebuild_tallies(set_id)
+        return len(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--update', type=int, default=25, help='students answering again before the last call')
+    args = parser.parse_args()
+
+    set_id, usernames = seed_exam(students=args.students, questions=args.questions)
+    total = seed_responses(set_id, usernames)
+    print('{} students x {} questions = {} responses'.format(args.students, args.questions, total))
+
+    with app.app_context():
+        questions = Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id).all()
+        newest = db.session.query(db.func.max(StudentResponse.id)).scalar()
+
+        started = time.perf_counter()
+        answers = _load_responses(set_id, newest)
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matrix = ResponseMatrix(questions)
+        matrix.add(*answers)
+        scatter_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stats = item_statistics(matrix.view(), questions, matrix.user_ids())
+        compute_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        item_stats_cache.get(set_id, questions)
+        cold_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        item_stats_cache.get(set_id, questions)
+        cached_s = time.perf_counter() - started
+
+    # A new sitting of the first `--update` students answering every question again
+    seed_responses(set_id, usernames[:args.update], seed=8)
+    with app.app_context():
+        started = time.perf_counter()
+        item_stats_cache.get(set_id, questions)
+        update_s = time.perf_counter() - started
+
+    for label, seconds in (('load answers (SQL)', load_s), ('scatter into matrix', scatter_s),
+                           ('statistics (NumPy)', compute_s), ('cache: cold', cold_s),
+                           ('cache: unchanged', cached_s),
+                           ('cache: +{} answers'.format(args.update * args.questions), update_s)):
+        print('{:<34} {:>10.1f} ms'.format(label, seconds * 1000))
+    difficulty = [s['difficulty'] for s in stats.by_question.values()]
+    discrimination = [s['discrimination'] for s in stats.by_question.values()]
+    print('matrix {}x{}, KR-20 {:.3f}, alpha {:.3f}, difficulty {:.2f}..{:.2f}, mean D {:.2f}'.format(
+        stats.students, stats.items, stats.kr20, stats.alpha, min(difficulty), max(difficulty),
+        sum(discrimination) / len(discrimination)))
+    print(item_stats_cache.stats())
+
+if __name__ == '__main__':
+    main()
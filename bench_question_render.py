@@ -0,0 +1,108 @@
+"""
+Question page rendering with and without the fragment cache.
+
+Every synthetic student logs in, starts the quiz and the timer of its first
+question, then all students request that question page at the same time,
+one thread each, first with app/question_fragments.py disabled (form and
+widgets rendered on every GET, as before) and then enabled. Reports
+requests/s and p50/p95 latency of GET /question/<id>, and the time spent
+building the stem/options HTML alone.
+
+    python bench_question_render.py --students 60 --requests 50
+"""
+import argparse
+import threading
+import time
+
+from bench_common import app, db, seed_exam, login_client
+from app.models import Questions
+from app.cache import question_cache
+from app.question_fragments import question_fragments
+from app.routes import render_question_body
+
+
+def start_first_question(username):
+    client = login_client(username)
+    location = client.get('/start_quiz').headers['Location']
+    q_id = int(location.rsplit('/', 1)[1])
+    client.get(location)
+    client.post('/start_timer/{}'.format(q_id))
+    return client, '/question/{}'.format(q_id)
+
+
+def run(students, requests):
+    latencies = []
+    lock = threading.Lock()
+    gate = threading.Event()
+
+    def worker(client, path):
+        mine = []
+        gate.wait()
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            mine.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=student) for student in students]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000)
+
+
+def body_render_ms(q_id, repeat=200):
+    """Per-call cost of the stem/options HTML: rendered vs. served from the cache."""
+    with app.test_request_context():
+        q = question_cache.get_question(Questions.query.filter_by(q_id=q_id).first().question_set_id, q_id)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            render_question_body(q)
+        rendered = (time.perf_counter() - started) / repeat * 1000
+        question_fragments.get(q, lambda: render_question_body(q))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            question_fragments.get(q, lambda: render_question_body(q))
+        cached = (time.perf_counter() - started) / repeat * 1000
+    return rendered, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=60, help='concurrent students (one thread each)')
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50, help='question page GETs per student and mode')
+    args = parser.parse_args()
+
+    set_id, usernames = seed_exam(students=args.students, questions=args.questions)
+    with app.app_context():
+        # Long enough that the timer never runs out during the benchmark
+        Questions.query.filter_by(question_set_id=set_id).update({'time_limit': 600})
+        db.session.commit()
+    question_cache.invalidate()
+    students = [start_first_question(username) for username in usernames]
+
+    print('{} students x {} GETs of the question page'.format(args.students, args.requests))
+    print('{:<22} {:>10} {:>10} {:>10}'.format('fragments', 'req/s', 'p50 ms', 'p95 ms'))
+    for label, enabled in (('off (render per GET)', False), ('on (cached)', True)):
+        question_fragments.enabled = enabled
+        question_fragments.invalidate()
+        run(students[:1], 5)  # warm-up
+        print('{:<22} {:>10.1f} {:>10.2f} {:>10.2f}'.format(label, *run(students, args.requests)))
+
+    rendered, cached = body_render_ms(int(students[0][1].rsplit('/', 1)[1]))
+    print('stem/options HTML: {:.3f} ms rendered, {:.4f} ms cached'.format(rendered, cached))
+    print(question_fragments.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare the classic page flow with the JSON quiz API.
+
+For each flow, a batch of synthetic students takes a complete exam
+(start_quiz ... score) and the script reports HTTP requests, SQL statements
+and wall time per completed exam.
+
+    python bench_quiz_api.py --students 20 --questions 20
+"""
+import argparse
+import time
+
+from bench_common import app, seed_exam, login_client, QueryCounter
+
+
+class CountingClient(object):
+    """Wraps a test client and counts the requests it sends."""
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = 0
+
+    def get(self, *args, **kwargs):
+        self.requests += 1
+        return self.client.get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        self.requests += 1
+        return self.client.post(*args, **kwargs)
+
+
+def run_page_flow(client):
+    location = client.get('/start_quiz').headers['Location']
+    while '/ready/' in location:
+        client.get(location)
+        q_id = int(location.rsplit('/', 1)[1])
+        client.post('/start_timer/{}'.format(q_id))
+        client.get('/question/{}'.format(q_id))
+        location = client.post('/question/{}'.format(q_id), data={'options': 'Option B'}).headers['Location']
+    assert '/score' in location, location
+    assert client.get('/score').status_code == 200
+
+
+def run_api_flow(client):
+    client.get('/start_quiz?mode=api')
+    data = client.get('/api/quiz/current').get_json()
+    q = data['question']
+    while True:
+        started = client.post('/api/quiz/start_timer', json={'q_id': q['q_id']}).get_json()
+        assert started['status'] == 'started', started
+        data = client.post('/api/quiz/answer', json={'q_id': q['q_id'], 'option': 'Option B'}).get_json()
+        assert data['status'] == 'recorded', data
+        if data['finished']:
+            break
+        q = data['next']
+    assert client.get(data['score_url']).status_code == 200
+
+
+def measure(name, flow, usernames):
+    requests = 0
+    started = time.perf_counter()
+    with QueryCounter() as queries:
+        for username in usernames:
+            client = CountingClient(login_client(username))
+            flow(client)
+            requests += client.requests
+    elapsed = time.perf_counter() - started
+    exams = len(usernames)
+    print('{:<10} {:>14.1f} {:>14.1f} {:>14.1f}'.format(
+        name, requests / exams, queries.count / exams, elapsed / exams * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=20, help='completed exams per flow')
+    parser.add_argument('--questions', type=int, default=20, help='questions per exam')
+    args = parser.parse_args()
+
+    set_id, usernames = seed_exam(students=args.students * 2, questions=args.questions)
+    print('Exam: {} questions, {} students per flow'.format(args.questions, args.students))
+    print('{:<10} {:>14} {:>14} {:>14}'.format('flow', 'requests/exam', 'queries/exam', 'ms/exam'))
+    measure('pages', run_page_flow, usernames[:args.students])
+    measure('json api', run_api_flow, usernames[args.students:])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Readers and writers hammering the real models, with and without SQLite tuning.
+
+Each mode runs in a fresh child process (so the Config is read from scratch)
+against its own throw-away database: writer threads record StudentResponse
+and QuizScore rows the way the quiz does, reader threads run the leaderboard
+and question queries. The script reports throughput, latency and
+"database is locked" errors for the legacy settings and the tuned ones.
+
+    python bench_sqlite_concurrency.py --readers 48 --writers 16 --seconds 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def run_child(args):
+    from bench_common import app, db, seed_exam
+    from sqlalchemy.exc import OperationalError
+    from app.models import User, Questions, QuizScore, StudentResponse
+
+    set_id, usernames = seed_exam(students=args.writers, questions=20)
+    with app.app_context():
+        user_ids = [u.id for u in User.query.filter(User.username.in_(usernames)).all()]
+        question_ids = [q.q_id for q in Questions.query.filter_by(question_set_id=set_id).all()]
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'reads': [], 'writes': [], 'locked': 0, 'errors': 0}
+
+    def writer(user_id):
+        i = 0
+        with app.app_context():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.session.add(StudentResponse(
+                        user_id=user_id, question_id=question_ids[i % len(question_ids)],
+                        selected_answer='B', is_correct=True, quiz_category='General',
+                        question_set_id=set_id))
+                    if i % len(question_ids) == len(question_ids) - 1:
+                        db.session.add(QuizScore(user_id=user_id, quiz_category='General',
+                                                 question_set_id=set_id, score=i % 20, status='completed'))
+                    db.session.commit()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results['writes'].append(elapsed)
+                except OperationalError as e:
+                    db.session.rollback()
+                    with lock:
+                        results['locked' if 'locked' in str(e) else 'errors'] += 1
+                i += 1
+            db.session.remove()
+
+    def reader():
+        with app.app_context():
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.session.query(User.username, QuizScore.score).join(
+                        User, QuizScore.user_id == User.id
+                    ).filter(QuizScore.question_set_id == set_id).order_by(QuizScore.score.desc()).limit(10).all()
+                    Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id).all()
+                    db.session.query(db.func.count(StudentResponse.id)).filter_by(question_set_id=set_id).scalar()
+                    db.session.commit()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        results['reads'].append(elapsed)
+                except OperationalError as e:
+                    db.session.rollback()
+                    with lock:
+                        results['locked' if 'locked' in str(e) else 'errors'] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=writer, args=(user_ids[i % len(user_ids)],)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        'journal_mode': journal_mode,
+        'reads_per_s': len(results['reads']) / args.seconds,
+        'writes_per_s': len(results['writes']) / args.seconds,
+        'read_p95_ms': percentile(results['reads'], 95) * 1000,
+        'write_p95_ms': percentile(results['writes'], 95) * 1000,
+        'write_p99_ms': percentile(results['writes'], 99) * 1000,
+        'locked': results['locked'],
+        'errors': results['errors'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=48)
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    print('{} readers, {} writers, {:.0f}s per mode'.format(args.readers, args.writers, args.seconds))
+    print('{:<8} {:>8} {:>9} {:>10} {:>12} {:>12} {:>12} {:>7} {:>7}'.format(
+        'mode', 'journal', 'reads/s', 'writes/s', 'read p95 ms', 'write p95 ms', 'write p99 ms', 'locked', 'errors'))
+    for mode, tuning in (('legacy', '0'), ('tuned', '1')):
+        env = dict(os.environ, SQLITE_TUNING=tuning)
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             '--readers', str(args.readers), '--writers', str(args.writers), '--seconds', str(args.seconds)],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        r = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<8} {:>8} {:>9.0f} {:>10.0f} {:>12.1f} {:>12.1f} {:>12.1f} {:>7} {:>7}'.format(
+            mode, r['journal_mode'], r['reads_per_s'], r['writes_per_s'], r['read_p95_ms'],
+            r['write_p95_ms'], r['write_p99_ms'], r['locked'], r['errors']))
+
+
+if __name__ == '__main__':
+    main()
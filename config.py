@@ -16,6 +16,89 @@ class Config(object):
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     QUES_PER_PAGE = 1
+
+    # Server-side sessions: 'sqlite' (default), 'memory' (single process only)
+    # or 'cookie' (Flask's signed cookie, stores all quiz state client-side)
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND') or 'sqlite'
+    SESSION_SQLITE_PATH = os.environ.get('SESSION_SQLITE_PATH') or \
+        os.path.join(basedir, 'sessions.db')
+    SESSION_IDLE_TIMEOUT = int(os.environ.get('SESSION_IDLE_TIMEOUT') or 4 * 3600)  # seconds
+    SESSION_TOUCH_INTERVAL = 60  # seconds between idle-expiry refreshes of an unchanged session
+
+    # Write-behind for StudentResponse inserts: answers are queued and committed
+    # in batches by a background flusher instead of one commit per click
+    RESPONSE_WRITE_BEHIND = os.environ.get('RESPONSE_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+    RESPONSE_BUFFER_MAX = 10000  # queued answers before submitters block
+    RESPONSE_BATCH_SIZE = 200  # rows per transaction
+    RESPONSE_FLUSH_INTERVAL = 0.05  # seconds a partial batch may wait
+
+    # Cached login principal (id, role, section, session token, shuffle flag)
+    # used by load_user() instead of a User SELECT on every request
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 30)  # seconds, 0 disables
+    USER_CACHE_MAX = 5000  # cached users
+
+    # Admin dashboard and home counters (see app/dashboard_stats.py)
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL') or 30)  # max age in seconds, 0 disables
+    DASHBOARD_STATS_SCORE_DELAY = 5  # seconds before finished quizzes show up
+
+    # Question images: stored once per content hash, served as immutable (see app/image_store.py)
+    IMAGE_MAX_BYTES = 10 * 1024 * 1024  # largest accepted upload
+    IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read, hashed and written at a time
+    IMAGE_MAX_AGE = 365 * 24 * 3600  # Cache-Control max-age of content-addressed images
+
+    # Question page stem/options HTML rendered once per question version
+    QUESTION_FRAGMENT_CACHE = os.environ.get('QUESTION_FRAGMENT_CACHE', '1').lower() not in ('0', 'false', 'no')
+    QUESTION_FRAGMENT_CACHE_MAX = 1000  # cached questions
+
+    # Quiz pages hint the browser to fetch upcoming question images early
+    QUIZ_PREFETCH_AHEAD = 1  # questions ahead whose image question.html prefetches
+    QUIZ_PREFETCH_MAX = 2  # image hints per page
+
+    # Static files linked with asset_url(): fingerprinted, gzip-precompressed
+    # into STATIC_DIST_DIR at startup (see app/static_assets.py)
+    STATIC_PIPELINE = os.environ.get('STATIC_PIPELINE', '1').lower() not in ('0', 'false', 'no')
+    STATIC_DIST_DIR = os.environ.get('STATIC_DIST_DIR')  # None: app/static/dist
+    STATIC_MAX_AGE = 365 * 24 * 3600  # seconds
+
+    # SQLite tuning applied to every new connection (see app/sqlite_tuning.py).
+    # WAL lets readers run alongside the single writer; busy_timeout makes
+    # writers wait for the lock instead of failing with "database is locked".
+    SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1').lower() not in ('0', 'false', 'no')
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_BUSY_TIMEOUT = 15000  # milliseconds
+    SQLITE_SYNCHRONOUS = 'NORMAL'  # durable in WAL mode except on power loss
+    SQLITE_CACHE_SIZE = -32000  # negative = KiB of page cache per connection
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # bytes
+    SQLITE_TEMP_STORE = 'MEMORY'
+    SQLITE_FOREIGN_KEYS = os.environ.get('SQLITE_FOREIGN_KEYS', '').lower() in ('1', 'true', 'yes')
+    SQLITE_POOL_SIZE = 16  # kept-open connections
+    SQLITE_MAX_OVERFLOW = 48  # extra connections up to the 64 waitress threads
+    SQLITE_POOL_TIMEOUT = 30  # seconds to wait for a free connection
+
+    # CSV exports stream in chunks; gzip them when the browser accepts it
+    EXPORT_GZIP = True
+    EXPORT_GZIP_LEVEL = 6
+    EXPORT_BATCH_SIZE = 1000  # rows fetched from the database per batch
+
+    # Bulk student import: passwords are hashed on a process pool
+    STUDENT_IMPORT_WORKERS = int(os.environ.get('STUDENT_IMPORT_WORKERS', 0)) or None  # None: one per CPU
+    STUDENT_IMPORT_POOL_MIN = 16  # smaller imports are hashed in the request thread
+    STUDENT_IMPORT_CHUNK_SIZE = 500  # users per INSERT statement
+    QUESTION_IMPORT_CHUNK_SIZE = 500  # questions per INSERT transaction
+
+    # gzip Content-Encoding for text responses (see app/compression.py)
+    COMPRESS = os.environ.get('COMPRESS', '1').lower() not in ('0', 'false', 'no')
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller responses are sent as is
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)  # 1 (fastest) .. 9 (smallest)
+
+    # Background jobs for heavy admin operations (imports, resets, deletes)
+    JOB_DIR = os.environ.get('JOB_DIR') or os.path.join(basedir, 'job_files')  # uploads and result files
+    JOB_WORKERS = 1  # admin jobs running at once; exam traffic keeps the other threads
+    JOB_MAX_PENDING = 5  # queued + running; more are refused
+    JOB_BATCH_SIZE = 500  # rows per delete/update transaction
+    JOB_BATCH_PAUSE = 0.05  # seconds between batches, so answers can take the write lock
+    JOB_PROGRESS_INTERVAL = 0.5  # seconds between progress updates
+    JOB_RESULT_TTL = 24 * 3600  # seconds a result file is kept (swept at startup and with each new job)
     # WTF_CSRF_ENABLED = True # Enabled by default in Flask-WTF
     
     # Fix for admin_questions Internal Server Error - URL building configuration
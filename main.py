@@ -1,7 +1,14 @@
-from app import app
-from waitress import serve
+import multiprocessing
+
+if __name__ != '__mp_main__':
+    # Not when re-run by a spawned password-hashing worker (app/student_import.py);
+    # kept at module level for FLASK_APP=main.py
+    from app import app
+    from waitress import serve
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
     print('=============================================')
     print('🚀 STARTING PRODUCTION SERVER (Waitress)')
     print('👥 Capacity: Configured for 60+ Students')
@@ -0,0 +1,47 @@
+"""add indexes for the hot quiz and analytics queries
+
+Revision ID: b7d2c9e41a55
+Revises: 736a71c4dd4f
+Create Date: 2026-10-18 10:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2c9e41a55'
+down_revision = '736a71c4dd4f'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) - kept in step with __table_args__ in app/models.py
+INDEXES = [
+    ('ix_quiz_score_user_set_status', 'quiz_score', ['user_id', 'question_set_id', 'status', 'timestamp']),
+    ('ix_quiz_score_set_status_score', 'quiz_score', ['question_set_id', 'status', 'score']),
+    ('ix_student_response_set_question', 'student_response', ['question_set_id', 'question_id']),
+    ('ix_student_response_question', 'student_response', ['question_id']),
+    ('ix_questions_set_q_id', 'questions', ['question_set_id', 'q_id']),
+    ('ix_questions_quiz_category', 'questions', ['quiz_category']),
+    ('ix_question_set_category_active', 'question_set', ['quiz_category', 'is_active']),
+    ('ix_user_section', 'user', ['section']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Databases built with db.create_all() may already have some of these
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,53 @@
+"""add analytics counter tables
+
+Revision ID: c41e8a7f2d63
+Revises: b7d2c9e41a55
+Create Date: 2026-10-18 14:03:17.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8a7f2d63'
+down_revision = 'b7d2c9e41a55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('response_tally',
+    sa.Column('question_set_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('question_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('choice', sa.String(length=100), nullable=False),
+    sa.Column('responses', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('question_set_id', 'question_id', 'choice')
+    )
+    op.create_table('response_student_tally',
+    sa.Column('question_set_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('responses', sa.Integer(), nullable=False),
+    sa.Column('correct', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('question_set_id', 'user_id')
+    )
+
+    # Start the counters from the responses already recorded
+    op.execute(
+        "INSERT INTO response_tally (question_set_id, question_id, choice, responses, correct) "
+        "SELECT question_set_id, question_id, selected_answer, COUNT(id), SUM(CAST(is_correct AS INTEGER)) "
+        "FROM student_response WHERE question_set_id IS NOT NULL "
+        "GROUP BY question_set_id, question_id, selected_answer"
+    )
+    op.execute(
+        "INSERT INTO response_student_tally (question_set_id, user_id, responses, correct) "
+        "SELECT question_set_id, user_id, COUNT(id), SUM(CAST(is_correct AS INTEGER)) "
+        "FROM student_response WHERE question_set_id IS NOT NULL "
+        "GROUP BY question_set_id, user_id"
+    )
+
+
+def downgrade():
+    op.drop_table('response_student_tally')
+    op.drop_table('response_tally')
@@ -0,0 +1,42 @@
+"""add background job table
+
+Revision ID: d8f3a1b26e47
+Revises: c41e8a7f2d63
+Create Date: 2026-10-18 16:42:05.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f3a1b26e47'
+down_revision = 'c41e8a7f2d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('background_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=64), nullable=False),
+    sa.Column('params', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('message', sa.String(length=255), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result_file', sa.String(length=255), nullable=True),
+    sa.Column('result_name', sa.String(length=255), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_background_job_status'), 'background_job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_background_job_status'), table_name='background_job')
+    op.drop_table('background_job')
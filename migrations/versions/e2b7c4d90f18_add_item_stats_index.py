@@ -0,0 +1,36 @@
+"""add covering index for the item statistics
+
+Revision ID: e2b7c4d90f18
+Revises: d8f3a1b26e47
+Create Date: 2026-10-18 19:05:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b7c4d90f18'
+down_revision = 'd8f3a1b26e47'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_student_response_set_student'
+COLUMNS = ['question_set_id', 'user_id', 'question_id', 'is_correct', 'selected_answer']
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Databases built with db.create_all() may already have it
+    if NAME not in _existing_indexes('student_response'):
+        op.create_index(NAME, 'student_response', COLUMNS, unique=False)
+
+
+def downgrade():
+    if NAME in _existing_indexes('student_response'):
+        op.drop_index(NAME, table_name='student_response')
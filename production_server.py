@@ -1,7 +1,14 @@
-from app import app
-from waitress import serve
+import multiprocessing
 
 if __name__ == '__main__':
+    # A password-hashing worker (app/student_import.py) of the frozen exe
+    # starts here and must not run a second server
+    multiprocessing.freeze_support()
+
+    # Imported here, so spawned workers that re-run this script don't load the app
+    from app import app
+    from waitress import serve
+
     print('=============================================')
     print('?? STARTING PRODUCTION SERVER (Waitress)')
     print('?? Capacity: Configured for 60+ Students')
@@ -0,0 +1,93 @@
+"""
+Check that the hot quiz and analytics queries use an index.
+
+Runs EXPLAIN QUERY PLAN on each query below (built the same way routes.py,
+ranking.py and cache.py build them) and exits with status 1 if any of them
+falls back to a full scan of a table.
+
+    python verify_indexes.py            # the configured database (run `flask db upgrade` first)
+    python verify_indexes.py --fresh    # a throw-away database built from the models
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+parser = argparse.ArgumentParser(description='EXPLAIN QUERY PLAN check for the hot queries')
+parser.add_argument('--fresh', action='store_true', help='check a new database created from the models')
+parser.add_argument('--verbose', action='store_true', help='print every plan')
+args = parser.parse_args()
+if args.fresh:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='quiz_idx_'), 'check.db')
+
+from app import app, db
+from app.models import User, Questions, QuizScore, QuestionSet, StudentResponse
+from app.ranking import _leaderboard_filter, _ranked_subquery
+
+SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)')
+
+
+def hot_queries():
+    """(name, query) pairs; parameter values are placeholders."""
+    user_id, set_id, q_id = 1, 1, 1
+    ranked = _ranked_subquery(set_id, 'General', 'General', False)
+    return [
+        ('home: student score for active set', QuizScore.query.filter_by(
+            user_id=user_id, question_set_id=set_id, status='completed'
+        ).order_by(QuizScore.timestamp.desc()).limit(1)),
+        ('start_quiz: existing attempt', QuizScore.query.filter_by(
+            user_id=user_id, quiz_category='General', question_set_id=set_id).limit(1)),
+        ('admin_students: latest score in set', QuizScore.query.filter_by(
+            user_id=user_id, question_set_id=set_id).order_by(QuizScore.timestamp.desc()).limit(1)),
+        ('reset student: scores of user', QuizScore.query.filter_by(user_id=user_id)),
+        ('rank index load', db.session.query(QuizScore.id, QuizScore.score, User.id, User.username).join(
+            User, QuizScore.user_id == User.id
+        ).filter(QuizScore.question_set_id == set_id, QuizScore.status == 'completed', User.is_admin == False)),
+        ('leaderboard: ranked top 3', db.session.query(ranked).filter(ranked.c.rank <= 3).order_by(ranked.c.position)),
+        ('leaderboard: row count', _leaderboard_filter(db.session.query(db.func.count(QuizScore.id)).join(
+            User, QuizScore.user_id == User.id), set_id, 'General', None, False)),
+        ('leaderboard: legacy NULL-set count', _leaderboard_filter(db.session.query(db.func.count(QuizScore.id)).join(
+            User, QuizScore.user_id == User.id), set_id, 'General', None, True)),
+        ('active set of category', QuestionSet.query.filter_by(quiz_category='General', is_active=True).limit(1)),
+        ('questions of set', Questions.query.filter_by(question_set_id=set_id).order_by(Questions.q_id.asc())),
+        ('questions of category', db.session.query(db.func.count(Questions.q_id)).filter(
+            Questions.quiz_category == 'General')),
+        ('analytics: responses of set', StudentResponse.query.filter_by(question_set_id=set_id)),
+        ('analytics: responses per question', StudentResponse.query.filter_by(
+            question_id=q_id, question_set_id=set_id)),
+        ('delete question: its responses', StudentResponse.query.filter_by(question_id=q_id)),
+        ('students of section', User.query.filter_by(is_admin=False).filter(User.section == 'General')),
+    ]
+
+
+def explain(query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    with app.app_context():
+        if args.fresh:
+            db.create_all()
+        tables = set(db.metadata.tables)
+        failures = 0
+        for name, query in hot_queries():
+            plan = explain(query)
+            scanned = [m.group(1) for m in map(SCAN.search, plan) if m and m.group(1) in tables]
+            status = 'FULL SCAN of ' + ', '.join(scanned) if scanned else 'ok'
+            print('{:<40} {}'.format(name, status))
+            if scanned or args.verbose:
+                for line in plan:
+                    print('    ' + line)
+            failures += bool(scanned)
+        if failures:
+            print('\n{} hot queries fall back to a table scan. Run `flask db upgrade`.'.format(failures))
+            return 1
+        print('\nAll hot queries use an index.')
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())